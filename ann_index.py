@@ -0,0 +1,279 @@
+"""
+Approximate nearest-neighbour index for the RAG vector store
+IVF-flat: spherical k-means centroids partition the rows, a search only scores
+the rows of the `nprobe` closest lists
+
+Rebuild offline (gateway stopped): python ann_index.py rag_storage/vectors.npy [--lists N]
+"""
+
+import argparse
+import logging
+import math
+import os
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Rows scored per matrix product while assigning vectors to lists
+_ASSIGN_CHUNK = 65536
+
+
+def default_list_count(count: int) -> int:
+    """Rule-of-thumb number of lists for `count` vectors (about 4 * sqrt(n))"""
+    return max(1, min(count, int(4 * math.sqrt(count))))
+
+
+def assign_to_lists(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Index of the most similar centroid for each (normalized) row"""
+    labels = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), _ASSIGN_CHUNK):
+        block = vectors[start : start + _ASSIGN_CHUNK] @ centroids.T
+        labels[start : start + _ASSIGN_CHUNK] = np.argmax(block, axis=1)
+    return labels
+
+
+def train_centroids(
+    vectors: np.ndarray,
+    n_lists: int,
+    iterations: int = 10,
+    max_points_per_list: int = 256,
+    seed: int = 0,
+) -> np.ndarray:
+    """
+    Spherical k-means over L2-normalized rows
+
+    Trains on at most `max_points_per_list * n_lists` sampled rows, which is
+    enough for stable centroids and keeps training time independent of the
+    corpus size. Empty lists are re-seeded from random sample rows.
+
+    Returns:
+        (n_lists, dim) float32 array of unit-length centroids
+    """
+    rng = np.random.default_rng(seed)
+    count = len(vectors)
+    n_lists = max(1, min(n_lists, count))
+
+    sample_size = min(count, n_lists * max_points_per_list)
+    if sample_size < count:
+        sample = np.asarray(vectors[np.sort(rng.choice(count, sample_size, replace=False))])
+    else:
+        sample = np.asarray(vectors[:count])
+    sample = sample.astype(np.float32, copy=False)
+
+    centroids: np.ndarray = sample[rng.choice(len(sample), n_lists, replace=False)].copy()
+    for _ in range(iterations):
+        labels = assign_to_lists(sample, centroids)
+        sizes = np.bincount(labels, minlength=n_lists)
+
+        # Sum members per list with one sort + reduceat instead of a Python loop
+        order = np.argsort(labels, kind="stable")
+        occupied = np.flatnonzero(sizes)
+        starts = np.searchsorted(labels[order], occupied)
+        centroids[occupied] = np.add.reduceat(sample[order], starts, axis=0)
+
+        empty = np.flatnonzero(sizes == 0)
+        if empty.size:
+            centroids[empty] = sample[rng.choice(len(sample), empty.size, replace=False)]
+
+        norms = np.linalg.norm(centroids, axis=1, keepdims=True)
+        np.divide(centroids, norms, out=centroids, where=norms > 0)
+
+    return centroids
+
+
+class IVFIndex:
+    """
+    Inverted-file list assignment for the rows of a VectorIndex
+
+    `assignments` is parallel to the owning index's matrix (one int32 list
+    number per row) and is kept in step by VectorIndex.add and its vacuum, so
+    inserts cost one centroid comparison and deletes nothing (freed rows stay
+    assigned; searches mask them). Centroids are not
+    retrained incrementally; rebuild when the corpus has drifted (see
+    `get_stats()["imbalance"]`).
+
+    When opened from disk both arrays are memory-mapped .npy files next to the
+    vector store: `<vectors>.ivf.npy` (assignments) and
+    `<vectors>.ivf-centroids.npy`.
+    """
+
+    def __init__(self, centroids: np.ndarray, capacity: int, nprobe: int = 8) -> None:
+        self.centroids = np.asarray(centroids, dtype=np.float32)
+        self.nprobe = nprobe
+        self.assignments: np.ndarray = np.zeros(capacity, dtype=np.int32)
+
+        # Set by attach_files(); None for a purely in-memory index
+        self.path: Optional[Path] = None
+        self.centroids_path: Optional[Path] = None
+
+    @property
+    def n_lists(self) -> int:
+        return int(self.centroids.shape[0])
+
+    @staticmethod
+    def paths_for(vectors_path: Path) -> Tuple[Path, Path]:
+        """(assignments, centroids) file paths for a vector store file"""
+        vectors_path = Path(vectors_path)
+        return (
+            vectors_path.with_name(vectors_path.name + ".ivf.npy"),
+            vectors_path.with_name(vectors_path.name + ".ivf-centroids.npy"),
+        )
+
+    @classmethod
+    def build(
+        cls,
+        matrix: np.ndarray,
+        count: int,
+        n_lists: Optional[int] = None,
+        nprobe: int = 8,
+        iterations: int = 10,
+        seed: int = 0,
+    ) -> "IVFIndex":
+        """Train centroids on the first `count` rows of `matrix` and assign every row"""
+        n_lists = n_lists or default_list_count(count)
+        centroids = train_centroids(matrix[:count], n_lists, iterations=iterations, seed=seed)
+        ivf = cls(centroids, capacity=len(matrix), nprobe=nprobe)
+        ivf.assignments[:count] = assign_to_lists(matrix[:count], centroids)
+        return ivf
+
+    @classmethod
+    def load(
+        cls, vectors_path: Path, capacity: int, nprobe: int = 8, read_only: bool = False
+    ) -> Optional["IVFIndex"]:
+        """Map a persisted IVF index, or return None when there is none (or it is stale)"""
+        path, centroids_path = cls.paths_for(vectors_path)
+        if not path.exists() or not centroids_path.exists():
+            return None
+
+        assignments = np.load(path, mmap_mode="r" if read_only else "r+")
+        if len(assignments) != capacity:
+            del assignments
+            logger.warning(f"Ignoring stale IVF index {path}: rebuild it to re-enable ANN search")
+            return None
+
+        ivf = cls(np.load(centroids_path), capacity=0, nprobe=nprobe)
+        ivf.assignments = assignments
+        ivf.path, ivf.centroids_path = path, centroids_path
+        return ivf
+
+    def _write_assignments(
+        self, capacity: int, count: int, rows: Optional[np.ndarray] = None
+    ) -> None:
+        """Copy assignments (the first `count`, or `rows` in order) into a new .npy file"""
+        assert self.path is not None
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+
+        new_assignments = np.lib.format.open_memmap(
+            tmp_path, mode="w+", dtype=np.int32, shape=(capacity,)
+        )
+        if rows is not None:
+            new_assignments[: len(rows)] = self.assignments[rows]
+        else:
+            new_assignments[:count] = self.assignments[:count]
+        new_assignments.flush()
+
+        # Release both mappings before renaming (required on Windows)
+        del new_assignments
+        self.assignments = np.zeros(0, dtype=np.int32)
+        os.replace(tmp_path, self.path)
+
+        self.assignments = np.load(self.path, mmap_mode="r+")
+
+    def attach_files(self, vectors_path: Path, count: int) -> None:
+        """Persist next to `vectors_path` and keep the assignments memory-mapped"""
+        self.path, self.centroids_path = self.paths_for(vectors_path)
+
+        tmp_path = self.centroids_path.with_name(self.centroids_path.name + ".tmp")
+        with open(tmp_path, "wb") as f:
+            np.save(f, self.centroids)
+        os.replace(tmp_path, self.centroids_path)
+
+        self._write_assignments(len(self.assignments), count)
+
+    def resize(self, capacity: int, count: int) -> None:
+        """Follow a capacity change of the owning matrix"""
+        if self.path is not None:
+            self._write_assignments(capacity, count)
+            return
+        assignments = np.zeros(capacity, dtype=np.int32)
+        assignments[:count] = self.assignments[:count]
+        self.assignments = assignments
+
+    def assign(self, row: int, vector: np.ndarray) -> None:
+        """Record the list of a newly written row"""
+        self.assignments[row] = int(np.argmax(self.centroids @ vector))
+
+    def keep_rows(self, rows: np.ndarray, capacity: int) -> None:
+        """Mirror a VectorIndex vacuum keeping only `rows`, renumbered from 0"""
+        if self.path is not None:
+            self._write_assignments(capacity, len(rows), rows)
+            return
+        assignments = np.zeros(capacity, dtype=np.int32)
+        assignments[: len(rows)] = self.assignments[rows]
+        self.assignments = assignments
+
+    def flush(self) -> None:
+        if isinstance(self.assignments, np.memmap):
+            self.assignments.flush()
+
+    def probe(self, query: np.ndarray, count: int, nprobe: Optional[int] = None) -> np.ndarray:
+        """
+        Rows in the `nprobe` lists closest to `query`
+
+        Returns:
+            Sorted int64 array of candidate row numbers (< count)
+        """
+        nprobe = min(nprobe or self.nprobe, self.n_lists)
+        centroid_scores = self.centroids @ query
+        if nprobe < self.n_lists:
+            lists = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+        else:
+            lists = np.arange(self.n_lists)
+
+        selected = np.zeros(self.n_lists, dtype=bool)
+        selected[lists] = True
+        rows: np.ndarray = np.flatnonzero(selected[self.assignments[:count]])
+        return rows
+
+    def get_stats(self, count: int) -> Dict[str, Any]:
+        """List count, probe setting and list-size balance"""
+        sizes = np.bincount(self.assignments[:count], minlength=self.n_lists)
+        mean = count / self.n_lists if self.n_lists else 0.0
+        return {
+            "type": "ivf-flat",
+            "lists": self.n_lists,
+            "nprobe": self.nprobe,
+            "largest_list": int(sizes.max()) if count else 0,
+            # 1.0 = perfectly even lists; grows as inserts drift away from the trained centroids
+            "imbalance": (
+                round(float((sizes.astype(np.float64) ** 2).sum()) / (count * mean), 2)
+                if count
+                else 0.0
+            ),
+        }
+
+
+def main() -> None:
+    from vector_index import VectorIndex
+
+    parser = argparse.ArgumentParser(description="Rebuild the IVF index of a RAG vector store")
+    parser.add_argument("vectors", type=Path, help="path to vectors.npy")
+    parser.add_argument("--lists", type=int, default=None, help="number of lists (default ~4√n)")
+    parser.add_argument("--iterations", type=int, default=10, help="k-means iterations")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    index = VectorIndex.open(args.vectors)
+    index.build_ann(n_lists=args.lists, iterations=args.iterations, seed=args.seed)
+    index.save()
+
+    assert index.ann is not None
+    logger.info(f"IVF index rebuilt: {index.ann.get_stats(index.used_rows)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,26 +3,67 @@ Attachment Handler
 File upload, parsing, and RAG integration
 """
 
+import asyncio
 import hashlib
 import logging
 import mimetypes
+import os
+import uuid
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, AsyncIterable, AsyncIterator, Dict, List, Optional, Protocol
+
+from journal import JournaledStore
+from pdf_extractor import PYPDF_MISSING, PDFExtractor, extract_page_range
 
 logger = logging.getLogger(__name__)
 
+# Upload block size: the most memory one in-flight upload holds at a time
+UPLOAD_BLOCK_SIZE = 64 * 1024
+
+
+class AsyncReader(Protocol):
+    """Anything with an async read(size), such as starlette's UploadFile"""
+
+    async def read(self, size: int = -1) -> bytes: ...
+
+
+async def read_blocks(
+    reader: AsyncReader, block_size: int = UPLOAD_BLOCK_SIZE
+) -> AsyncIterator[bytes]:
+    """Iterate over an async file-like object (e.g. FastAPI's UploadFile) in fixed-size blocks"""
+    while True:
+        block = await reader.read(block_size)
+        if not block:
+            return
+        yield block
+
 
 class AttachmentHandler:
     """
     Handles file attachments for projects
     Supports: TXT, MD, PDF, code files, JSON, CSV
+
+    Content is stored once per SHA-256 under `blobs/<2-char prefix>/<hash>`
+    and shared by every project that uploads it. A journaled manifest
+    (`manifest.json`) holds one record per (project, attachment); it is
+    loaded once into in-memory indexes, so lookups never touch the
+    filesystem and statistics are kept as running totals. A blob is deleted
+    when its last reference goes away.
     """
 
-    def __init__(self, storage_path: str = "./attachments"):
+    def __init__(
+        self, storage_path: str = "./attachments", pdf_extractor: Optional[PDFExtractor] = None
+    ):
         self.storage_path = Path(storage_path)
         self.storage_path.mkdir(exist_ok=True)
 
+        # Partial uploads; same filesystem as the projects so the final rename is atomic
+        self.uploads_path = self.storage_path / ".uploads"
+        self.uploads_path.mkdir(exist_ok=True)
+        self.blobs_path = self.storage_path / "blobs"
+        self.blobs_path.mkdir(exist_ok=True)
+
         # Supported file types
         self.supported_extensions = {
             # Text formats
@@ -63,6 +104,29 @@ class AttachmentHandler:
         # Max file size (10MB)
         self.max_file_size = 10 * 1024 * 1024
 
+        # PDF parsing runs in worker processes (page cap and per-file timeout)
+        self.pdf_extractor = pdf_extractor or PDFExtractor()
+
+        # Manifest: "<project_id>/<attachment_id>" -> attachment record. Gateway
+        # workers share it: changes are made under its lock after a sync
+        self.manifest = JournaledStore(self.storage_path / "manifest.json")
+
+        # In-memory indexes over the manifest, and running totals for get_stats()
+        self._projects: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self._blob_refs: Dict[str, int] = {}
+        self._records: Dict[str, Dict[str, Any]] = {}
+        self._total_bytes = 0
+        self._blob_bytes = 0
+
+        with self.manifest.lock:
+            manifest_exists = (
+                self.manifest.snapshot_path.exists() or self.manifest.log_path.exists()
+            )
+            self._records = self.manifest.load()
+            self._reindex()
+            if not manifest_exists:
+                self._migrate_legacy_files()
+
         logger.info(f"AttachmentHandler initialized at {self.storage_path}")
 
     def _get_file_hash(self, content: bytes) -> str:
@@ -71,27 +135,39 @@ class AttachmentHandler:
 
     def _extract_text_from_pdf(self, file_path: Path) -> str:
         """
-        Extract text from PDF
-        Simple implementation - can be enhanced with pypdf2 later
+        Extract text from PDF in the calling thread
+        Uploads use the process pool instead (see _extract_pdf)
         """
+        if not self.pdf_extractor.available:
+            return f"[PDF Content from {file_path.name}]\n\n{PYPDF_MISSING}"
         try:
-            # For v2.0, we'll use simple extraction
-            # In production, use PyPDF2 or pdfplumber
-            return (
-                f"[PDF Content from {file_path.name}]\n\n"
-                "PDF parsing requires PyPDF2 library.\n"
-                "Install: pip install pypdf2"
-            )
+            pages = extract_page_range(str(file_path), 0, self.pdf_extractor.max_pages)
+            return "\n\n".join(pages)
         except Exception as e:
             logger.error(f"PDF extraction failed: {e}")
             return ""
 
-    def _parse_file_content(self, file_path: Path, mime_type: str) -> str:
+    async def _extract_pdf(self, file_path: Path) -> str:
+        """Extract PDF text in the worker process pool"""
+        if not self.pdf_extractor.available:
+            return self._extract_text_from_pdf(file_path)
+        try:
+            return await self.pdf_extractor.extract_text(file_path)
+        except asyncio.TimeoutError:
+            logger.error(f"PDF extraction timed out: {file_path}")
+            return "[Error parsing file: PDF extraction timed out]"
+        except Exception as e:
+            logger.error(f"PDF extraction failed: {e}")
+            return ""
+
+    def _parse_file_content(
+        self, file_path: Path, mime_type: str, extension: Optional[str] = None
+    ) -> str:
         """
-        Parse file content based on type
+        Parse file content based on type (blobs have no suffix: pass the extension)
         """
         try:
-            extension = file_path.suffix.lower()
+            extension = (extension or file_path.suffix).lower()
 
             # PDF
             if extension == ".pdf":
@@ -167,144 +243,272 @@ class AttachmentHandler:
         Returns:
             Attachment metadata or None if failed
         """
+
+        async def blocks() -> AsyncIterator[bytes]:
+            for start in range(0, len(content), UPLOAD_BLOCK_SIZE):
+                yield content[start : start + UPLOAD_BLOCK_SIZE]
+
+        return await self.save_attachment_stream(filename, blocks(), project_id, user_metadata)
+
+    async def save_attachment_stream(
+        self,
+        filename: str,
+        stream: AsyncIterable[bytes],
+        project_id: str,
+        user_metadata: Optional[Dict[str, Any]] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Save an attachment from an async byte stream and return metadata
+
+        Blocks are hashed and written to a temporary file as they arrive, so
+        an upload only ever holds one block in memory; the size limit is
+        checked on every block. The finished file is renamed into place
+        atomically, and text extraction runs in a worker thread.
+
+        Args:
+            filename: Original filename
+            stream: File content, e.g. `read_blocks(upload_file)`
+            project_id: Associated project ID
+            user_metadata: Additional user-provided metadata
+
+        Returns:
+            Attachment metadata or None if failed
+        """
+        # Validate extension before reading anything
+        extension = Path(filename).suffix.lower()
+        if extension not in self.supported_extensions:
+            logger.warning(f"Unsupported file type: {extension}")
+            return None
+
+        tmp_path = self.uploads_path / f"{uuid.uuid4().hex}.part"
         try:
-            # Validate file size
-            if len(content) > self.max_file_size:
-                logger.warning(f"File {filename} exceeds max size")
-                return None
-
-            # Validate extension
-            extension = Path(filename).suffix.lower()
-            if extension not in self.supported_extensions:
-                logger.warning(f"Unsupported file type: {extension}")
-                return None
-
-            # Generate unique ID
-            file_hash = self._get_file_hash(content)
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            safe_filename = "".join(c if c.isalnum() or c in "._-" else "_" for c in filename)
-            unique_filename = f"{timestamp}_{file_hash}_{safe_filename}"
-
-            # Create project directory
-            project_dir = self.storage_path / project_id
-            project_dir.mkdir(exist_ok=True)
-
-            # Save file
-            file_path = project_dir / unique_filename
-            with open(file_path, "wb") as f:
-                f.write(content)
+            digest = hashlib.sha256()
+            size = 0
+            with open(tmp_path, "wb") as f:
+                async for block in stream:
+                    size += len(block)
+                    # Validate file size
+                    if size > self.max_file_size:
+                        logger.warning(f"File {filename} exceeds max size")
+                        return None
+                    digest.update(block)
+                    await asyncio.to_thread(f.write, block)
+
+            blob_hash = digest.hexdigest()
+            file_hash = blob_hash[:16]
+            blob_path = self._blob_path(blob_hash)
 
             # Get mime type
             mime_type, _ = mimetypes.guess_type(filename)
 
-            # Parse content for RAG
-            text_content = self._parse_file_content(file_path, mime_type or "")
+            # Under the manifest lock, so another worker cannot drop the last
+            # reference to the blob between the check and the new record
+            with self.manifest.lock:
+                self._sync()
+
+                # Identical content is stored once; the new copy is discarded
+                deduplicated = blob_hash in self._blob_refs or blob_path.exists()
+                if not deduplicated:
+                    blob_path.parent.mkdir(exist_ok=True)
+                    os.replace(tmp_path, blob_path)
+
+                key = self._manifest_key(project_id, file_hash)
+                record = self._records.get(key)
+                if record is None:
+                    record = {
+                        "attachment_id": file_hash,
+                        "blob": blob_hash,
+                        "filename": filename,
+                        "size_bytes": size,
+                        "mime_type": mime_type,
+                        "extension": extension,
+                        "project_id": project_id,
+                        "uploaded_at": datetime.now().isoformat(),
+                        "user_metadata": user_metadata or {},
+                    }
+                    self._index_record(record)
+                    self.manifest.save(self._records, key)
+                else:
+                    logger.info(f"Attachment {file_hash} already exists in project {project_id}")
+
+            # Parse content for RAG (blocking file I/O and parsing, kept off the event loop)
+            if record["extension"] == ".pdf":
+                text_content = await self._extract_pdf(blob_path)
+            else:
+                text_content = await asyncio.to_thread(
+                    self._parse_file_content, blob_path, mime_type or "", record["extension"]
+                )
 
             # Create metadata
-            metadata = {
-                "attachment_id": file_hash,
-                "filename": filename,
-                "stored_filename": unique_filename,
-                "file_path": str(file_path),
-                "size_bytes": len(content),
-                "mime_type": mime_type,
-                "extension": extension,
-                "project_id": project_id,
-                "uploaded_at": datetime.now().isoformat(),
-                "text_content": text_content,
-                "user_metadata": user_metadata or {},
-            }
+            metadata = self._public_record(record)
+            metadata["text_content"] = text_content
+            metadata["deduplicated"] = deduplicated
 
-            logger.info(f"Saved attachment: {filename} ({len(content)} bytes)")
+            logger.info(f"Saved attachment: {filename} ({size} bytes)")
             return metadata
 
         except Exception as e:
             logger.error(f"Failed to save attachment: {e}")
             return None
 
-    def get_attachment(self, project_id: str, attachment_id: str) -> Optional[Dict[str, Any]]:
-        """Get attachment metadata"""
-        try:
-            project_dir = self.storage_path / project_id
+        finally:
+            # Aborted or failed uploads leave nothing behind
+            if tmp_path.exists():
+                tmp_path.unlink()
+
+    @staticmethod
+    def _manifest_key(project_id: str, attachment_id: str) -> str:
+        return f"{project_id}/{attachment_id}"
+
+    def _blob_path(self, blob_hash: str) -> Path:
+        return self.blobs_path / blob_hash[:2] / blob_hash
+
+    def _public_record(self, record: Dict[str, Any]) -> Dict[str, Any]:
+        """Copy of a manifest record with the blob location filled in"""
+        blob_path = self._blob_path(record["blob"])
+        return {
+            **record,
+            "stored_filename": str(blob_path.relative_to(self.storage_path)),
+            "file_path": str(blob_path),
+        }
 
-            if not project_dir.exists():
-                return None
+    def _sync(self) -> None:
+        """Pick up manifest changes made by other gateway workers"""
+        if self.manifest.sync(self._records):
+            self._reindex()
+
+    def _reindex(self) -> None:
+        """Rebuild the indexes and totals from `_records`"""
+        self._projects = {}
+        self._blob_refs = {}
+        self._total_bytes = 0
+        self._blob_bytes = 0
+        for record in list(self._records.values()):
+            self._index_record(record)
+
+    def _index_record(self, record: Dict[str, Any]) -> None:
+        """Add a manifest record to the in-memory indexes and totals"""
+        key = self._manifest_key(record["project_id"], record["attachment_id"])
+        self._records[key] = record
+        self._projects.setdefault(record["project_id"], {})[record["attachment_id"]] = record
+
+        refs = self._blob_refs.get(record["blob"], 0)
+        if refs == 0:
+            self._blob_bytes += record["size_bytes"]
+        self._blob_refs[record["blob"]] = refs + 1
+        self._total_bytes += record["size_bytes"]
+
+    def _remove_record(self, project_id: str, attachment_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Drop a record from the indexes; delete its blob when no reference is left
 
-            # Find file by ID (hash prefix)
-            for file_path in project_dir.glob(f"*_{attachment_id}_*"):
-                if file_path.is_file():
-                    mime_type, _ = mimetypes.guess_type(str(file_path))
+        Call with the manifest lock held and the indexes synced, so the
+        reference count covers every worker's records.
+        """
+        record = self._records.pop(self._manifest_key(project_id, attachment_id), None)
+        if record is None:
+            return None
+
+        project = self._projects[project_id]
+        del project[attachment_id]
+        if not project:
+            del self._projects[project_id]
+        self._total_bytes -= record["size_bytes"]
+
+        refs = self._blob_refs[record["blob"]] - 1
+        if refs:
+            self._blob_refs[record["blob"]] = refs
+        else:
+            del self._blob_refs[record["blob"]]
+            self._blob_bytes -= record["size_bytes"]
+            blob_path = self._blob_path(record["blob"])
+            if blob_path.exists():
+                blob_path.unlink()
+        return record
+
+    def _migrate_legacy_files(self) -> None:
+        """One-time import of `<project>/<timestamp>_<hash>_<name>` files into the blob store"""
+        migrated = 0
+        for project_dir in self.storage_path.iterdir():
+            if not project_dir.is_dir() or project_dir in (self.uploads_path, self.blobs_path):
+                continue
 
-                    return {
-                        "attachment_id": attachment_id,
-                        "filename": file_path.name,
-                        "file_path": str(file_path),
-                        "size_bytes": file_path.stat().st_size,
+            for file_path in project_dir.iterdir():
+                if not file_path.is_file():
+                    continue
+                parts = file_path.name.split("_", 3)
+                filename = parts[3] if len(parts) == 4 else file_path.name
+
+                digest = hashlib.sha256()
+                with open(file_path, "rb") as f:
+                    for block in iter(lambda: f.read(UPLOAD_BLOCK_SIZE), b""):
+                        digest.update(block)
+                blob_hash = digest.hexdigest()
+
+                stat = file_path.stat()
+                blob_path = self._blob_path(blob_hash)
+                if blob_path.exists():
+                    file_path.unlink()
+                else:
+                    blob_path.parent.mkdir(exist_ok=True)
+                    os.replace(file_path, blob_path)
+
+                if self._manifest_key(project_dir.name, blob_hash[:16]) in self._records:
+                    continue
+                mime_type, _ = mimetypes.guess_type(filename)
+                self._index_record(
+                    {
+                        "attachment_id": blob_hash[:16],
+                        "blob": blob_hash,
+                        "filename": filename,
+                        "size_bytes": stat.st_size,
                         "mime_type": mime_type,
-                        "project_id": project_id,
+                        "extension": Path(filename).suffix.lower(),
+                        "project_id": project_dir.name,
+                        "uploaded_at": datetime.fromtimestamp(stat.st_mtime).isoformat(),
+                        "user_metadata": {},
                     }
+                )
+                migrated += 1
 
-            return None
+            if not any(project_dir.iterdir()):
+                project_dir.rmdir()
 
-        except Exception as e:
-            logger.error(f"Failed to get attachment: {e}")
-            return None
+        if migrated:
+            self.manifest.compact(self._records)
+            logger.info(f"Migrated {migrated} attachments into the blob store")
+
+    def get_attachment(self, project_id: str, attachment_id: str) -> Optional[Dict[str, Any]]:
+        """Get attachment metadata"""
+        self._sync()
+        record = self._projects.get(project_id, {}).get(attachment_id)
+        return self._public_record(record) if record else None
 
     def list_attachments(self, project_id: str) -> List[Dict[str, Any]]:
         """List all attachments for a project"""
-        try:
-            project_dir = self.storage_path / project_id
-
-            if not project_dir.exists():
-                return []
-
-            attachments = []
-
-            for file_path in project_dir.iterdir():
-                if file_path.is_file():
-                    # Extract hash from filename (format: timestamp_hash_filename)
-                    parts = file_path.name.split("_", 2)
-                    if len(parts) >= 3:
-                        attachment_id = parts[1]
-                    else:
-                        attachment_id = file_path.stem
-
-                    mime_type, _ = mimetypes.guess_type(str(file_path))
-
-                    attachments.append(
-                        {
-                            "attachment_id": attachment_id,
-                            "filename": file_path.name,
-                            "size_bytes": file_path.stat().st_size,
-                            "mime_type": mime_type,
-                            "uploaded_at": datetime.fromtimestamp(
-                                file_path.stat().st_mtime
-                            ).isoformat(),
-                        }
-                    )
-
-            return attachments
-
-        except Exception as e:
-            logger.error(f"Failed to list attachments: {e}")
-            return []
+        self._sync()
+        return [
+            {
+                "attachment_id": record["attachment_id"],
+                "filename": record["filename"],
+                "size_bytes": record["size_bytes"],
+                "mime_type": record["mime_type"],
+                "uploaded_at": record["uploaded_at"],
+            }
+            for record in self._projects.get(project_id, {}).values()
+        ]
 
     def delete_attachment(self, project_id: str, attachment_id: str) -> bool:
         """Delete an attachment"""
         try:
-            project_dir = self.storage_path / project_id
+            with self.manifest.lock:
+                self._sync()
+                if self._remove_record(project_id, attachment_id) is None:
+                    return False
+                self.manifest.save(self._records, self._manifest_key(project_id, attachment_id))
 
-            if not project_dir.exists():
-                return False
-
-            # Find and delete file
-            for file_path in project_dir.glob(f"*_{attachment_id}_*"):
-                if file_path.is_file():
-                    file_path.unlink()
-                    logger.info(f"Deleted attachment: {attachment_id}")
-                    return True
-
-            return False
+            logger.info(f"Deleted attachment: {attachment_id}")
+            return True
 
         except Exception as e:
             logger.error(f"Failed to delete attachment: {e}")
@@ -313,23 +517,18 @@ class AttachmentHandler:
     def delete_project_attachments(self, project_id: str) -> int:
         """Delete all attachments for a project"""
         try:
-            project_dir = self.storage_path / project_id
+            with self.manifest.lock:
+                self._sync()
+                attachment_ids = list(self._projects.get(project_id, {}))
+                for attachment_id in attachment_ids:
+                    self._remove_record(project_id, attachment_id)
 
-            if not project_dir.exists():
-                return 0
+                self.manifest.save_many(
+                    self._records, [self._manifest_key(project_id, a) for a in attachment_ids]
+                )
 
-            deleted = 0
-            for file_path in project_dir.iterdir():
-                if file_path.is_file():
-                    file_path.unlink()
-                    deleted += 1
-
-            # Remove empty directory
-            if not any(project_dir.iterdir()):
-                project_dir.rmdir()
-
-            logger.info(f"Deleted {deleted} attachments from project {project_id}")
-            return deleted
+            logger.info(f"Deleted {len(attachment_ids)} attachments from project {project_id}")
+            return len(attachment_ids)
 
         except Exception as e:
             logger.error(f"Failed to delete project attachments: {e}")
@@ -337,27 +536,13 @@ class AttachmentHandler:
 
     def get_stats(self) -> Dict[str, Any]:
         """Get attachment storage statistics"""
-        try:
-            total_files = 0
-            total_size = 0
-            projects = 0
-
-            for project_dir in self.storage_path.iterdir():
-                if project_dir.is_dir():
-                    projects += 1
-                    for file_path in project_dir.iterdir():
-                        if file_path.is_file():
-                            total_files += 1
-                            total_size += file_path.stat().st_size
-
-            return {
-                "total_attachments": total_files,
-                "total_projects": projects,
-                "total_size_mb": round(total_size / (1024 * 1024), 2),
-                "supported_extensions": list(self.supported_extensions),
-                "max_file_size_mb": self.max_file_size / (1024 * 1024),
-            }
-
-        except Exception as e:
-            logger.error(f"Failed to get stats: {e}")
-            return {}
+        self._sync()
+        return {
+            "total_attachments": len(self._records),
+            "total_projects": len(self._projects),
+            "total_size_mb": round(self._total_bytes / (1024 * 1024), 2),
+            "unique_blobs": len(self._blob_refs),
+            "stored_size_mb": round(self._blob_bytes / (1024 * 1024), 2),
+            "supported_extensions": list(self.supported_extensions),
+            "max_file_size_mb": self.max_file_size / (1024 * 1024),
+        }
@@ -0,0 +1,352 @@
+"""
+Ollama backend pool
+Spreads upstream calls over several Ollama hosts by model inventory, load and health
+"""
+
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Set, Tuple, Union
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# Backend selection strategies
+STRATEGIES = ("least_outstanding", "ewma_latency")
+
+# Defaults used when config.json has no "backends" section
+DEFAULT_BACKEND_SETTINGS: Dict[str, Any] = {
+    "strategy": "least_outstanding",
+    "health_interval": 10.0,
+    "unhealthy_after": 2,
+    "max_attempts": 2,
+}
+
+_EWMA_ALPHA = 0.2
+
+
+def get_backend_settings(config: Dict[str, Any]) -> Dict[str, Any]:
+    """Merge the "backends" section of config.json over the defaults"""
+    settings = {**DEFAULT_BACKEND_SETTINGS, **config.get("backends", {})}
+    if settings["strategy"] not in STRATEGIES:
+        raise ValueError(
+            f"Unknown backend strategy '{settings['strategy']}' "
+            f"(expected one of: {', '.join(STRATEGIES)})"
+        )
+    return settings
+
+
+def parse_backend_urls(value: Union[str, Sequence[str]]) -> List[str]:
+    """
+    Normalize `ollama_base_url` to a list of base URLs
+
+    Args:
+        value: One URL, a comma-separated string (as in OLLAMA_BASE_URL) or a list
+
+    Returns:
+        Distinct URLs without trailing slashes, in the given order
+    """
+    candidates = value.split(",") if isinstance(value, str) else value
+    urls: List[str] = []
+    for url in candidates:
+        url = url.strip().rstrip("/")
+        if url and url not in urls:
+            urls.append(url)
+    if not urls:
+        raise ValueError("ollama_base_url does not name any Ollama backend")
+    return urls
+
+
+def _base_name(model: str) -> str:
+    # /api/tags lists "mistral:latest" for a model pulled as "mistral"
+    return model[: -len(":latest")] if model.endswith(":latest") else model
+
+
+class Backend:
+    """One Ollama host: its model inventory, health and current load"""
+
+    def __init__(self, url: str) -> None:
+        self.url = url
+        self.healthy = True
+        # Base names from /api/tags; None until the first successful check
+        self.models: Optional[Set[str]] = None
+        self.outstanding = 0
+        self.latency_s: Optional[float] = None
+        self.failures = 0
+        self.requests = 0
+        self.errors = 0
+        self.last_error: Optional[str] = None
+        self.checked_at: Optional[float] = None
+
+    def serves(self, model: str) -> bool:
+        """Whether the model is pulled on this host (assumed until the inventory is known)"""
+        return self.models is None or _base_name(model) in self.models
+
+    def score(self, strategy: str) -> Tuple[float, float]:
+        """Sort key, lowest first; unmeasured hosts count as fast so they get tried"""
+        latency_s = self.latency_s or 0.0
+        if strategy == "ewma_latency":
+            return (self.outstanding + 1) * latency_s, self.outstanding
+        return self.outstanding, latency_s
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "url": self.url,
+            "healthy": self.healthy,
+            "models": sorted(self.models) if self.models is not None else None,
+            "outstanding": self.outstanding,
+            "latency_s": round(self.latency_s, 3) if self.latency_s is not None else None,
+            "requests": self.requests,
+            "errors": self.errors,
+            "consecutive_failures": self.failures,
+            "last_error": self.last_error,
+            "checked_at": self.checked_at,
+        }
+
+
+class Lease:
+    """
+    An upstream call in progress on one backend
+
+    Counts towards the backend's outstanding requests until released; release
+    it exactly once when the call is over (`release()` is idempotent).
+    """
+
+    def __init__(self, backend: Backend) -> None:
+        self.backend = backend
+        self._started = time.perf_counter()
+        self._released = False
+        backend.outstanding += 1
+        backend.requests += 1
+
+    def release(self, completed: bool = True) -> None:
+        """End the call; only completed calls update the backend's latency EWMA"""
+        if self._released:
+            return
+        self._released = True
+        backend = self.backend
+        backend.outstanding -= 1
+        if completed:
+            elapsed = time.perf_counter() - self._started
+            previous = backend.latency_s
+            backend.latency_s = (
+                elapsed if previous is None else previous + _EWMA_ALPHA * (elapsed - previous)
+            )
+
+
+class BackendPool:
+    """
+    Least-loaded balancing over Ollama hosts
+
+    A call for a model goes to a healthy backend that has the model pulled,
+    choosing the fewest outstanding requests (ties broken by the latency EWMA)
+    or, with the "ewma_latency" strategy, the lowest (outstanding + 1) x
+    latency. Active checks of /api/tags every `health_interval` seconds refresh
+    each backend's inventory; `unhealthy_after` consecutive failures (checks or
+    calls) eject a backend and one success restores it. A call that cannot
+    reach its backend, gets a 5xx, or finds the model missing (404) is sent to
+    the next-best backend, up to `max_attempts` backends, as long as no
+    response body has been passed on.
+    """
+
+    def __init__(
+        self,
+        urls: Sequence[str],
+        strategy: str = "least_outstanding",
+        health_interval: float = 10.0,
+        unhealthy_after: int = 2,
+        max_attempts: int = 2,
+        health_timeout: Optional[httpx.Timeout] = None,
+    ) -> None:
+        self.backends = [Backend(url) for url in parse_backend_urls(urls)]
+        self.strategy = strategy
+        self.health_interval = health_interval
+        self.unhealthy_after = max(1, unhealthy_after)
+        self.max_attempts = max(1, max_attempts)
+        self.health_timeout = health_timeout
+        self.retries = 0
+
+    @classmethod
+    def from_settings(
+        cls,
+        urls: Sequence[str],
+        settings: Dict[str, Any],
+        health_timeout: Optional[httpx.Timeout] = None,
+    ) -> "BackendPool":
+        return cls(
+            urls,
+            strategy=settings["strategy"],
+            health_interval=settings["health_interval"],
+            unhealthy_after=settings["unhealthy_after"],
+            max_attempts=settings["max_attempts"],
+            health_timeout=health_timeout,
+        )
+
+    @property
+    def urls(self) -> List[str]:
+        return [backend.url for backend in self.backends]
+
+    def healthy(self) -> List[Backend]:
+        return [backend for backend in self.backends if backend.healthy]
+
+    def pick(self, model: str, exclude: Sequence[Backend] = ()) -> Backend:
+        """
+        Best backend for one more call to `model`
+
+        Healthy hosts with the model come first; when there are none, hosts
+        that list it but are ejected, then any other host, are tried rather
+        than failing without a call.
+        """
+        candidates = [backend for backend in self.backends if backend not in exclude]
+        if not candidates:
+            raise ValueError("All backends excluded")
+        return min(
+            candidates,
+            key=lambda backend: (
+                not backend.serves(model),
+                not backend.healthy,
+                *backend.score(self.strategy),
+            ),
+        )
+
+    def mark_failure(self, backend: Backend, error: str) -> None:
+        backend.errors += 1
+        backend.failures += 1
+        backend.last_error = error
+        if backend.healthy and backend.failures >= self.unhealthy_after:
+            backend.healthy = False
+            logger.warning(f"Ejected Ollama backend {backend.url}: {error}")
+
+    def mark_success(self, backend: Backend) -> None:
+        backend.failures = 0
+        if not backend.healthy:
+            backend.healthy = True
+            logger.info(f"Restored Ollama backend {backend.url}")
+
+    async def send(
+        self,
+        client: httpx.AsyncClient,
+        path: str,
+        payload: Dict[str, Any],
+        timeout: Union[httpx.Timeout, float, None] = None,
+        stream: bool = False,
+    ) -> Tuple[httpx.Response, Lease]:
+        """
+        POST `payload` for payload["model"], failing over before any body is passed on
+
+        With `stream=True` only the headers have been received; the caller owns
+        the response and the lease and must close and release both.
+
+        Returns:
+            (response of the last backend tried, whatever its status, lease on it)
+
+        Raises:
+            httpx.TransportError: The last backend tried could not be reached
+        """
+        model = payload["model"]
+        tried: List[Backend] = []
+        while True:
+            backend = self.pick(model, tried)
+            tried.append(backend)
+            last = len(tried) >= min(self.max_attempts, len(self.backends))
+            lease = Lease(backend)
+            request = client.build_request(
+                "POST", f"{backend.url}{path}", json=payload, timeout=timeout
+            )
+            try:
+                response = await client.send(request, stream=stream)
+            except httpx.TransportError as e:
+                lease.release(completed=False)
+                self.mark_failure(backend, f"{type(e).__name__}: {e}")
+                if last:
+                    raise
+                self.retries += 1
+                logger.warning(f"{backend.url} unreachable for {model}, retrying: {e}")
+                continue
+            except BaseException:
+                lease.release(completed=False)
+                raise
+
+            if response.status_code >= 500:
+                self.mark_failure(backend, f"HTTP {response.status_code}")
+            elif response.status_code == 404:
+                # The model is not pulled on this host (whatever the last inventory said)
+                if backend.models is not None:
+                    backend.models.discard(_base_name(model))
+            else:
+                self.mark_success(backend)
+                return response, lease
+
+            if last:
+                return response, lease
+            await response.aclose()
+            lease.release(completed=False)
+            self.retries += 1
+            logger.warning(f"{backend.url} answered {response.status_code} for {model}, retrying")
+
+    async def post(
+        self,
+        client: httpx.AsyncClient,
+        path: str,
+        payload: Dict[str, Any],
+        timeout: Union[httpx.Timeout, float, None] = None,
+    ) -> httpx.Response:
+        """Non-streaming `send`: the response body has been read and the lease released"""
+        response, lease = await self.send(client, path, payload, timeout)
+        lease.release(completed=response.status_code < 400)
+        return response
+
+    @asynccontextmanager
+    async def stream(
+        self,
+        client: httpx.AsyncClient,
+        path: str,
+        payload: Dict[str, Any],
+        timeout: Union[httpx.Timeout, float, None] = None,
+    ) -> AsyncIterator[httpx.Response]:
+        """Streaming `send` as a context manager that closes the response and releases the lease"""
+        response, lease = await self.send(client, path, payload, timeout, stream=True)
+        completed = False
+        try:
+            yield response
+            completed = True
+        finally:
+            await response.aclose()
+            lease.release(completed)
+
+    async def check(self, client: httpx.AsyncClient, backend: Backend) -> bool:
+        """Active health check: refresh the backend's inventory from /api/tags"""
+        backend.checked_at = time.time()
+        try:
+            response = await client.get(f"{backend.url}/api/tags", timeout=self.health_timeout)
+            response.raise_for_status()
+            backend.models = {
+                _base_name(entry["name"]) for entry in response.json().get("models", [])
+            }
+        except (httpx.HTTPError, ValueError, KeyError) as e:
+            self.mark_failure(backend, f"{type(e).__name__}: {e}")
+            return False
+        self.mark_success(backend)
+        return True
+
+    async def check_all(self, client: httpx.AsyncClient) -> List[bool]:
+        """Check every backend concurrently"""
+        return list(await asyncio.gather(*(self.check(client, b) for b in self.backends)))
+
+    async def run(self, client: httpx.AsyncClient) -> None:
+        """Run health checks every `health_interval` seconds until cancelled"""
+        while True:
+            await self.check_all(client)
+            await asyncio.sleep(self.health_interval)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "strategy": self.strategy,
+            "max_attempts": self.max_attempts,
+            "unhealthy_after": self.unhealthy_after,
+            "retries": self.retries,
+            "healthy": len(self.healthy()),
+            "backends": [backend.get_stats() for backend in self.backends],
+        }
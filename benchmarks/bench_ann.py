@@ -0,0 +1,84 @@
+"""
+ANN recall benchmark
+Measures recall@k and latency of the IVF index against exact VectorIndex search
+
+Usage: python benchmarks/bench_ann.py [--rows 200000] [--dim 256] [--queries 200]
+"""
+
+import argparse
+import os
+import sys
+import time
+from typing import List
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from vector_index import VectorIndex  # noqa: E402
+
+
+def build_corpus(rows: int, dim: int, clusters: int, seed: int) -> np.ndarray:
+    """Clustered synthetic embeddings (real embedding corpora are far from uniform)"""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, clusters, rows)
+    noise = rng.standard_normal((rows, dim)).astype(np.float32) * 0.6
+    data: np.ndarray = centers[labels] + noise
+    return data
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=200_000, help="indexed vectors")
+    parser.add_argument("--dim", type=int, default=256, help="embedding dimension")
+    parser.add_argument("--queries", type=int, default=200, help="queries per measurement")
+    parser.add_argument("--k", type=int, default=10, help="recall@k")
+    parser.add_argument("--lists", type=int, default=None, help="IVF lists (default ~4√n)")
+    args = parser.parse_args()
+
+    corpus = build_corpus(args.rows, args.dim, clusters=max(1, args.rows // 500), seed=0)
+    index = VectorIndex(dim=args.dim, capacity=args.rows)
+    for i, vector in enumerate(corpus):
+        index.add(f"doc-{i}", vector.tolist())
+
+    # Queries are perturbed corpus vectors so every query has true near neighbours
+    rng = np.random.default_rng(1)
+    picks = rng.integers(0, args.rows, args.queries)
+    queries = corpus[picks] + rng.standard_normal((args.queries, args.dim)).astype(np.float32)
+    query_lists: List[List[float]] = [q.tolist() for q in queries]
+
+    start = time.perf_counter()
+    truth = [
+        {doc_id for doc_id, _ in index.search(q, top_k=args.k, min_similarity=-1.0, exact=True)}
+        for q in query_lists
+    ]
+    exact_ms = (time.perf_counter() - start) / args.queries * 1000
+
+    start = time.perf_counter()
+    ann = index.build_ann(n_lists=args.lists)
+    build_s = time.perf_counter() - start
+
+    print(f"Rows: {args.rows}, dim: {args.dim}, lists: {ann.n_lists}, build: {build_s:.1f}s")
+    print(f"{'nprobe':>8} {f'recall@{args.k}':>10} {'ms/query':>10} {'speedup':>8}")
+    print(f"{'exact':>8} {1.0:>10.3f} {exact_ms:>10.2f} {1.0:>7.1f}x")
+
+    for nprobe in (1, 2, 4, 8, 16, 32, 64):
+        if nprobe > ann.n_lists:
+            break
+        start = time.perf_counter()
+        results = [
+            index.search(q, top_k=args.k, min_similarity=-1.0, nprobe=nprobe) for q in query_lists
+        ]
+        ann_ms = (time.perf_counter() - start) / args.queries * 1000
+
+        hits = sum(
+            len(expected & {doc_id for doc_id, _ in found})
+            for expected, found in zip(truth, results)
+        )
+        recall = hits / (args.k * args.queries)
+        print(f"{nprobe:>8} {recall:>10.3f} {ann_ms:>10.2f} {exact_ms / ann_ms:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
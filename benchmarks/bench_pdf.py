@@ -0,0 +1,111 @@
+"""
+PDF extraction benchmark
+Generates a corpus of text PDFs and measures PDFExtractor throughput per worker count
+(requires pypdf)
+
+Usage: python benchmarks/bench_pdf.py [--files 24] [--pages 40] [--workers 1,2,4]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import List, Optional
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from pdf_extractor import PDFExtractor  # noqa: E402
+
+
+def make_pdf(pages: int, lines_per_page: int = 45, seed: int = 0) -> bytes:
+    """Minimal valid PDF with `pages` pages of Helvetica text"""
+    objects: List[bytes] = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"",  # Pages, filled in once the kids are known
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    kids = []
+    for page in range(pages):
+        lines = [
+            f"({seed}-{page}-{line} The quick brown fox jumps over the lazy dog, "
+            f"retrieval augmented generation benchmark line {line}.) Tj T*"
+            for line in range(lines_per_page)
+        ]
+        stream = ("BT /F1 10 Tf 14 TL 40 800 Td " + " ".join(lines) + " ET").encode()
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        content_ref = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_ref
+        )
+        kids.append(b"%d 0 R" % len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(kids), pages)
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (
+        len(objects) + 1,
+        xref,
+    )
+    return bytes(out)
+
+
+async def extract_corpus(extractor: PDFExtractor, files: List[Path]) -> tuple:
+    """Extract every file concurrently; return (pages, seconds, mean time to first page)"""
+    first_page: List[float] = []
+
+    async def one(path: Path) -> int:
+        started = time.perf_counter()
+        pages = 0
+        async for _ in extractor.iter_pages(path):
+            if pages == 0:
+                first_page.append(time.perf_counter() - started)
+            pages += 1
+        return pages
+
+    started = time.perf_counter()
+    counts = await asyncio.gather(*(one(path) for path in files))
+    return sum(counts), time.perf_counter() - started, sum(first_page) / len(first_page)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--files", type=int, default=24, help="PDFs in the corpus")
+    parser.add_argument("--pages", type=int, default=40, help="pages per PDF")
+    parser.add_argument(
+        "--workers", default=",".join(str(w) for w in (1, 2, 4, 8) if w <= (os.cpu_count() or 1))
+    )
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        files = []
+        for i in range(args.files):
+            path = Path(tmp) / f"doc{i}.pdf"
+            path.write_bytes(make_pdf(args.pages, seed=i))
+            files.append(path)
+
+        print(f"Corpus: {args.files} PDFs x {args.pages} pages, CPUs: {os.cpu_count()}")
+        print(f"{'workers':>8} {'pages/s':>10} {'seconds':>8} {'first page ms':>14}")
+        for workers in (int(w) for w in args.workers.split(",")):
+            extractor = PDFExtractor(max_workers=workers, timeout=600, max_pages=args.pages)
+            try:
+                asyncio.run(extract_corpus(extractor, files[:1]))  # start the workers
+                pages, seconds, first_page = asyncio.run(extract_corpus(extractor, files))
+            finally:
+                extractor.shutdown()
+            print(
+                f"{workers:>8} {pages / seconds:>10.0f} {seconds:>8.2f} {first_page * 1000:>14.0f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Router micro-benchmark
+Compares the compiled single-pass router with the previous substring scan
+
+Usage: python benchmarks/bench_router.py [--models 50] [--repeat 200]
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, Optional
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from router import IntelligentRouter  # noqa: E402
+
+
+class LegacyRouter:
+    """Previous implementation: substring scan of every tag of every model"""
+
+    def __init__(self, config: Dict[str, Any]) -> None:
+        self.models = config["models"]
+        self.default_model = config["default_model"]
+
+    def route(self, prompt: str, user_model: Optional[str] = None) -> tuple[str, str]:
+        prompt_lower = prompt.lower()
+        scores = {}
+        for model_name, model_info in self.models.items():
+            score = 0
+            matched_tags = []
+            for tag in model_info["tags"]:
+                if tag.lower() in prompt_lower:
+                    score += 10
+                    matched_tags.append(tag)
+            score += 4 - model_info["priority"]
+            if score > 0:
+                scores[model_name] = {"score": score, "tags": matched_tags}
+        if scores:
+            best = max(scores.items(), key=lambda x: x[1]["score"])
+            return best[0], ", ".join(best[1]["tags"][:3])
+        return self.default_model, "Default general model"
+
+
+def build_config(extra_models: int) -> Dict[str, Any]:
+    """Repository config plus synthetic models to simulate a larger deployment"""
+    with open(os.path.join(os.path.dirname(__file__), "..", "config.json")) as f:
+        config: Dict[str, Any] = json.load(f)
+
+    rng = random.Random(42)
+    for i in range(extra_models):
+        config["models"][f"synthetic-{i}:latest"] = {
+            "role": "synthetic",
+            "tags": [f"topic{i}x{j}" for j in range(rng.randint(5, 20))],
+            "priority": 3,
+        }
+    return config
+
+
+def build_prompt(length: int) -> str:
+    words = ["please", "write", "a", "function", "that", "parses", "the", "capital", "good"]
+    words += ["python", "input", "and", "returns", "json", "output", "quickly", "story"]
+    rng = random.Random(length)
+    parts = []
+    size = 0
+    while size < length:
+        word = rng.choice(words)
+        parts.append(word)
+        size += len(word) + 1
+    return " ".join(parts)[:length]
+
+
+def bench(route: Callable[[str], Any], prompt: str, repeat: int) -> float:
+    """Return mean microseconds per route() call"""
+    route(prompt)  # warm-up
+    start = time.perf_counter()
+    for _ in range(repeat):
+        route(prompt)
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--models", type=int, default=50, help="synthetic models to add")
+    parser.add_argument("--repeat", type=int, default=200, help="calls per measurement")
+    args = parser.parse_args()
+
+    config = build_config(args.models)
+    with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as tmp:
+        json.dump(config, tmp)
+    try:
+        compiled = IntelligentRouter(tmp.name)
+    finally:
+        os.unlink(tmp.name)
+    legacy = LegacyRouter(config)
+
+    print(f"Models: {len(config['models'])}, repeat: {args.repeat}")
+    print(f"{'prompt':>10} {'legacy µs':>12} {'compiled µs':>12} {'speedup':>8}")
+    for length in (100, 100_000):
+        prompt = build_prompt(length)
+        repeat = args.repeat if length <= 1000 else max(1, args.repeat // 20)
+        legacy_us = bench(legacy.route, prompt, repeat)
+        compiled_us = bench(compiled.route, prompt, repeat)
+        print(
+            f"{length:>10} {legacy_us:>12.1f} {compiled_us:>12.1f} "
+            f"{legacy_us / compiled_us:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
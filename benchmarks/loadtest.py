@@ -0,0 +1,379 @@
+"""
+Gateway load test
+Drives /v1/chat/completions against the mock Ollama server at several concurrency levels and
+reports req/s, TTFT, p50/p95/p99 latency and gateway CPU/RSS per token; results are saved as JSON
+
+Usage: python benchmarks/loadtest.py [--concurrency 1,8,32] [--requests 200] [--mode stream|json]
+       python benchmarks/loadtest.py --gateway-url http://127.0.0.1:4000 --gateway-pid 1234
+
+By default both the mock (benchmarks/mock_ollama.py) and the gateway (uvicorn main:app) are
+started as subprocesses on free ports and stopped at the end.
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import socket
+import subprocess  # nosec B404
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+try:
+    import psutil
+except ImportError:  # pragma: no cover - optional dependency
+    psutil = None  # type: ignore[assignment]
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """Nearest-rank percentile (q in 0..100) or None for no values"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = min(len(ordered), max(1, math.ceil(q / 100 * len(ordered))))
+    return ordered[rank - 1]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port: int = sock.getsockname()[1]
+        return port
+
+
+class ProcessSampler:
+    """CPU time and resident memory of a process (psutil, or /proc on Linux)"""
+
+    def __init__(self, pid: int) -> None:
+        self.pid = pid
+        self._process = psutil.Process(pid) if psutil is not None else None
+        self._ticks = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+    @property
+    def available(self) -> bool:
+        return self._process is not None or Path(f"/proc/{self.pid}/stat").exists()
+
+    def cpu_seconds(self) -> Optional[float]:
+        if self._process is not None:
+            times = self._process.cpu_times()
+            return float(times.user + times.system)
+        try:
+            fields = Path(f"/proc/{self.pid}/stat").read_text().rsplit(")", 1)[1].split()
+        except OSError:
+            return None
+        # utime and stime are fields 14 and 15 of /proc/<pid>/stat
+        return (int(fields[11]) + int(fields[12])) / self._ticks
+
+    def rss_bytes(self) -> Optional[int]:
+        if self._process is not None:
+            return int(self._process.memory_info().rss)
+        try:
+            for line in Path(f"/proc/{self.pid}/status").read_text().splitlines():
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+        except OSError:
+            pass
+        return None
+
+
+async def wait_until_up(
+    url: str, process: "subprocess.Popen[bytes]", timeout: float = 30.0
+) -> None:
+    """Poll `url` until it answers; fail early if the process serving it exits"""
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while True:
+            try:
+                await client.get(url, timeout=1.0)
+                return
+            except httpx.HTTPError:
+                if process.poll() is not None:
+                    raise RuntimeError(f"{process.args!r} exited with {process.returncode}")
+                if time.monotonic() > deadline:
+                    raise RuntimeError(f"{url} did not come up within {timeout:.0f}s")
+                await asyncio.sleep(0.2)
+
+
+async def one_request(client: httpx.AsyncClient, url: str, body: Dict[str, Any]) -> Dict[str, Any]:
+    """Send one completion; return status, latency, TTFT (streams) and completion tokens"""
+    started = time.perf_counter()
+    ttft: Optional[float] = None
+    tokens = 0
+    try:
+        if body["stream"]:
+            async with client.stream("POST", url, json=body) as response:
+                if response.status_code != 200:
+                    await response.aread()
+                    return {"status": response.status_code}
+                async for line in response.aiter_lines():
+                    if not line.startswith("data: ") or line == "data: [DONE]":
+                        continue
+                    delta = json.loads(line[6:])["choices"][0]["delta"]
+                    if delta.get("content"):
+                        if ttft is None:
+                            ttft = time.perf_counter() - started
+                        tokens += 1
+        else:
+            response = await client.post(url, json=body)
+            if response.status_code != 200:
+                return {"status": response.status_code}
+            tokens = response.json()["usage"]["completion_tokens"]
+    except httpx.HTTPError as e:
+        return {"status": type(e).__name__}
+    return {
+        "status": 200,
+        "latency": time.perf_counter() - started,
+        "ttft": ttft,
+        "tokens": tokens,
+    }
+
+
+async def run_level(
+    url: str,
+    body: Dict[str, Any],
+    concurrency: int,
+    requests: int,
+    sampler: Optional[ProcessSampler],
+) -> Dict[str, Any]:
+    """Send `requests` completions with `concurrency` in flight and summarize them"""
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    results: List[Dict[str, Any]] = []
+    remaining = iter(range(requests))
+    peak_rss = 0
+
+    async with httpx.AsyncClient(limits=limits, timeout=300.0) as client:
+
+        async def worker() -> None:
+            for _ in remaining:
+                results.append(await one_request(client, url, body))
+
+        async def sample_rss() -> None:
+            nonlocal peak_rss
+            while True:
+                peak_rss = max(peak_rss, (sampler.rss_bytes() if sampler else 0) or 0)
+                await asyncio.sleep(0.1)
+
+        cpu_before = sampler.cpu_seconds() if sampler else None
+        rss_before = sampler.rss_bytes() if sampler else None
+        monitor = asyncio.ensure_future(sample_rss())
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+        monitor.cancel()
+        cpu_after = sampler.cpu_seconds() if sampler else None
+
+    ok = [r for r in results if r["status"] == 200]
+    errors: Dict[str, int] = {}
+    for r in results:
+        if r["status"] != 200:
+            errors[str(r["status"])] = errors.get(str(r["status"]), 0) + 1
+    tokens = sum(r["tokens"] for r in ok)
+    latencies = [r["latency"] for r in ok]
+    ttfts = [r["ttft"] for r in ok if r["ttft"] is not None]
+
+    def ms(value: Optional[float]) -> Optional[float]:
+        return round(value * 1000, 2) if value is not None else None
+
+    summary: Dict[str, Any] = {
+        "concurrency": concurrency,
+        "requests": len(results),
+        "ok": len(ok),
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "req_per_s": round(len(ok) / elapsed, 2),
+        "tokens_per_s": round(tokens / elapsed, 1),
+        "latency_ms": {f"p{q}": ms(percentile(latencies, q)) for q in (50, 95, 99)},
+        "ttft_ms": {f"p{q}": ms(percentile(ttfts, q)) for q in (50, 95, 99)},
+    }
+    if cpu_before is not None and cpu_after is not None:
+        cpu = cpu_after - cpu_before
+        summary["gateway_cpu_s"] = round(cpu, 3)
+        summary["gateway_cpu_ms_per_token"] = round(cpu * 1000 / tokens, 4) if tokens else None
+        summary["gateway_cpu_ms_per_request"] = round(cpu * 1000 / len(ok), 3) if ok else None
+    if rss_before is not None:
+        summary["gateway_rss_mb"] = round(rss_before / 1024**2, 1)
+        summary["gateway_peak_rss_mb"] = round(max(peak_rss, rss_before) / 1024**2, 1)
+        summary["gateway_rss_kb_per_1k_tokens"] = (
+            round((max(peak_rss, rss_before) - rss_before) / 1024 / tokens * 1000, 2)
+            if tokens
+            else None
+        )
+    return summary
+
+
+def git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(  # nosec B603 B607
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=REPO_ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return out.stdout.strip()
+
+
+def print_table(levels: List[Dict[str, Any]]) -> None:
+    print(
+        f"{'conc':>5} {'ok':>6} {'err':>5} {'req/s':>8} {'tok/s':>9} {'p50 ms':>8} "
+        f"{'p95 ms':>8} {'p99 ms':>8} {'ttft p50':>9} {'cpu ms/tok':>11} {'rss MB':>7}"
+    )
+    for level in levels:
+        errors = sum(level["errors"].values())
+        latency, ttft = level["latency_ms"], level["ttft_ms"]
+        print(
+            f"{level['concurrency']:>5} {level['ok']:>6} {errors:>5} {level['req_per_s']:>8} "
+            f"{level['tokens_per_s']:>9} {latency['p50'] or '-':>8} {latency['p95'] or '-':>8} "
+            f"{latency['p99'] or '-':>8} {ttft['p50'] or '-':>9} "
+            f"{level.get('gateway_cpu_ms_per_token') or '-':>11} "
+            f"{level.get('gateway_peak_rss_mb') or '-':>7}"
+        )
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    processes: List["subprocess.Popen[bytes]"] = []
+    try:
+        ollama_url = args.ollama_url
+        if ollama_url is None and args.gateway_url is None:
+            port = free_port()
+            ollama_url = f"http://127.0.0.1:{port}"
+            mock_cmd = [
+                sys.executable,
+                str(REPO_ROOT / "benchmarks" / "mock_ollama.py"),
+                f"--port={port}",
+                f"--tokens={args.mock_tokens}",
+                f"--tokens-per-s={args.mock_tokens_per_s}",
+                f"--latency-ms={args.mock_latency_ms}",
+            ]
+            mock = subprocess.Popen(mock_cmd)  # nosec B603
+            processes.append(mock)
+            await wait_until_up(f"{ollama_url}/api/tags", mock)
+
+        gateway_url = args.gateway_url
+        gateway_pid = args.gateway_pid
+        if gateway_url is None:
+            port = free_port()
+            gateway_url = f"http://127.0.0.1:{port}"
+            env = {
+                **os.environ,
+                "OLLAMA_BASE_URL": ollama_url,
+                "GATEWAY_PORT": str(port),
+                "ENABLE_LOGGING": "false",
+            }
+            gateway_cmd = [
+                sys.executable,
+                "-m",
+                "uvicorn",
+                "main:app",
+                "--host=127.0.0.1",
+                f"--port={port}",
+                "--log-level=warning",
+            ]
+            gateway = subprocess.Popen(gateway_cmd, cwd=REPO_ROOT, env=env)  # nosec B603
+            processes.append(gateway)
+            gateway_pid = gateway.pid
+            await wait_until_up(f"{gateway_url}/health", gateway)
+
+        sampler = ProcessSampler(gateway_pid) if gateway_pid else None
+        if sampler is not None and not sampler.available:
+            sampler = None
+
+        url = f"{gateway_url}/v1/chat/completions"
+        body: Dict[str, Any] = {
+            "messages": [{"role": "user", "content": args.prompt}],
+            "stream": args.mode == "stream",
+            "temperature": args.temperature,
+        }
+        if args.model:
+            body["model"] = args.model
+
+        # Warm up connections, routing caches and the mock
+        await run_level(url, body, 2, 4, None)
+
+        levels = []
+        for concurrency in (int(c) for c in args.concurrency.split(",")):
+            requests = max(args.requests, concurrency)
+            levels.append(await run_level(url, body, concurrency, requests, sampler))
+
+        return {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "git_commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "settings": {
+                "mode": args.mode,
+                "requests": args.requests,
+                "prompt": args.prompt,
+                "model": args.model,
+                "temperature": args.temperature,
+                "mock": (
+                    {
+                        "tokens": args.mock_tokens,
+                        "tokens_per_s": args.mock_tokens_per_s,
+                        "latency_ms": args.mock_latency_ms,
+                    }
+                    if args.ollama_url is None and args.gateway_url is None
+                    else None
+                ),
+            },
+            "levels": levels,
+        }
+    finally:
+        for process in reversed(processes):
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--concurrency", default="1,8,32", help="comma-separated levels")
+    parser.add_argument("--requests", type=int, default=200, help="requests per level")
+    parser.add_argument("--mode", choices=("stream", "json"), default="stream")
+    parser.add_argument("--prompt", default="Explain how a hash map works")
+    parser.add_argument("--model", default=None, help="pin a model instead of routing")
+    parser.add_argument(
+        "--temperature", type=float, default=0.7, help="0 enables caching/coalescing"
+    )
+    parser.add_argument("--mock-tokens", type=int, default=64)
+    parser.add_argument("--mock-tokens-per-s", type=float, default=200.0)
+    parser.add_argument("--mock-latency-ms", type=float, default=20.0)
+    parser.add_argument("--ollama-url", default=None, help="use this Ollama instead of the mock")
+    parser.add_argument("--gateway-url", default=None, help="use a running gateway")
+    parser.add_argument("--gateway-pid", type=int, default=None, help="its pid, for CPU/RSS")
+    parser.add_argument("--output", default=None, help="JSON results path")
+    args = parser.parse_args(argv)
+
+    report = asyncio.run(run(args))
+    print_table(report["levels"])
+
+    output = Path(
+        args.output
+        or REPO_ROOT
+        / "benchmarks"
+        / "results"
+        / f"loadtest-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+"""
+Stand-in Ollama server for benchmarks
+Speaks /api/chat (streaming and not), /api/embed, /api/embeddings, /api/tags, /api/ps and
+/api/generate with a configurable first-token latency and token rate; no model is loaded
+
+Usage: python benchmarks/mock_ollama.py [--port 11435] [--tokens 64] [--tokens-per-s 200]
+                                        [--latency-ms 20] [--embedding-dim 768]
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import numpy as np
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+MODELS = [
+    "qwen2.5-coder:7b",
+    "gemma2:latest",
+    "huihui_ai/qwen3-abliterated:latest",
+    "llama3.2:latest",
+    "mistral:latest",
+    "nomic-embed-text:latest",
+]
+
+
+class MockOllama:
+    """
+    Deterministic fake Ollama
+
+    A reply has `tokens` tokens; the first arrives after `latency_ms` (reported
+    as prompt_eval_duration) and the rest at `tokens_per_s` (eval_duration).
+    Embeddings are pseudo-random unit vectors seeded by the text, so equal
+    texts get equal vectors.
+    """
+
+    def __init__(
+        self,
+        tokens: int = 64,
+        tokens_per_s: float = 200.0,
+        latency_ms: float = 20.0,
+        embedding_dim: int = 768,
+    ) -> None:
+        self.tokens = tokens
+        self.tokens_per_s = tokens_per_s
+        self.latency_s = latency_ms / 1000
+        self.embedding_dim = embedding_dim
+        self.loaded: Dict[str, float] = {}
+        self.requests = 0
+
+    def _final(self, model: str, messages: List[Dict[str, Any]]) -> Dict[str, Any]:
+        prompt_tokens = sum(len(str(m.get("content", "")).split()) for m in messages)
+        return {
+            "model": model,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "done": True,
+            "done_reason": "stop",
+            "total_duration": int((self.latency_s + self.tokens / self.tokens_per_s) * 1e9),
+            "load_duration": 1_000_000,
+            "prompt_eval_count": prompt_tokens,
+            "prompt_eval_duration": int(self.latency_s * 1e9),
+            "eval_count": self.tokens,
+            "eval_duration": int(self.tokens / self.tokens_per_s * 1e9),
+        }
+
+    async def _token_times(self) -> AsyncIterator[int]:
+        """Yield token indices on schedule (absolute deadlines, so sleeps do not drift)"""
+        loop = asyncio.get_running_loop()
+        start = loop.time() + self.latency_s
+        for index in range(self.tokens):
+            delay = start + index / self.tokens_per_s - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            yield index
+
+    async def chat(self, request: Request) -> Response:
+        body = await request.json()
+        model = body.get("model", MODELS[0])
+        messages = body.get("messages", [])
+        self.requests += 1
+        self.loaded[model] = time.time()
+
+        if body.get("stream", True):
+
+            async def lines() -> AsyncIterator[bytes]:
+                async for index in self._token_times():
+                    line = {
+                        "model": model,
+                        "message": {"role": "assistant", "content": f"tok{index} "},
+                        "done": False,
+                    }
+                    yield json.dumps(line).encode() + b"\n"
+                final = self._final(model, messages)
+                final["message"] = {"role": "assistant", "content": ""}
+                yield json.dumps(final).encode() + b"\n"
+
+            return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+        async for _ in self._token_times():
+            pass
+        reply = self._final(model, messages)
+        reply["message"] = {
+            "role": "assistant",
+            "content": "".join(f"tok{index} " for index in range(self.tokens)),
+        }
+        return JSONResponse(reply)
+
+    def _embedding(self, text: str) -> List[float]:
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+        vector = np.random.default_rng(seed).standard_normal(self.embedding_dim)
+        result: List[float] = (vector / np.linalg.norm(vector)).tolist()
+        return result
+
+    async def embed(self, request: Request) -> Response:
+        body = await request.json()
+        texts = body.get("input", [])
+        if isinstance(texts, str):
+            texts = [texts]
+        self.requests += 1
+        await asyncio.sleep(self.latency_s)
+        return JSONResponse(
+            {
+                "model": body.get("model"),
+                "embeddings": [self._embedding(text) for text in texts],
+                "prompt_eval_count": sum(len(text.split()) for text in texts),
+            }
+        )
+
+    async def embeddings(self, request: Request) -> Response:
+        body = await request.json()
+        self.requests += 1
+        await asyncio.sleep(self.latency_s)
+        return JSONResponse({"embedding": self._embedding(body.get("prompt", ""))})
+
+    async def generate(self, request: Request) -> Response:
+        """Only the empty-prompt load/unload form used for keep-alive"""
+        body = await request.json()
+        model = body.get("model", MODELS[0])
+        if body.get("keep_alive") == 0:
+            self.loaded.pop(model, None)
+        else:
+            self.loaded[model] = time.time()
+        return JSONResponse({"model": model, "response": "", "done": True, "load_duration": 0})
+
+    async def tags(self, request: Request) -> Response:
+        return JSONResponse(
+            {"models": [{"name": name, "model": name, "size": 4_000_000_000} for name in MODELS]}
+        )
+
+    async def ps(self, request: Request) -> Response:
+        expires = (datetime.now(timezone.utc) + timedelta(minutes=5)).isoformat()
+        return JSONResponse(
+            {
+                "models": [
+                    {"name": name, "model": name, "size": 4_000_000_000, "expires_at": expires}
+                    for name in self.loaded
+                ]
+            }
+        )
+
+    def app(self) -> Starlette:
+        return Starlette(
+            routes=[
+                Route("/api/chat", self.chat, methods=["POST"]),
+                Route("/api/embed", self.embed, methods=["POST"]),
+                Route("/api/embeddings", self.embeddings, methods=["POST"]),
+                Route("/api/generate", self.generate, methods=["POST"]),
+                Route("/api/tags", self.tags, methods=["GET"]),
+                Route("/api/ps", self.ps, methods=["GET"]),
+            ]
+        )
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--tokens", type=int, default=64, help="tokens per reply")
+    parser.add_argument("--tokens-per-s", type=float, default=200.0, help="generation rate")
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="time to first token")
+    parser.add_argument("--embedding-dim", type=int, default=768)
+    args = parser.parse_args(argv)
+
+    mock = MockOllama(args.tokens, args.tokens_per_s, args.latency_ms, args.embedding_dim)
+    uvicorn.run(mock.app(), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,323 @@
+"""
+Document chunking for RAG ingestion
+Splits files into overlapping, token-bounded chunks at structural boundaries
+(code definitions, markdown headings, paragraphs, CSV row groups)
+"""
+
+import asyncio
+import itertools
+import logging
+import re
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, AsyncIterator, Dict, Iterable, Iterator, List, Optional
+
+if TYPE_CHECKING:
+    from pdf_extractor import PDFExtractor
+
+logger = logging.getLogger(__name__)
+
+CODE_EXTENSIONS = {
+    ".py",
+    ".js",
+    ".ts",
+    ".jsx",
+    ".tsx",
+    ".java",
+    ".c",
+    ".cpp",
+    ".cs",
+    ".go",
+    ".rs",
+    ".rb",
+    ".php",
+    ".html",
+    ".css",
+    ".scss",
+    ".sql",
+}
+MARKDOWN_EXTENSIONS = {".md", ".markdown"}
+CSV_EXTENSIONS = {".csv"}
+
+# Chunks read per thread hop by aiter_attachment_chunks for files chunked synchronously
+THREAD_BATCH = 32
+
+# A new function/class/type definition at (at most) one indentation level
+_CODE_BOUNDARY_RE = re.compile(
+    r"^\s{0,4}(?:(?:export|default|public|private|protected|internal|static|final|abstract|"
+    r"virtual|override|async|pub(?:\([\w:]+\))?|unsafe|extern)\s+)*"
+    r"(?:def|class|function|interface|struct|enum|trait|impl|fn|func|module|namespace|type|"
+    r"CREATE)\b"
+)
+# Lines that belong to the definition that follows them (decorators, attributes, comments)
+_CODE_LEAD_RE = re.compile(r"^\s*(?:@|#\[|//|/\*|\*|#(?!include)|--)")
+_HEADING_RE = re.compile(r"^#{1,6}\s")
+_FENCE_RE = re.compile(r"^\s*(?:```|~~~)")
+
+
+class Chunker:
+    """
+    Streaming, token-aware text chunker
+
+    Input is consumed line by line, so a file is never loaded whole. Lines are
+    grouped into sections at structural boundaries, and sections are packed
+    into chunks of at most `max_tokens` (estimated at `chars_per_token`
+    characters per token, the same estimate used elsewhere in the gateway).
+    Consecutive chunks share up to `overlap_tokens` of trailing lines; CSV
+    chunks do not overlap but each one repeats the header row. Sections
+    larger than a chunk are split by lines, and overlong lines by characters.
+    """
+
+    def __init__(
+        self, max_tokens: int = 512, overlap_tokens: int = 64, chars_per_token: float = 4.0
+    ) -> None:
+        if max_tokens <= 0:
+            raise ValueError("max_tokens must be positive")
+        if not 0 <= overlap_tokens < max_tokens:
+            raise ValueError("overlap_tokens must be >= 0 and smaller than max_tokens")
+
+        self.max_tokens = max_tokens
+        self.overlap_tokens = overlap_tokens
+        self.chars_per_token = chars_per_token
+        self.max_chars = int(max_tokens * chars_per_token)
+        self.overlap_chars = int(overlap_tokens * chars_per_token)
+
+    def estimate_tokens(self, text: str) -> int:
+        """Approximate token count of a text"""
+        return int(len(text) / self.chars_per_token)
+
+    @staticmethod
+    def kind_for(extension: str) -> str:
+        """Chunking strategy for a file extension: code, markdown, csv or text"""
+        extension = extension.lower()
+        if extension in CODE_EXTENSIONS:
+            return "code"
+        if extension in MARKDOWN_EXTENSIONS:
+            return "markdown"
+        if extension in CSV_EXTENSIONS:
+            return "csv"
+        return "text"
+
+    def chunk_lines(self, lines: Iterable[str], extension: str = ".txt") -> Iterator[str]:
+        """
+        Lazily chunk a stream of lines (newlines included, as from a text file)
+
+        Code chunks are wrapped in a fenced block tagged with the language, as
+        AttachmentHandler does for whole files.
+        """
+        kind = self.kind_for(extension)
+        if kind == "csv":
+            yield from self._chunk_csv(lines)
+            return
+
+        if kind == "code":
+            opening, closing = f"```{extension.lower().lstrip('.')}\n", "```"
+            budget = max(1, self.max_chars - len(opening) - len(closing) - 1)
+            for body in self._pack(self._sections(lines, kind), budget, self.overlap_chars):
+                yield opening + body.rstrip("\n") + "\n" + closing
+            return
+
+        yield from self._pack(self._sections(lines, kind), self.max_chars, self.overlap_chars)
+
+    def chunk_text(self, text: str, extension: str = ".txt") -> Iterator[str]:
+        """Chunk an in-memory text"""
+        return self.chunk_lines(text.splitlines(keepends=True), extension)
+
+    def chunk_file(self, file_path: Path, extension: Optional[str] = None) -> Iterator[str]:
+        """Chunk a text file, reading it incrementally"""
+        file_path = Path(file_path)
+        with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
+            yield from self.chunk_lines(f, extension or file_path.suffix)
+
+    def _sections(self, lines: Iterable[str], kind: str) -> Iterator[List[str]]:
+        """Group lines into sections, each starting at a structural boundary"""
+        section: List[str] = []
+        in_fence = False
+        previous_blank = False
+
+        for line in lines:
+            blank = not line.strip()
+            if kind == "code":
+                # Definitions, or any top-level statement after a blank line
+                starts = bool(_CODE_BOUNDARY_RE.match(line)) or (
+                    previous_blank and not blank and not line[0].isspace() and line[0] not in "})]"
+                )
+            elif kind == "markdown":
+                if _FENCE_RE.match(line):
+                    in_fence = not in_fence
+                starts = not in_fence and bool(_HEADING_RE.match(line))
+            else:
+                # Plain text: paragraphs
+                starts = previous_blank and not blank
+            previous_blank = blank
+
+            if starts and section:
+                split = len(section)
+                if kind == "code":
+                    # Keep decorators and doc comments with the definition below them
+                    while split > 0 and _CODE_LEAD_RE.match(section[split - 1]):
+                        split -= 1
+                if split > 0:
+                    yield section[:split]
+                    section = section[split:]
+            section.append(line)
+
+        if section:
+            yield section
+
+    @staticmethod
+    def _split_oversized(section: List[str], budget: int) -> Iterator[List[str]]:
+        """Break a section larger than one chunk into lines, and lines into pieces"""
+        for line in section:
+            if len(line) <= budget:
+                yield [line]
+            else:
+                for start in range(0, len(line), budget):
+                    yield [line[start : start + budget]]
+
+    def _pack(self, sections: Iterable[List[str]], budget: int, overlap: int) -> Iterator[str]:
+        """Greedily pack sections into chunks of at most `budget` characters"""
+        current: List[str] = []
+        size = 0
+
+        for section in sections:
+            section_size = sum(len(line) for line in section)
+            units = (
+                self._split_oversized(section, budget) if section_size > budget else iter([section])
+            )
+            for unit in units:
+                unit_size = sum(len(line) for line in unit)
+                if current and size + unit_size > budget:
+                    text = "".join(current)
+                    if text.strip():
+                        yield text
+
+                    # Carry trailing whole lines into the next chunk as overlap
+                    room = min(overlap, budget - unit_size)
+                    tail: List[str] = []
+                    tail_size = 0
+                    for line in reversed(current):
+                        if tail_size + len(line) > room:
+                            break
+                        tail.append(line)
+                        tail_size += len(line)
+                    current, size = tail[::-1], tail_size
+
+                current.extend(unit)
+                size += unit_size
+
+        text = "".join(current)
+        if text.strip():
+            yield text
+
+    def _chunk_csv(self, lines: Iterable[str]) -> Iterator[str]:
+        """Group CSV records into chunks, repeating the header row in each"""
+        records = self._csv_records(lines)
+        header = next(records, None)
+        if header is None:
+            return
+        if not header.endswith("\n"):
+            header += "\n"
+
+        budget = max(self.max_chars - len(header), self.max_chars // 2)
+        for body in self._pack(([record] for record in records), budget, 0):
+            yield header + body
+
+    @staticmethod
+    def _csv_records(lines: Iterable[str]) -> Iterator[str]:
+        """Join physical lines into records (quoted fields may contain newlines)"""
+        pending: List[str] = []
+        quotes = 0
+        for line in lines:
+            pending.append(line)
+            quotes += line.count('"')
+            if quotes % 2 == 0:
+                yield "".join(pending)
+                pending, quotes = [], 0
+        if pending:
+            yield "".join(pending)
+
+
+def iter_attachment_chunks(
+    attachment: Dict[str, Any], chunker: Optional[Chunker] = None
+) -> Iterator[Dict[str, Any]]:
+    """
+    RAG documents for a saved attachment, one per chunk
+
+    Chunk ids are `<project_id>/<attachment_id>:<n>`: attachments are shared
+    across projects by content hash, so the project keeps each project's chunks
+    apart while every chunk still links back to its attachment. Text files are
+    read incrementally; other formats (PDF) are chunked from the extracted
+    `text_content`.
+
+    Args:
+        attachment: Metadata returned by AttachmentHandler.save_attachment
+
+    Yields:
+        {"doc_id", "content", "metadata", "project_id"} for RAGEngine.add_documents
+    """
+    chunker = chunker or Chunker()
+    file_path = Path(attachment["file_path"])
+    extension = attachment.get("extension") or file_path.suffix.lower()
+
+    if extension == ".pdf":
+        chunks = chunker.chunk_text(attachment.get("text_content") or "")
+    else:
+        chunks = chunker.chunk_file(file_path, extension)
+
+    for n, content in enumerate(chunks):
+        yield _chunk_document(attachment, n, content)
+
+
+async def aiter_attachment_chunks(
+    attachment: Dict[str, Any],
+    chunker: Optional[Chunker] = None,
+    pdf_extractor: Optional["PDFExtractor"] = None,
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Async variant of iter_attachment_chunks
+
+    With a PDF extractor, PDF pages are chunked as they come out of the
+    worker processes (chunks never span pages and record their page number),
+    so embedding starts before the whole document is parsed. Other files are
+    read and chunked in a thread, THREAD_BATCH chunks at a time, so the event
+    loop is never blocked on file I/O.
+    """
+    chunker = chunker or Chunker()
+    extension = attachment.get("extension") or Path(attachment["file_path"]).suffix.lower()
+
+    if extension != ".pdf" or pdf_extractor is None or not pdf_extractor.available:
+        documents = iter_attachment_chunks(attachment, chunker)
+        while True:
+            batch = await asyncio.to_thread(list, itertools.islice(documents, THREAD_BATCH))
+            for document in batch:
+                yield document
+            if len(batch) < THREAD_BATCH:
+                return
+
+    n = 0
+    async for page, text in pdf_extractor.iter_pages(Path(attachment["file_path"])):
+        for content in chunker.chunk_text(text):
+            document = _chunk_document(attachment, n, content)
+            document["metadata"]["page"] = page
+            yield document
+            n += 1
+
+
+def attachment_doc_prefix(project_id: str, attachment_id: str) -> str:
+    """Common prefix of the chunk ids of an attachment in a project"""
+    return f"{project_id}/{attachment_id}:"
+
+
+def _chunk_document(attachment: Dict[str, Any], n: int, content: str) -> Dict[str, Any]:
+    attachment_id = attachment["attachment_id"]
+    return {
+        "doc_id": f"{attachment_doc_prefix(attachment['project_id'], attachment_id)}{n}",
+        "content": content,
+        "metadata": {
+            "source": "attachment",
+            "attachment_id": attachment_id,
+            "filename": attachment.get("filename"),
+            "chunk": n,
+        },
+        "project_id": attachment["project_id"],
+    }
@@ -0,0 +1,196 @@
+"""
+Content-addressed embedding cache
+In-memory LRU (byte budget) in front of an on-disk float32 store, keyed by (model, text hash);
+the disk store has its own byte budget and drops its least recently used files
+"""
+
+import hashlib
+import logging
+import os
+import unicodedata
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingCache:
+    """
+    Two-tier cache for deterministic embedding models
+
+    Keys are SHA-256 digests of the embedding model name and the normalized
+    text (Unicode NFC, surrounding whitespace stripped). Vectors are kept as
+    float32 arrays in an LRU bounded by `max_memory_bytes`; when a cache
+    directory is given, every vector is also written there as raw float32
+    bytes (`<dir>/<2-char prefix>/<digest>.f32`) and survives restarts.
+
+    The directory is bounded by `max_disk_bytes`: a disk hit touches the
+    file's mtime, and once a write takes the store over budget the files
+    with the oldest mtime are removed until it is back to 90% of it.
+    """
+
+    def __init__(
+        self,
+        cache_dir: Optional[Path] = None,
+        max_memory_bytes: int = 64 * 1024 * 1024,
+        max_disk_bytes: int = 512 * 1024 * 1024,
+    ) -> None:
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+
+        # Bytes on disk as seen by this process (other workers' writes are
+        # counted when pruning rescans the directory)
+        self._disk_bytes = 0
+        if self.cache_dir:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            self._disk_bytes = sum(size for _, size, _ in self._disk_entries())
+        self.pruned = 0
+
+        self._memory: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._memory_bytes = 0
+
+        self.hits = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """Canonical form of a text before hashing"""
+        return unicodedata.normalize("NFC", text).strip()
+
+    @classmethod
+    def make_key(cls, model: str, text: str) -> str:
+        """Cache key for an embedding of `text` by `model`"""
+        digest = hashlib.sha256()
+        digest.update(model.encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(cls.normalize(text).encode("utf-8"))
+        return digest.hexdigest()
+
+    def _disk_path(self, key: str) -> Path:
+        assert self.cache_dir is not None
+        return self.cache_dir / key[:2] / f"{key}.f32"
+
+    def _disk_entries(self) -> List[Tuple[float, int, Path]]:
+        """(mtime, size, path) of every stored vector"""
+        assert self.cache_dir is not None
+        entries = []
+        for path in self.cache_dir.glob("*/*.f32"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def _prune_disk(self) -> None:
+        """Remove least recently used files until the store is back under 90% of its budget"""
+        entries = sorted(self._disk_entries())
+        total = sum(size for _, size, _ in entries)
+        target = self.max_disk_bytes * 0.9
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                # Another process may have it open (Windows); it goes next time
+                logger.debug(f"Could not prune embedding cache entry {path}: {e}")
+                continue
+            total -= size
+            self.pruned += 1
+        self._disk_bytes = total
+
+    def _remember(self, key: str, vector: np.ndarray) -> None:
+        if vector.nbytes > self.max_memory_bytes:
+            return
+        previous = self._memory.pop(key, None)
+        if previous is not None:
+            self._memory_bytes -= previous.nbytes
+        self._memory[key] = vector
+        self._memory_bytes += vector.nbytes
+
+        # Evict least recently used entries beyond the byte budget
+        while self._memory_bytes > self.max_memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= evicted.nbytes
+
+    def get(self, model: str, text: str) -> Optional[List[float]]:
+        """Return the cached embedding or None"""
+        key = self.make_key(model, text)
+
+        vector = self._memory.get(key)
+        if vector is not None:
+            self._memory.move_to_end(key)
+            self.hits += 1
+            self.memory_hits += 1
+            result: List[float] = vector.tolist()
+            return result
+
+        if self.cache_dir is not None:
+            path = self._disk_path(key)
+            try:
+                vector = np.fromfile(path, dtype=np.float32)
+            except (FileNotFoundError, OSError):
+                vector = None
+            if vector is not None and vector.size:
+                try:
+                    os.utime(path)  # Recently used: pruned last
+                except OSError:
+                    pass
+                self._remember(key, vector)
+                self.hits += 1
+                self.disk_hits += 1
+                result = vector.tolist()
+                return result
+
+        self.misses += 1
+        return None
+
+    def put(self, model: str, text: str, embedding: List[float]) -> None:
+        """Store an embedding in memory and, if configured, on disk"""
+        key = self.make_key(model, text)
+        vector = np.asarray(embedding, dtype=np.float32)
+        self._remember(key, vector)
+
+        if self.cache_dir is not None:
+            path = self._disk_path(key)
+            if path.exists():
+                return
+            try:
+                path.parent.mkdir(exist_ok=True)
+                # Per-process name: workers may store the same key at once
+                tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+                vector.tofile(tmp_path)
+                os.replace(tmp_path, path)
+            except OSError as e:
+                logger.warning(f"Failed to write embedding cache entry: {e}")
+                return
+            self._disk_bytes += vector.nbytes
+            if self._disk_bytes > self.max_disk_bytes:
+                self._prune_disk()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and memory usage"""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "memory_entries": len(self._memory),
+            "memory_bytes": self._memory_bytes,
+            "max_memory_bytes": self.max_memory_bytes,
+            "disk_enabled": self.cache_dir is not None,
+            "disk_bytes": self._disk_bytes,
+            "max_disk_bytes": self.max_disk_bytes,
+            "disk_pruned": self.pruned,
+        }
@@ -0,0 +1,106 @@
+"""
+Inter-process file locks
+Exclusive advisory locks on a lock file (fcntl on POSIX, msvcrt on Windows)
+"""
+
+import logging
+import os
+import sys
+from pathlib import Path
+from types import TracebackType
+from typing import Optional, Type, Union
+
+if sys.platform == "win32":
+    import msvcrt
+else:
+    import fcntl
+
+logger = logging.getLogger(__name__)
+
+
+class FileLock:
+    """
+    Exclusive lock shared by every process that opens the same lock file
+
+    Used to serialize writers of files that several gateway workers share.
+    The lock is re-entrant within a process (nested acquisitions are counted)
+    and the lock file is kept open between acquisitions, so taking an
+    uncontended lock costs one system call. Not thread-safe: use it from one
+    thread (the event loop) per process.
+    """
+
+    def __init__(self, path: Union[str, Path]) -> None:
+        self.path = Path(path)
+        self._fd: Optional[int] = None
+        self._depth = 0
+
+    @property
+    def locked(self) -> bool:
+        return self._depth > 0
+
+    def _lock(self, fd: int, blocking: bool) -> None:
+        if sys.platform == "win32":
+            # Locks one byte at offset 0; LK_LOCK retries for about 10 seconds
+            os.lseek(fd, 0, os.SEEK_SET)
+            msvcrt.locking(fd, msvcrt.LK_LOCK if blocking else msvcrt.LK_NBLCK, 1)
+        else:
+            fcntl.flock(fd, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+    def _unlock(self, fd: int) -> None:
+        if sys.platform == "win32":
+            os.lseek(fd, 0, os.SEEK_SET)
+            msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+        else:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+
+    def acquire(self, blocking: bool = True) -> bool:
+        """
+        Take the lock
+
+        Args:
+            blocking: Wait for other processes to release it
+
+        Returns:
+            True once held; False when `blocking` is off and another process holds it
+        """
+        if self._depth:
+            self._depth += 1
+            return True
+        if self._fd is None:
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            self._lock(self._fd, blocking)
+        except OSError:
+            if blocking:
+                raise
+            return False
+        self._depth = 1
+        return True
+
+    def release(self) -> None:
+        if not self._depth:
+            return
+        self._depth -= 1
+        if not self._depth and self._fd is not None:
+            self._unlock(self._fd)
+
+    def close(self) -> None:
+        """Release the lock if held and close the lock file"""
+        if self._fd is not None:
+            if self._depth:
+                self._depth = 1
+                self.release()
+            os.close(self._fd)
+            self._fd = None
+
+    def __enter__(self) -> "FileLock":
+        self.acquire()
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc: Optional[BaseException],
+        tb: Optional[TracebackType],
+    ) -> None:
+        self.release()
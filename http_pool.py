@@ -0,0 +1,85 @@
+"""
+Shared HTTP client for upstream Ollama traffic
+One pooled httpx.AsyncClient per gateway process, reused by every component
+"""
+
+import logging
+from typing import Any, Dict, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# Defaults used when config.json has no "http_client" section
+DEFAULT_HTTP_SETTINGS: Dict[str, Any] = {
+    "max_connections": 100,
+    "max_keepalive_connections": 20,
+    "keepalive_expiry": 30.0,
+    "http2": False,
+    "connect_timeout": 5.0,
+    "timeouts": {
+        "chat": 120.0,
+        "stream": None,
+        "health": 5.0,
+        "embedding": 30.0,
+    },
+}
+
+
+def get_http_settings(config: Dict[str, Any]) -> Dict[str, Any]:
+    """Merge the "http_client" section of config.json over the defaults"""
+    user_settings = config.get("http_client", {})
+
+    settings = {**DEFAULT_HTTP_SETTINGS, **user_settings}
+    settings["timeouts"] = {
+        **DEFAULT_HTTP_SETTINGS["timeouts"],
+        **user_settings.get("timeouts", {}),
+    }
+    return settings
+
+
+def get_timeout(settings: Dict[str, Any], call: str) -> httpx.Timeout:
+    """
+    Build the timeout for one kind of upstream call
+
+    Args:
+        settings: Merged HTTP settings (see get_http_settings)
+        call: Timeout name (chat, stream, health, embedding)
+
+    Returns:
+        httpx.Timeout with the shared connect timeout and the per-call read timeout
+    """
+    read_timeout: Optional[float] = settings["timeouts"].get(call)
+    return httpx.Timeout(read_timeout, connect=settings["connect_timeout"])
+
+
+def create_http_client(settings: Dict[str, Any]) -> httpx.AsyncClient:
+    """
+    Create the long-lived pooled client for all Ollama requests
+
+    HTTP/2 is only enabled when requested and the optional "h2" package is installed.
+    """
+    http2 = bool(settings.get("http2", False))
+    if http2:
+        try:
+            import h2  # noqa: F401
+        except ImportError:
+            logger.warning("HTTP/2 requested but 'h2' is not installed - using HTTP/1.1")
+            http2 = False
+
+    limits = httpx.Limits(
+        max_connections=settings["max_connections"],
+        max_keepalive_connections=settings["max_keepalive_connections"],
+        keepalive_expiry=settings["keepalive_expiry"],
+    )
+
+    logger.info(
+        f"HTTP pool: max_connections={limits.max_connections}, "
+        f"keepalive={limits.max_keepalive_connections}, http2={http2}"
+    )
+
+    return httpx.AsyncClient(
+        limits=limits,
+        timeout=get_timeout(settings, "chat"),
+        http2=http2,
+    )
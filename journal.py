@@ -0,0 +1,293 @@
+"""
+Journaled JSON storage
+Snapshot file + append-only operation log with periodic compaction
+"""
+
+import json
+import logging
+import os
+import time
+from pathlib import Path
+from typing import IO, Any, Collection, Dict, Iterable, List, Optional, Tuple
+
+from file_lock import FileLock
+
+logger = logging.getLogger(__name__)
+
+# On Windows a file another process (or a scanner) has open cannot be replaced;
+# such sharing violations are retried for about a second
+REPLACE_ATTEMPTS = 10
+REPLACE_RETRY_S = 0.1
+
+
+def replace_file(src: Path, dst: Path) -> None:
+    """os.replace, retried while dst is held open elsewhere (PermissionError on Windows)"""
+    for attempt in range(REPLACE_ATTEMPTS):
+        try:
+            os.replace(src, dst)
+            return
+        except PermissionError:
+            if attempt == REPLACE_ATTEMPTS - 1:
+                raise
+            time.sleep(REPLACE_RETRY_S)
+
+
+class JournaledStore:
+    """
+    Persists a dict as a JSON snapshot plus an append-only log of changes
+
+    Each mutation appends one `{"op": "put"|"del", "key": ..., "value": ...}`
+    line to `<snapshot>.log`, so its cost is proportional to the record, not
+    to the whole store. Every `compact_every` records the full dict is written
+    to a temporary file and atomically renamed over the snapshot, then the log
+    is truncated in place (never unlinked, so handles other processes hold on
+    it stay valid, and Windows does not refuse the removal). A crash can at worst lose a partially written last log line,
+    which is ignored on replay; replaying a log over a snapshot that already
+    contains it is harmless because operations are idempotent.
+
+    Several processes (gateway workers) may share the files: appends and
+    compactions are serialized by an exclusive lock on `<snapshot>.lock`, and
+    `sync()` applies what other processes logged since this one last read,
+    or reloads everything after another process compacted.
+    """
+
+    def __init__(
+        self,
+        snapshot_path: Path,
+        compact_every: int = 1000,
+        fsync: bool = False,
+        indent: Optional[int] = None,
+        ensure_ascii: bool = True,
+    ) -> None:
+        self.snapshot_path = Path(snapshot_path)
+        self.log_path = self.snapshot_path.with_name(self.snapshot_path.name + ".log")
+        self.compact_every = compact_every
+        self.fsync = fsync
+        self.indent = indent
+        self.ensure_ascii = ensure_ascii
+
+        self.lock = FileLock(self.snapshot_path.with_name(self.snapshot_path.name + ".lock"))
+
+        self.pending_records = 0
+        self._log_file: Optional[IO[str]] = None
+
+        # What this process has read: identity of the snapshot and bytes of the log
+        self._snapshot_id: Optional[Tuple[int, int]] = None
+        self._log_offset = 0
+
+    @staticmethod
+    def _file_id(path: Path) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns
+
+    def _log_size(self) -> int:
+        try:
+            return os.stat(self.log_path).st_size
+        except FileNotFoundError:
+            return 0
+
+    def load(self) -> Dict[str, Any]:
+        """Read the snapshot and replay the operation log on top of it"""
+        with self.lock:
+            return self._load()
+
+    def _load(self) -> Dict[str, Any]:
+        data: Dict[str, Any] = {}
+        self._snapshot_id = self._file_id(self.snapshot_path)
+        if self._snapshot_id is not None:
+            with open(self.snapshot_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+
+        self._log_offset = 0
+        self._drop_torn_tail()
+        self.pending_records = self._replay(data)
+        return data
+
+    def _drop_torn_tail(self) -> None:
+        """
+        Cut a record left half-written by a crash (lock held)
+
+        Otherwise the next append would continue the same line and both
+        records would be discarded as torn on replay.
+        """
+        try:
+            with open(self.log_path, "rb+") as f:
+                size = f.seek(0, os.SEEK_END)
+                end = size
+                while end > 0:
+                    start = max(0, end - 4096)
+                    f.seek(start)
+                    newline = f.read(end - start).rfind(b"\n")
+                    if newline >= 0:
+                        end = start + newline + 1
+                        break
+                    end = start
+                if end < size:
+                    f.truncate(end)
+                    logger.warning(f"Dropped torn record at the end of {self.log_path}")
+        except FileNotFoundError:
+            pass
+
+    def _replay(self, data: Dict[str, Any], keep: Collection[str] = ()) -> int:
+        """Apply the complete log records past the consumed offset, except for `keep` keys"""
+        try:
+            with open(self.log_path, "rb") as f:
+                f.seek(self._log_offset)
+                tail = f.read()
+        except FileNotFoundError:
+            return 0
+
+        # An unterminated last line is still being written (or torn): leave it
+        end = tail.rfind(b"\n") + 1
+        replayed = 0
+        for line in tail[:end].splitlines():
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                logger.warning(f"Ignoring torn record in {self.log_path}")
+                continue
+            replayed += 1
+            if record.get("key") in keep:
+                continue
+            if record.get("op") == "put":
+                data[record["key"]] = record["value"]
+            elif record.get("op") == "del":
+                data.pop(record["key"], None)
+        self._log_offset += end
+        return replayed
+
+    def changed(self) -> bool:
+        """Whether another process has logged or compacted since this one last read"""
+        return (
+            self._file_id(self.snapshot_path) != self._snapshot_id
+            or self._log_size() != self._log_offset
+        )
+
+    def _catch_up(self, data: Dict[str, Any], keep: Collection[str] = ()) -> None:
+        """Bring `data` up to date with the files (lock held); `keep` entries stay as they are"""
+        if self._file_id(self.snapshot_path) != self._snapshot_id:
+            fresh = self._load()
+            for key in keep:
+                if key in data:
+                    fresh[key] = data[key]
+                else:
+                    fresh.pop(key, None)
+            data.clear()
+            data.update(fresh)
+        else:
+            self.pending_records += self._replay(data, keep)
+
+    def sync(self, data: Dict[str, Any]) -> bool:
+        """
+        Apply changes other processes made since the last load or sync
+
+        `data` (the dict returned by load()) is updated in place. Costs two
+        stat calls when nothing changed.
+
+        Returns:
+            True if `data` may have changed
+        """
+        if not self.changed():
+            return False
+        with self.lock:
+            self._catch_up(data)
+        return True
+
+    def _append(self, records: List[Dict[str, Any]], data: Optional[Dict[str, Any]] = None) -> None:
+        with self.lock:
+            if self._log_file is not None and self._log_replaced():
+                self.close()
+            if self._log_file is None:
+                self._drop_torn_tail()
+                self._log_file = open(self.log_path, "a", encoding="utf-8")
+
+            # Records other processes appended come first; when this process has
+            # read them (or there are none), its own need not be read back
+            if data is not None:
+                self._catch_up(data, keep={record["key"] for record in records})
+            caught_up = self._log_size() == self._log_offset
+
+            self._log_file.write(
+                "".join(json.dumps(r, ensure_ascii=self.ensure_ascii) + "\n" for r in records)
+            )
+            self._log_file.flush()
+            if self.fsync:
+                os.fsync(self._log_file.fileno())
+            if caught_up:
+                self._log_offset = self._log_size()
+            self.pending_records += len(records)
+
+    def _log_replaced(self) -> bool:
+        """Whether the log this process has open was removed or replaced"""
+        assert self._log_file is not None
+        try:
+            return os.stat(self.log_path).st_ino != os.fstat(self._log_file.fileno()).st_ino
+        except FileNotFoundError:
+            return True
+
+    @staticmethod
+    def _record(data: Dict[str, Any], key: str) -> Dict[str, Any]:
+        if key in data:
+            return {"op": "put", "key": key, "value": data[key]}
+        return {"op": "del", "key": key}
+
+    def put(self, key: str, value: Any) -> None:
+        """Log an insert/update of one key"""
+        self._append([{"op": "put", "key": key, "value": value}])
+
+    def delete(self, key: str) -> None:
+        """Log the removal of one key"""
+        self._append([{"op": "del", "key": key}])
+
+    def compact(self, data: Dict[str, Any]) -> None:
+        """Atomically write a full snapshot and truncate the log"""
+        with self.lock:
+            tmp_path = self.snapshot_path.with_name(self.snapshot_path.name + ".tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, indent=self.indent, ensure_ascii=self.ensure_ascii)
+                f.flush()
+                os.fsync(f.fileno())
+            replace_file(tmp_path, self.snapshot_path)
+
+            # Other processes see the new snapshot and reload; their append
+            # handles keep writing at the (new) end of the same log
+            self.close()
+            try:
+                os.truncate(self.log_path, 0)
+            except FileNotFoundError:
+                pass
+            self._snapshot_id = self._file_id(self.snapshot_path)
+            self._log_offset = 0
+            self.pending_records = 0
+
+    def save(self, data: Dict[str, Any], key: Optional[str] = None) -> None:
+        """
+        Persist a change to `data`
+
+        With a key, only that entry is logged (as a put, or a delete when the
+        key is gone); without one, a full snapshot is written.
+        """
+        if key is None:
+            self.compact(data)
+            return
+        self.save_many(data, [key])
+
+    def save_many(self, data: Dict[str, Any], keys: Iterable[str]) -> None:
+        """Persist changes to several keys with a single log write"""
+        records = [self._record(data, key) for key in keys]
+        if self.pending_records + len(records) >= self.compact_every:
+            with self.lock:
+                # Keep what other processes logged for the other keys
+                self._catch_up(data, keep={record["key"] for record in records})
+                self.compact(data)
+        elif records:
+            self._append(records, data)
+
+    def close(self) -> None:
+        """Close the log file handle (reopened lazily on the next append)"""
+        if self._log_file is not None:
+            self._log_file.close()
+            self._log_file = None
@@ -3,20 +3,68 @@ Ollama Gateway - OpenAI-compatible API for local Ollama models
 Enables Claude-Code, Continue.dev, and other tools to use local models
 """
 
+import asyncio
 import json
 import logging
 import os
+import tempfile
 import time
-from typing import Any, AsyncIterator, Dict, Union
+from contextlib import asynccontextmanager
+from functools import partial
+from pathlib import Path
+from typing import (
+    Any,
+    AsyncIterable,
+    AsyncIterator,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
 
 import httpx
 from dotenv import load_dotenv
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, StreamingResponse
-
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.background import BackgroundTask, BackgroundTasks
+
+from backends import BackendPool, Lease, get_backend_settings, parse_backend_urls
+from file_lock import FileLock
+from http_pool import create_http_client, get_http_settings, get_timeout
+from metrics import (
+    IN_FLIGHT,
+    INTER_TOKEN,
+    QUEUED,
+    REGISTRY,
+    REQUEST_LATENCY,
+    REQUESTS,
+    ROUTING_LATENCY,
+    TTFT,
+    observe_ollama_reply,
+)
+from model_load import ModelLoadTracker, get_routing_settings
 from orchestrator import TaskOrchestrator
+from residency import ResidencyManager, get_residency_settings
+from response_cache import (
+    BYPASS_HEADER,
+    BYPASS_VALUE,
+    ResponseCache,
+    get_cache_settings,
+    is_deterministic,
+)
 from router import IntelligentRouter
+from scheduler import (
+    PRIORITIES,
+    AdmissionRejected,
+    AdmissionScheduler,
+    Slot,
+    get_scheduler_settings,
+)
+from singleflight import SingleFlight, get_coalescing_settings
+from streaming import SSE_DONE, ChatChunkTemplate, aiter_ndjson
 
 # Load environment variables
 load_dotenv()
@@ -31,10 +79,41 @@ logger = logging.getLogger(__name__)
 with open("config.json") as f:
     config = json.load(f)
 
+# Connection pool / timeout settings for upstream Ollama calls
+HTTP_SETTINGS = get_http_settings(config)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    """Create the shared upstream HTTP client for the lifetime of the process"""
+    app.state.http_client = create_http_client(HTTP_SETTINGS)
+    # Backend health checks keep each host's model inventory current
+    background = [asyncio.create_task(backend_pool.run(app.state.http_client))]
+    # Keep the resident-model set (/api/ps) current for load-aware routing;
+    # the residency manager refreshes it on each of its passes
+    if residency is not None:
+        background.append(asyncio.create_task(run_residency(app.state.http_client)))
+    elif ROUTING_SETTINGS["load_aware"]:
+        background.append(
+            asyncio.create_task(
+                model_load.poll_loaded(
+                    app.state.http_client, backend_pool, ROUTING_SETTINGS["ps_poll_interval"]
+                )
+            )
+        )
+    try:
+        yield
+    finally:
+        for task in background:
+            task.cancel()
+        await app.state.http_client.aclose()
+
+
 app = FastAPI(
     title="Ollama Gateway",
     description="OpenAI-compatible gateway for local Ollama models with intelligent routing",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 # Enable CORS
@@ -49,11 +128,45 @@ app.add_middleware(
 # Initialize router and orchestrator
 router = IntelligentRouter()
 
-# Configuration from environment or config.json
-OLLAMA_URL = os.getenv("OLLAMA_BASE_URL", config["ollama_base_url"])
+# Configuration from environment or config.json; several Ollama hosts may be
+# given as a list (or comma-separated in OLLAMA_BASE_URL)
+OLLAMA_URLS = parse_backend_urls(os.getenv("OLLAMA_BASE_URL") or config["ollama_base_url"])
+backend_pool = BackendPool.from_settings(
+    OLLAMA_URLS, get_backend_settings(config), get_timeout(HTTP_SETTINGS, "health")
+)
+
+# Worker processes (uvicorn --workers); per-process state is noted where it is created.
+# /metrics and the /gateway/* statistics are per worker and are not aggregated
+WORKERS = max(1, int(os.getenv("GATEWAY_WORKERS", config.get("workers", 1))))
+# Set by __main__ for the workers it starts, so /shutdown knows their parent is ours
+SUPERVISOR_PID_ENV = "GATEWAY_SUPERVISOR_PID"
+
+# Opt-in cache for deterministic completions ("response_cache" in config.json)
+response_cache = ResponseCache.from_settings(get_cache_settings(config))
+
+# Identical concurrent completions share one upstream call ("coalescing" in config.json)
+COALESCING_SETTINGS = get_coalescing_settings(config)
+singleflight = SingleFlight()
+
+# Per-model concurrency limits and priority wait queues ("scheduler" in config.json),
+# split between the workers
+SCHEDULER_SETTINGS = get_scheduler_settings(config, WORKERS)
+scheduler = AdmissionScheduler.from_settings(SCHEDULER_SETTINGS)
+
+# Live load signals used by the router to break ties ("routing" in config.json)
+ROUTING_SETTINGS = get_routing_settings(config)
+model_load = ModelLoadTracker.from_settings(scheduler, ROUTING_SETTINGS)
+router.load_tracker = model_load
+
+# Initialize orchestrator (after the backends, scheduler and load tracker are set)
+orchestrator = TaskOrchestrator(router, backend_pool, scheduler, model_load)
+
+# Background preloading of the models most likely to be routed to ("residency" in config.json)
+RESIDENCY_SETTINGS = get_residency_settings(config)
+residency: Optional[ResidencyManager] = None
+if RESIDENCY_SETTINGS["enabled"]:
+    residency = ResidencyManager.from_settings(model_load, config["models"], RESIDENCY_SETTINGS)
 
-# Initialize orchestrator (after OLLAMA_URL is set)
-orchestrator = TaskOrchestrator(router, OLLAMA_URL)
 GATEWAY_PORT = int(os.getenv("GATEWAY_PORT", config.get("gateway_port", 4000)))
 ENABLE_STREAMING = (
     os.getenv("ENABLE_STREAMING", str(config.get("enable_streaming", True))).lower() == "true"
@@ -62,6 +175,28 @@ ENABLE_LOGGING = (
     os.getenv("ENABLE_LOGGING", str(config.get("enable_logging", True))).lower() == "true"
 )
 
+# Held by the one worker that preloads and unloads models (per gateway port)
+LEADER_LOCK = FileLock(Path(tempfile.gettempdir()) / f"ollama-gateway-{GATEWAY_PORT}.lock")
+
+
+async def run_residency(client: httpx.AsyncClient) -> None:
+    """
+    Residency passes in the worker holding the leader lock, /api/ps polling in the others
+
+    When the leader exits its lock is released and the next worker to try takes over.
+    """
+    assert residency is not None
+    while not LEADER_LOCK.acquire(blocking=False):
+        try:
+            await model_load.refresh_loaded(client, backend_pool)
+        except (httpx.HTTPError, ValueError) as e:
+            logger.debug(f"Failed to poll /api/ps: {e}")
+        await asyncio.sleep(ROUTING_SETTINGS["ps_poll_interval"])
+    try:
+        await residency.run(client, backend_pool)
+    finally:
+        LEADER_LOCK.release()
+
 
 @app.get("/")  # type: ignore[misc]
 async def root() -> Union[Dict[str, Any], Any]:
@@ -76,7 +211,9 @@ async def root() -> Union[Dict[str, Any], Any]:
         "status": "healthy",
         "service": "Ollama Gateway",
         "version": "1.0.0",
-        "ollama_url": OLLAMA_URL,
+        "ollama_url": OLLAMA_URLS[0],
+        "ollama_backends": OLLAMA_URLS,
+        "workers": WORKERS,
         "models_configured": len(config["models"]),
         "endpoints": {
             "api": "/v1/chat/completions",
@@ -89,26 +226,37 @@ async def root() -> Union[Dict[str, Any], Any]:
 
 @app.get("/health")  # type: ignore[misc]
 async def health() -> Union[Dict[str, Any], JSONResponse]:
-    """Detailed health check"""
-    try:
-        async with httpx.AsyncClient(timeout=5.0) as client:
-            response = await client.get(f"{OLLAMA_URL}/api/tags")
-            ollama_models = response.json().get("models", [])
-
-        return {
-            "status": "healthy",
-            "ollama_connected": True,
-            "ollama_models_count": len(ollama_models),
-            "configured_models": len(config["models"]),
-            "routing_enabled": True,
-        }
-    except Exception as e:
-        logger.error(f"Health check failed: {e}")
+    """Detailed health check (checks every Ollama backend now)"""
+    client: httpx.AsyncClient = app.state.http_client
+    results = await backend_pool.check_all(client)
+    backends = {"healthy": sum(results), "total": len(results)}
+
+    if not any(results):
+        error = "; ".join(f"{b.url}: {b.last_error}" for b in backend_pool.backends)
+        logger.error(f"Health check failed: {error}")
         return JSONResponse(
             status_code=503,
-            content={"status": "unhealthy", "ollama_connected": False, "error": str(e)},
+            content={
+                "status": "unhealthy",
+                "ollama_connected": False,
+                "error": error,
+                "backends": backends,
+            },
         )
 
+    ollama_models = set()
+    for backend, ok in zip(backend_pool.backends, results):
+        if ok and backend.models is not None:
+            ollama_models |= backend.models
+    return {
+        "status": "healthy",
+        "ollama_connected": True,
+        "ollama_models_count": len(ollama_models),
+        "configured_models": len(config["models"]),
+        "routing_enabled": True,
+        "backends": backends,
+    }
+
 
 @app.get("/v1/models")  # type: ignore[misc]
 async def list_models() -> Dict[str, Any]:
@@ -138,6 +286,281 @@ async def list_models() -> Dict[str, Any]:
     }
 
 
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "Connection": "keep-alive",
+    "Access-Control-Allow-Origin": "*",
+}
+
+
+def build_ollama_payload(
+    payload: Dict[str, Any], selected_model: str, messages: List[Dict[str, Any]]
+) -> Dict[str, Any]:
+    """Translate an OpenAI request body into an Ollama /api/chat request"""
+    ollama_payload = {
+        "model": selected_model,
+        "messages": messages,
+        "stream": payload.get("stream", False),
+        "options": {
+            "temperature": payload.get("temperature", 0.7),
+            "num_predict": payload.get("max_tokens", 2048),
+        },
+    }
+
+    # Add top_p if provided (optional for Ollama)
+    if "top_p" in payload:
+        ollama_payload["options"]["top_p"] = payload["top_p"]
+
+    return ollama_payload
+
+
+async def open_ollama_stream(
+    client: httpx.AsyncClient, ollama_payload: Dict[str, Any]
+) -> Tuple[httpx.Response, Lease]:
+    """
+    Send a streaming /api/chat request and return once the headers have arrived
+
+    The backend pool retries on another backend until then. The caller owns
+    the returned response and backend lease and must close and release them.
+    """
+    response, lease = await backend_pool.send(
+        client,
+        "/api/chat",
+        ollama_payload,
+        timeout=get_timeout(HTTP_SETTINGS, "stream"),
+        stream=True,
+    )
+
+    if response.status_code != 200:
+        error_body = await response.aread()
+        await response.aclose()
+        lease.release(completed=False)
+        raise HTTPException(
+            status_code=502,
+            detail=f"Ollama error {response.status_code}: "
+            f"{error_body.decode('utf-8', errors='replace')}",
+        )
+
+    return response, lease
+
+
+async def iter_ollama_lines(
+    response: httpx.Response, lease: Lease, slot: Optional[Slot] = None
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Decoded NDJSON lines of a streaming Ollama response
+
+    The response is closed and the backend lease (and slot) released at the end.
+    """
+    # A client disconnect cancels the consumer; closing the upstream
+    # response in `finally` drops the connection so Ollama stops generating
+    completed = False
+    try:
+        async for data in aiter_ndjson(response.aiter_bytes()):
+            if data.get("done"):
+                completed = True
+                if slot is not None:
+                    model_load.observe(slot.model, data)
+                    observe_ollama_reply(slot.model, data)
+            yield data
+    finally:
+        await response.aclose()
+        lease.release(completed)
+        if slot is not None:
+            slot.release()
+
+
+async def open_admitted_stream(
+    client: httpx.AsyncClient, ollama_payload: Dict[str, Any], priority: str
+) -> Tuple[httpx.Response, Lease, Slot]:
+    """Wait for an upstream slot for the model, then start a streaming /api/chat request"""
+    slot = await scheduler.acquire(ollama_payload["model"], priority)
+    try:
+        response, lease = await open_ollama_stream(client, ollama_payload)
+    except BaseException:
+        slot.release()
+        raise
+    return response, lease, slot
+
+
+async def open_ollama_lines(
+    client: httpx.AsyncClient, ollama_payload: Dict[str, Any], priority: str
+) -> AsyncIterator[Dict[str, Any]]:
+    """Admitted streaming /api/chat request; the slot is held until its lines are closed"""
+    return iter_ollama_lines(*await open_admitted_stream(client, ollama_payload, priority))
+
+
+async def render_chat_chunks(
+    lines: AsyncIterable[Dict[str, Any]],
+    template: ChatChunkTemplate,
+    on_done: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+) -> AsyncIterator[bytes]:
+    """
+    Forward each Ollama NDJSON line as an OpenAI chat.completion.chunk SSE event
+
+    `on_done`, if given, receives the full completion text and the final
+    Ollama line once the stream has completed normally.
+    """
+    parts: List[str] = []
+    async for data in lines:
+        done = data.get("done", False)
+        content = data.get("message", {}).get("content", "")
+        if on_done is not None:
+            parts.append(content)
+        # Convert to OpenAI format
+        yield template.render(content, "stop" if done else None)
+
+        if done:
+            if on_done is not None:
+                on_done("".join(parts), data)
+            yield SSE_DONE
+            return
+
+
+async def post_ollama_chat(
+    client: httpx.AsyncClient, ollama_payload: Dict[str, Any], priority: str
+) -> Tuple[int, Dict[str, Any]]:
+    """Admitted non-streaming /api/chat call: (status code, decoded body)"""
+    async with await scheduler.acquire(ollama_payload["model"], priority):
+        response = await backend_pool.post(
+            client, "/api/chat", ollama_payload, timeout=get_timeout(HTTP_SETTINGS, "chat")
+        )
+    data: Dict[str, Any] = response.json()
+    if response.status_code == 200:
+        model_load.observe(ollama_payload["model"], data)
+        observe_ollama_reply(ollama_payload["model"], data)
+    return response.status_code, data
+
+
+async def observe_stream(
+    chunks: AsyncIterator[bytes], model: str, started: float
+) -> AsyncIterator[bytes]:
+    """Pass SSE chunks through, recording time to first chunk, gaps and total latency"""
+    ttft = TTFT.labels(model)
+    gaps = INTER_TOKEN.labels(model)
+    last: Optional[float] = None
+    try:
+        async for chunk in chunks:
+            now = time.perf_counter()
+            if last is None:
+                ttft.observe(now - started)
+            else:
+                gaps.observe(now - last)
+            last = now
+            yield chunk
+    finally:
+        # Close the inner generator now rather than when it is garbage collected
+        aclose = getattr(chunks, "aclose", None)
+        if aclose is not None:
+            await aclose()
+        REQUEST_LATENCY.labels(model, "true").observe(time.perf_counter() - started)
+
+
+def coalescing_key(ollama_payload: Dict[str, Any], bypass: bool) -> Optional[str]:
+    """Single-flight key for a routed request, or None when it must run on its own"""
+    if bypass or not COALESCING_SETTINGS["enabled"]:
+        return None
+    if COALESCING_SETTINGS["deterministic_only"] and not is_deterministic(ollama_payload):
+        return None
+    return ResponseCache.make_key(ollama_payload)
+
+
+def lookup_response_cache(
+    ollama_payload: Dict[str, Any], bypass: bool
+) -> Tuple[Optional[str], Optional[str], Optional[Dict[str, Any]]]:
+    """
+    Consult the response cache for a routed request
+
+    Returns:
+        (cache key to store the result under or None, status for the response
+        metadata or None when caching is disabled, cached entry or None)
+    """
+    if response_cache is None:
+        return None, None, None
+    if bypass:
+        response_cache.bypassed += 1
+        return None, "bypass", None
+    if not response_cache.is_cacheable(ollama_payload):
+        return None, "uncacheable", None
+
+    cache_key = response_cache.make_key(ollama_payload)
+    cached = response_cache.get(cache_key)
+    return cache_key, "hit" if cached is not None else "miss", cached
+
+
+def store_cached_response(cache_key: str, content: str, ollama_data: Dict[str, Any]) -> None:
+    """Cache a finished completion (no-op when the cache is disabled)"""
+    if response_cache is not None:
+        response_cache.put(
+            cache_key,
+            content,
+            ollama_data.get("prompt_eval_count", 0),
+            ollama_data.get("eval_count", 0),
+        )
+
+
+async def replay_cached_stream(
+    cached: Dict[str, Any], template: ChatChunkTemplate
+) -> AsyncIterator[bytes]:
+    """Send a cached completion as an SSE stream"""
+    yield template.render(cached["content"])
+    yield template.render("", "stop")
+    yield SSE_DONE
+
+
+async def stream_orchestration(
+    client: httpx.AsyncClient,
+    user_message: str,
+    payload: Dict[str, Any],
+    messages: List[Dict[str, Any]],
+    priority: str,
+) -> AsyncIterator[bytes]:
+    """
+    SSE stream for `model: "orchestrate"`
+
+    Progress (plan, finished subtasks, final metadata) is sent as chunks with an
+    empty delta and an `orchestration` field; the synthesis is streamed as content.
+    Without a plan, a routed completion is streamed, admitted with `priority`.
+    """
+    template = ChatChunkTemplate("orchestrate")
+
+    try:
+        async for event in orchestrator.orchestrate_stream(user_message, client, priority):
+            if event["event"] == "token":
+                yield template.render(event["content"])
+            elif event["event"] == "fallback":
+                # No plan: stream a normally routed completion instead
+                selected_model, routing_reason = router.route(user_message)
+                if ENABLE_LOGGING:
+                    logger.info(f"Routing: {selected_model} - {routing_reason}")
+                if residency is not None:
+                    residency.record_route(selected_model)
+                yield template.render_event(
+                    "orchestration",
+                    {
+                        "event": "fallback",
+                        "selected_model": selected_model,
+                        "routing_reason": routing_reason,
+                    },
+                )
+                ollama_payload = build_ollama_payload(payload, selected_model, messages)
+                lines = await open_ollama_lines(client, ollama_payload, priority)
+                async for chunk in render_chat_chunks(lines, template):
+                    yield chunk
+                return
+            else:
+                yield template.render_event("orchestration", event)
+
+        yield template.render("", "stop")
+        yield SSE_DONE
+
+    except Exception as e:
+        # Headers are already sent: report the failure in-band and end the stream
+        logger.error(f"Streaming orchestration failed: {e}")
+        yield template.render_event("orchestration", {"event": "error", "detail": str(e)})
+        yield SSE_DONE
+
+
 @app.post("/v1/chat/completions")  # type: ignore[misc]
 async def chat_completion(
     request: Request,
@@ -146,6 +569,8 @@ async def chat_completion(
     OpenAI-compatible chat completions endpoint
     Automatically routes to best local model based on prompt content
     """
+    started = time.perf_counter()
+    model_label = "unknown"
     try:
         payload = await request.json()
 
@@ -163,167 +588,282 @@ async def chat_completion(
         # Check for orchestration mode
         requested_model = payload.get("model")
 
-        if requested_model == "orchestrate":
-            # Use multi-model orchestration for complex tasks
-            async with httpx.AsyncClient(timeout=180.0) as client:
-                result = await orchestrator.orchestrate(user_message, client)
-
-                if result:
-                    # Orchestration successful
-                    response_data = {
-                        "id": f"chatcmpl-{int(time.time())}",
-                        "object": "chat.completion",
-                        "created": int(time.time()),
-                        "model": "orchestrate",
-                        "choices": [
-                            {
-                                "index": 0,
-                                "message": {
-                                    "role": "assistant",
-                                    "content": result["answer"],
-                                },
-                                "finish_reason": "stop",
-                            }
-                        ],
-                        "usage": {
-                            "prompt_tokens": len(user_message.split()),
-                            "completion_tokens": len(result["answer"].split()),
-                            "total_tokens": len(user_message.split())
-                            + len(result["answer"].split()),
-                        },
-                        "metadata": {
-                            "orchestration": True,
-                            "subtasks": result["subtasks"],
-                            "models_used": result["models_used"],
-                            "orchestration_steps": result["orchestration_steps"],
-                        },
-                    }
-                    return JSONResponse(response_data)
-                # If orchestration fails, fall through to normal routing
+        # Shared pooled client (created in lifespan)
+        client: httpx.AsyncClient = request.app.state.http_client
 
-        # Intelligent routing (normal mode or orchestration fallback)
-        selected_model, routing_reason = router.route(user_message, requested_model)
-
-        if ENABLE_LOGGING:
-            logger.info(f"Routing: {selected_model} - {routing_reason}")
-
-        # Prepare Ollama request
-        ollama_payload = {
-            "model": selected_model,
-            "messages": messages,
-            "stream": payload.get("stream", False),
-            "options": {
-                "temperature": payload.get("temperature", 0.7),
-                "num_predict": payload.get("max_tokens", 2048),
-            },
-        }
-
-        # Add top_p if provided (optional for Ollama)
-        if "top_p" in payload:
-            ollama_payload["options"]["top_p"] = payload["top_p"]
-
-        async with httpx.AsyncClient(timeout=120.0) as client:
-            if ollama_payload["stream"] and ENABLE_STREAMING:
-                # Streaming response
-                response = await client.post(
-                    f"{OLLAMA_URL}/api/chat", json=ollama_payload, timeout=None
-                )
-
-                async def generate() -> AsyncIterator[str]:
-                    buffer = ""
-                    async for chunk in response.aiter_bytes():
-                        buffer += chunk.decode("utf-8")
-                        while "\n" in buffer:
-                            line, buffer = buffer.split("\n", 1)
-                            if line.strip():
-                                try:
-                                    data = json.loads(line)
-                                    # Convert to OpenAI format
-                                    openai_chunk = {
-                                        "id": f"chatcmpl-{int(time.time())}",
-                                        "object": "chat.completion.chunk",
-                                        "created": int(time.time()),
-                                        "model": selected_model,
-                                        "choices": [
-                                            {
-                                                "index": 0,
-                                                "delta": {
-                                                    "content": data.get("message", {}).get(
-                                                        "content", ""
-                                                    )
-                                                },
-                                                "finish_reason": (
-                                                    "stop" if data.get("done") else None
-                                                ),
-                                            }
-                                        ],
-                                    }
-                                    yield f"data: {json.dumps(openai_chunk)}\n\n"
-
-                                    if data.get("done"):
-                                        yield "data: [DONE]\n\n"
-                                        break
-                                except json.JSONDecodeError:
-                                    continue
+        # Priority class for admission to the upstream model
+        priority = request.headers.get(
+            SCHEDULER_SETTINGS["priority_header"], SCHEDULER_SETTINGS["default_priority"]
+        ).lower()
+        if priority not in PRIORITIES:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Unknown priority '{priority}' (expected one of: {', '.join(PRIORITIES)})",
+            )
 
+        if requested_model == "orchestrate":
+            model_label = "orchestrate"
+            if payload.get("stream", False) and ENABLE_STREAMING:
+                # Progress events and synthesis tokens as they are produced
+                REQUESTS.labels(model_label, "200").inc()
                 return StreamingResponse(
-                    generate(),
+                    observe_stream(
+                        stream_orchestration(client, user_message, payload, messages, priority),
+                        model_label,
+                        started,
+                    ),
                     media_type="text/event-stream",
-                    headers={
-                        "Cache-Control": "no-cache",
-                        "Connection": "keep-alive",
-                        "Access-Control-Allow-Origin": "*",
-                    },
+                    headers=SSE_HEADERS,
                 )
 
-            else:
-                # Non-streaming response
-                response = await client.post(f"{OLLAMA_URL}/api/chat", json=ollama_payload)
-
-                ollama_data = response.json()
+            # Use multi-model orchestration for complex tasks
+            result = await orchestrator.orchestrate(user_message, client, priority)
 
-                # Convert to OpenAI format
-                openai_response = {
+            if result:
+                # Orchestration successful
+                response_data = {
                     "id": f"chatcmpl-{int(time.time())}",
                     "object": "chat.completion",
                     "created": int(time.time()),
-                    "model": selected_model,
+                    "model": "orchestrate",
                     "choices": [
                         {
                             "index": 0,
                             "message": {
                                 "role": "assistant",
-                                "content": ollama_data.get("message", {}).get("content", ""),
+                                "content": result["answer"],
                             },
                             "finish_reason": "stop",
                         }
                     ],
                     "usage": {
-                        "prompt_tokens": ollama_data.get("prompt_eval_count", 0),
-                        "completion_tokens": ollama_data.get("eval_count", 0),
-                        "total_tokens": ollama_data.get("prompt_eval_count", 0)
-                        + ollama_data.get("eval_count", 0),
+                        "prompt_tokens": len(user_message.split()),
+                        "completion_tokens": len(result["answer"].split()),
+                        "total_tokens": len(user_message.split()) + len(result["answer"].split()),
                     },
                     "metadata": {
-                        "routing_reason": routing_reason,
-                        "selected_model": selected_model,
+                        "orchestration": True,
+                        "subtasks": result["subtasks"],
+                        "models_used": result["models_used"],
+                        "orchestration_steps": result["orchestration_steps"],
+                        "subtask_timings": result["subtask_timings"],
                     },
                 }
+                REQUESTS.labels(model_label, "200").inc()
+                REQUEST_LATENCY.labels(model_label, "false").observe(time.perf_counter() - started)
+                return JSONResponse(response_data)
+            # If orchestration fails, fall through to normal routing
+
+        # Intelligent routing (normal mode or orchestration fallback)
+        routing_started = time.perf_counter()
+        selected_model, routing_reason = router.route(user_message, requested_model)
+        ROUTING_LATENCY.labels().observe(time.perf_counter() - routing_started)
+        model_label = selected_model
 
-                return JSONResponse(openai_response)
+        if ENABLE_LOGGING:
+            logger.info(f"Routing: {selected_model} - {routing_reason}")
+        if residency is not None:
+            residency.record_route(selected_model)
+
+        # Prepare Ollama request
+        ollama_payload = build_ollama_payload(payload, selected_model, messages)
+
+        # Deterministic requests may be answered from the response cache
+        bypass = request.headers.get(BYPASS_HEADER, "").lower() == BYPASS_VALUE
+        cache_key, cache_status, cached = lookup_response_cache(ollama_payload, bypass)
+        flight_key = coalescing_key(ollama_payload, bypass) if cached is None else None
+        metadata: Dict[str, Any] = {
+            "routing_reason": routing_reason,
+            "selected_model": selected_model,
+        }
+        if cache_status is not None:
+            metadata["cache"] = {"status": cache_status}
+            if cached is not None:
+                metadata["cache"]["age_s"] = cached["age_s"]
+
+        if ollama_payload["stream"] and ENABLE_STREAMING:
+            template = ChatChunkTemplate(selected_model)
+            headers = SSE_HEADERS
+            if cache_status is not None:
+                headers = {**SSE_HEADERS, "X-Gateway-Cache": cache_status}
+
+            if cached is not None:
+                REQUESTS.labels(model_label, "200").inc()
+                return StreamingResponse(
+                    observe_stream(replay_cached_stream(cached, template), model_label, started),
+                    media_type="text/event-stream",
+                    headers=headers,
+                )
 
+            if flight_key is not None:
+                # Identical streams in flight share one upstream generation
+                subscription, shared = await singleflight.stream(
+                    f"stream:{flight_key}",
+                    partial(open_ollama_lines, client, ollama_payload, priority),
+                )
+                headers = {**headers, "X-Gateway-Coalesced": "true" if shared else "false"}
+                # Only the caller that started the generation caches it
+                on_done = partial(store_cached_response, cache_key) if cache_key else None
+
+                REQUESTS.labels(model_label, "200").inc()
+                return StreamingResponse(
+                    observe_stream(
+                        render_chat_chunks(subscription, template, None if shared else on_done),
+                        model_label,
+                        started,
+                    ),
+                    media_type="text/event-stream",
+                    headers=headers,
+                    # Leaves the shared stream even if the body is never iterated
+                    background=BackgroundTask(subscription.release),
+                )
+
+            # Streaming response: only admission and the headers are awaited
+            # here, the body is forwarded line by line as Ollama produces it
+            response, lease, slot = await open_admitted_stream(client, ollama_payload, priority)
+
+            # A completed stream is cached on the way through
+            on_done = partial(store_cached_response, cache_key) if cache_key else None
+
+            # Also covers the case where the body is never iterated
+            cleanup = BackgroundTasks()
+            cleanup.add_task(response.aclose)
+            cleanup.add_task(lease.release, False)
+            cleanup.add_task(slot.release)
+
+            REQUESTS.labels(model_label, "200").inc()
+            return StreamingResponse(
+                observe_stream(
+                    render_chat_chunks(iter_ollama_lines(response, lease, slot), template, on_done),
+                    model_label,
+                    started,
+                ),
+                media_type="text/event-stream",
+                headers=headers,
+                background=cleanup,
+            )
+
+        else:
+            if cached is not None:
+                ollama_data = {
+                    "message": {"content": cached["content"]},
+                    "prompt_eval_count": cached["prompt_eval_count"],
+                    "eval_count": cached["eval_count"],
+                }
+            elif flight_key is not None:
+                # Identical requests in flight await the same upstream call
+                (status_code, ollama_data), shared = await singleflight.do(
+                    f"chat:{flight_key}",
+                    partial(post_ollama_chat, client, ollama_payload, priority),
+                )
+                metadata["coalesced"] = shared
+                if cache_key is not None and status_code == 200 and not shared:
+                    store_cached_response(
+                        cache_key, ollama_data.get("message", {}).get("content", ""), ollama_data
+                    )
+            else:
+                # Non-streaming response
+                status_code, ollama_data = await post_ollama_chat(client, ollama_payload, priority)
+                if cache_key is not None and status_code == 200:
+                    store_cached_response(
+                        cache_key, ollama_data.get("message", {}).get("content", ""), ollama_data
+                    )
+
+            # Convert to OpenAI format
+            openai_response = {
+                "id": f"chatcmpl-{int(time.time())}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": selected_model,
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": {
+                            "role": "assistant",
+                            "content": ollama_data.get("message", {}).get("content", ""),
+                        },
+                        "finish_reason": "stop",
+                    }
+                ],
+                "usage": {
+                    "prompt_tokens": ollama_data.get("prompt_eval_count", 0),
+                    "completion_tokens": ollama_data.get("eval_count", 0),
+                    "total_tokens": ollama_data.get("prompt_eval_count", 0)
+                    + ollama_data.get("eval_count", 0),
+                },
+                "metadata": metadata,
+            }
+
+            REQUESTS.labels(model_label, "200").inc()
+            REQUEST_LATENCY.labels(model_label, "false").observe(time.perf_counter() - started)
+            return JSONResponse(openai_response)
+
+    except HTTPException as e:
+        REQUESTS.labels(model_label, str(e.status_code)).inc()
+        raise
+    except AdmissionRejected as e:
+        logger.warning(f"Admission rejected: {e}")
+        REQUESTS.labels(model_label, "429").inc()
+        raise HTTPException(
+            status_code=429,
+            detail=f"Model {e.model} is busy ({e.reason}), retry later",
+            headers={"Retry-After": str(e.retry_after)},
+        )
     except httpx.RequestError as e:
         logger.error(f"Ollama request failed: {e}")
+        REQUESTS.labels(model_label, "503").inc()
         raise HTTPException(status_code=503, detail=f"Ollama service unavailable: {str(e)}")
     except Exception as e:
         logger.error(f"Unexpected error: {e}")
+        REQUESTS.labels(model_label, "500").inc()
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/metrics")  # type: ignore[misc]
+async def metrics() -> PlainTextResponse:
+    """Prometheus text exposition of gateway metrics"""
+    # Gauges are sampled from the scheduler at scrape time instead of on every request
+    for model in scheduler.models():
+        load = scheduler.load(model)
+        IN_FLIGHT.labels(model).set(load["active"])
+        QUEUED.labels(model).set(load["queued"])
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+
 @app.get("/gateway/models")  # type: ignore[misc]
 async def gateway_models() -> Dict[str, Any]:
-    """Gateway-specific endpoint to view routing configuration"""
-    return router.get_available_models()
+    """Gateway-specific endpoint to view routing configuration and live load estimates"""
+    return {**router.get_available_models(), "load": model_load.get_stats()}
+
+
+@app.get("/gateway/cache")  # type: ignore[misc]
+async def cache_stats() -> Dict[str, Any]:
+    """Response cache and request coalescing statistics"""
+    stats: Dict[str, Any] = {"enabled": False}
+    if response_cache is not None:
+        stats = {"enabled": True, **response_cache.get_stats()}
+    stats["coalescing"] = {**COALESCING_SETTINGS, **singleflight.get_stats()}
+    return stats
+
+
+@app.get("/gateway/backends")  # type: ignore[misc]
+async def backend_stats() -> Dict[str, Any]:
+    """Ollama backends: health, model inventory, outstanding requests and latency"""
+    return backend_pool.get_stats()
+
+
+@app.get("/gateway/queues")  # type: ignore[misc]
+async def queue_stats() -> Dict[str, Any]:
+    """Per-model admission limits, queue depth and wait times"""
+    return scheduler.get_stats()
+
+
+@app.get("/gateway/residency")  # type: ignore[misc]
+async def residency_stats() -> Dict[str, Any]:
+    """Resident and target models, preloads and cold starts"""
+    if residency is None:
+        return {"enabled": False, "cold_starts": model_load.cold_starts}
+    return {"enabled": True, **residency.get_stats()}
 
 
 @app.post("/gateway/route")  # type: ignore[misc]
@@ -349,7 +889,10 @@ async def shutdown_server() -> Dict[str, str]:
         import signal
 
         logger.info("Shutting down server...")
-        os.kill(os.getpid(), signal.SIGTERM)
+        # Workers started by `python main.py` stop their uvicorn supervisor (which
+        # stops them all); under any other process manager only this process stops
+        supervised = os.getenv(SUPERVISOR_PID_ENV) == str(os.getppid())
+        os.kill(os.getppid() if supervised else os.getpid(), signal.SIGTERM)
 
     # Schedule shutdown after response is sent
     import threading
@@ -373,11 +916,19 @@ if __name__ == "__main__":
     import uvicorn
 
     logger.info(f"Starting Ollama Gateway on port {GATEWAY_PORT}")
-    logger.info(f"Ollama URL: {OLLAMA_URL}")
+    logger.info(f"Ollama URL: {', '.join(OLLAMA_URLS)}")
     logger.info(f"Configured models: {len(config['models'])}")
     logger.info(f"Default model: {config['default_model']}")
     logger.info(f"Streaming: {'enabled' if ENABLE_STREAMING else 'disabled'}")
+    logger.info(f"Workers: {WORKERS}")
     logger.info(f"Dashboard: http://localhost:{GATEWAY_PORT}/studio")
 
     bind_host = os.getenv("GATEWAY_HOST", "0.0.0.0")  # nosec B104
-    uvicorn.run(app, host=bind_host, port=GATEWAY_PORT, log_level="info")
+    if WORKERS > 1:
+        # Each worker process imports the app by name
+        os.environ[SUPERVISOR_PID_ENV] = str(os.getpid())
+        uvicorn.run(
+            "main:app", host=bind_host, port=GATEWAY_PORT, workers=WORKERS, log_level="info"
+        )
+    else:
+        uvicorn.run(app, host=bind_host, port=GATEWAY_PORT, log_level="info")
@@ -0,0 +1,250 @@
+"""
+Prometheus-style metrics for Ollama Gateway
+Counters, gauges and histograms rendered in the text exposition format at /metrics
+"""
+
+import logging
+import math
+from bisect import bisect_left
+from typing import Any, Dict, Iterable, List, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (seconds) for latencies from sub-millisecond hot paths to long generations
+LATENCY_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+    120.0,
+)
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(
+        '{}="{}"'.format(name, value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"'))
+        for name, value in zip(names, values)
+    )
+    return "{" + pairs + "}"
+
+
+class _Metric:
+    """Base class: a named family of children keyed by label values"""
+
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} {self.kind}"
+
+
+class _Value:
+    """A single counter or gauge value"""
+
+    __slots__ = ("value",)
+
+    def __init__(self) -> None:
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.value -= amount
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+
+class Counter(_Metric):
+    """Monotonic count per label set"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        super().__init__(name, documentation, labelnames)
+        self._children: Dict[Tuple[str, ...], _Value] = {}
+
+    def labels(self, *values: str) -> _Value:
+        child = self._children.get(values)
+        if child is None:
+            child = self._children.setdefault(values, _Value())
+        return child
+
+    def render(self) -> Iterable[str]:
+        yield from super().render()
+        for values, child in list(self._children.items()):
+            yield f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}"
+
+
+class Gauge(Counter):
+    """Value that can go up and down (or be set at scrape time)"""
+
+    kind = "gauge"
+
+
+class _HistogramValue:
+    """Bucket counts, sum and count of one label set"""
+
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: Tuple[float, ...]) -> None:
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        # One bucket per observation; cumulative counts are built at scrape time
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Histogram(_Metric):
+    """Distribution of observed values in fixed buckets per label set"""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.bounds = tuple(sorted(buckets))
+        self._children: Dict[Tuple[str, ...], _HistogramValue] = {}
+
+    def labels(self, *values: str) -> _HistogramValue:
+        child = self._children.get(values)
+        if child is None:
+            child = self._children.setdefault(values, _HistogramValue(self.bounds))
+        return child
+
+    def render(self) -> Iterable[str]:
+        yield from super().render()
+        names = self.labelnames + ("le",)
+        for values, child in list(self._children.items()):
+            cumulative = 0
+            for bound, count in zip(self.bounds + (math.inf,), list(child.counts)):
+                cumulative += count
+                labels = _format_labels(names, values + (_format_value(bound),))
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.labelnames, values)
+            yield f"{self.name}_sum{labels} {_format_value(child.sum)}"
+            yield f"{self.name}_count{labels} {child.count}"
+
+
+class Registry:
+    """Collection of metrics rendered together"""
+
+    def __init__(self) -> None:
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> None:
+        self._metrics.append(metric)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+# Gateway metrics. Observations happen on the event loop thread only, so plain
+# attribute updates are race-free without locks; children are created once per
+# label set and cached so the hot path is a dict lookup plus a few additions.
+REQUESTS = Counter("gateway_requests_total", "Chat completion requests", ("model", "status"))
+REQUEST_LATENCY = Histogram(
+    "gateway_request_duration_seconds",
+    "Chat completion latency until the last byte",
+    ("model", "stream"),
+)
+TTFT = Histogram(
+    "gateway_time_to_first_token_seconds", "Time from request to first streamed chunk", ("model",)
+)
+INTER_TOKEN = Histogram(
+    "gateway_inter_token_seconds", "Gap between consecutive streamed chunks", ("model",)
+)
+ROUTING_LATENCY = Histogram("gateway_routing_duration_seconds", "Model routing decision time")
+ORCHESTRATION_STEP = Histogram(
+    "gateway_orchestration_step_duration_seconds",
+    "Orchestration step time (plan, subtask, synthesis)",
+    ("step",),
+)
+RAG_EMBED = Histogram("gateway_rag_embed_duration_seconds", "RAG embedding request time")
+RAG_SEARCH = Histogram("gateway_rag_search_duration_seconds", "RAG vector search time")
+OLLAMA_EVAL = Histogram(
+    "gateway_ollama_eval_duration_seconds", "Ollama generation time (eval_duration)", ("model",)
+)
+OLLAMA_PROMPT_EVAL = Histogram(
+    "gateway_ollama_prompt_eval_duration_seconds",
+    "Ollama prompt processing time (prompt_eval_duration)",
+    ("model",),
+)
+OLLAMA_TOKENS = Counter(
+    "gateway_ollama_tokens_total", "Tokens processed by Ollama", ("model", "kind")
+)
+IN_FLIGHT = Gauge("gateway_upstream_in_flight", "Upstream calls running", ("model",))
+QUEUED = Gauge("gateway_upstream_queued", "Upstream calls waiting for admission", ("model",))
+
+for _metric in (
+    REQUESTS,
+    REQUEST_LATENCY,
+    TTFT,
+    INTER_TOKEN,
+    ROUTING_LATENCY,
+    ORCHESTRATION_STEP,
+    RAG_EMBED,
+    RAG_SEARCH,
+    OLLAMA_EVAL,
+    OLLAMA_PROMPT_EVAL,
+    OLLAMA_TOKENS,
+    IN_FLIGHT,
+    QUEUED,
+):
+    REGISTRY.register(_metric)
+
+
+def observe_ollama_reply(model: str, ollama_data: Dict[str, Any]) -> None:
+    """Record the timings and token counts Ollama reports on the final line of a reply"""
+    eval_ns = ollama_data.get("eval_duration")
+    if eval_ns:
+        OLLAMA_EVAL.labels(model).observe(eval_ns / 1e9)
+    prompt_eval_ns = ollama_data.get("prompt_eval_duration")
+    if prompt_eval_ns:
+        OLLAMA_PROMPT_EVAL.labels(model).observe(prompt_eval_ns / 1e9)
+    OLLAMA_TOKENS.labels(model, "prompt").inc(ollama_data.get("prompt_eval_count") or 0)
+    OLLAMA_TOKENS.labels(model, "completion").inc(ollama_data.get("eval_count") or 0)
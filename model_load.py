@@ -0,0 +1,201 @@
+"""
+Live per-model load signals for routing
+Tracks in-flight requests, recent generation speed and the models Ollama has resident (/api/ps)
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from backends import BackendPool
+from scheduler import AdmissionScheduler
+
+logger = logging.getLogger(__name__)
+
+# Defaults used when config.json has no "routing" section
+DEFAULT_ROUTING_SETTINGS: Dict[str, Any] = {
+    "load_aware": False,
+    "score_margin": 0,
+    "ps_poll_interval": 10.0,
+    "cold_load_penalty_s": 5.0,
+    "default_tokens_per_s": 20.0,
+    "expected_tokens": 256,
+}
+
+_EWMA_ALPHA = 0.2
+
+# A reply whose load_duration exceeds this had to wait for the model to be loaded
+COLD_LOAD_S = 0.5
+
+
+def get_routing_settings(config: Dict[str, Any]) -> Dict[str, Any]:
+    """Merge the "routing" section of config.json over the defaults"""
+    return {**DEFAULT_ROUTING_SETTINGS, **config.get("routing", {})}
+
+
+class ModelLoadTracker:
+    """
+    Expected-latency estimates per model
+
+    Concurrency and queue depth come from the admission scheduler; generation
+    speed is an EWMA of eval_count / eval_duration from the final line of each
+    Ollama reply; residency comes from polling /api/ps (and a model that just
+    answered is resident). The estimate for one more request is
+
+        (in_flight + queued) / max_concurrency + 1 service times,
+        service time = expected tokens / tokens per second,
+        plus the model's last measured load time (or `cold_load_penalty_s`)
+        when it is not loaded.
+
+    A model whose speed has not been measured yet is assumed to be as quick
+    as the quickest measured one (`default_tokens_per_s` before any
+    measurement), so load-aware routing tries it instead of always
+    preferring models that already answered.
+
+    Replies whose load_duration shows the model was loaded for them are
+    counted as cold starts.
+    """
+
+    def __init__(
+        self,
+        scheduler: AdmissionScheduler,
+        cold_load_penalty_s: float = 5.0,
+        default_tokens_per_s: float = 20.0,
+        expected_tokens: int = 256,
+    ) -> None:
+        self.scheduler = scheduler
+        self.cold_load_penalty_s = cold_load_penalty_s
+        self.default_tokens_per_s = default_tokens_per_s
+        self.expected_tokens = expected_tokens
+
+        self._tokens_per_s: Dict[str, float] = {}
+        self._eval_tokens: Dict[str, float] = {}
+        self.cold_starts: Dict[str, int] = {}
+        self.load_seconds: Dict[str, float] = {}
+        # model name -> /api/ps entry (size, size_vram, expires_at, ...)
+        self.loaded: Dict[str, Dict[str, Any]] = {}
+        self.loaded_at: Optional[float] = None
+
+    @classmethod
+    def from_settings(
+        cls, scheduler: AdmissionScheduler, settings: Dict[str, Any]
+    ) -> "ModelLoadTracker":
+        return cls(
+            scheduler,
+            cold_load_penalty_s=settings["cold_load_penalty_s"],
+            default_tokens_per_s=settings["default_tokens_per_s"],
+            expected_tokens=settings["expected_tokens"],
+        )
+
+    def observe(self, model: str, ollama_data: Dict[str, Any]) -> None:
+        """Record the final line of an Ollama /api/chat or /api/generate reply"""
+        eval_count = ollama_data.get("eval_count") or 0
+        eval_duration = ollama_data.get("eval_duration") or 0
+        if eval_count > 0 and eval_duration > 0:
+            tokens_per_s = eval_count / (eval_duration / 1e9)
+            previous = self._tokens_per_s.get(model)
+            self._tokens_per_s[model] = (
+                tokens_per_s
+                if previous is None
+                else previous + _EWMA_ALPHA * (tokens_per_s - previous)
+            )
+            tokens = self._eval_tokens.get(model, float(eval_count))
+            self._eval_tokens[model] = tokens + _EWMA_ALPHA * (eval_count - tokens)
+        if ollama_data.get("done"):
+            self.loaded.setdefault(model, {})
+
+        load_s = (ollama_data.get("load_duration") or 0) / 1e9
+        if load_s > COLD_LOAD_S:
+            self.record_load(model, load_s)
+            self.cold_starts[model] = self.cold_starts.get(model, 0) + 1
+
+    def record_load(self, model: str, load_s: float) -> None:
+        """Remember how long the model took to load"""
+        self.load_seconds[model] = load_s
+
+    def is_loaded(self, model: str) -> bool:
+        return model in self.loaded
+
+    def estimate(self, model: str) -> Dict[str, Any]:
+        """Load signals and expected latency (seconds) of one more request to `model`"""
+        load = self.scheduler.load(model)
+        tokens_per_s = self._tokens_per_s.get(model)
+        if tokens_per_s is not None:
+            service_s = self._eval_tokens[model] / max(tokens_per_s, 1e-3)
+        else:
+            # Optimistic until measured: as quick as the quickest measured model
+            service_s = min(
+                (
+                    self._eval_tokens[name] / max(rate, 1e-3)
+                    for name, rate in self._tokens_per_s.items()
+                ),
+                default=self.expected_tokens / self.default_tokens_per_s,
+            )
+        loaded = self.is_loaded(model)
+
+        expected_s = ((load["active"] + load["queued"]) / load["max_concurrency"] + 1) * service_s
+        if not loaded:
+            expected_s += self.load_seconds.get(model, self.cold_load_penalty_s)
+        return {
+            "in_flight": load["active"],
+            "queued": load["queued"],
+            "tokens_per_s": round(tokens_per_s, 1) if tokens_per_s is not None else None,
+            "measured": tokens_per_s is not None,
+            "loaded": loaded,
+            "expected_s": round(expected_s, 2),
+        }
+
+    async def _ps(self, client: httpx.AsyncClient, ollama_url: str) -> List[Dict[str, Any]]:
+        response = await client.get(f"{ollama_url}/api/ps")
+        response.raise_for_status()
+        models: List[Dict[str, Any]] = response.json().get("models", [])
+        return models
+
+    async def refresh_loaded(self, client: httpx.AsyncClient, backends: BackendPool) -> None:
+        """
+        Replace the resident-model set with /api/ps of the healthy backends
+
+        Each entry lists the backend URLs holding the model under "backends".
+        Backends that fail to answer are skipped; if none answers, the error
+        of the first one is raised.
+        """
+        urls = [backend.url for backend in backends.healthy()] or backends.urls
+        replies = await asyncio.gather(
+            *(self._ps(client, url) for url in urls), return_exceptions=True
+        )
+        errors = [reply for reply in replies if isinstance(reply, BaseException)]
+        if len(errors) == len(replies):
+            raise errors[0]
+
+        loaded: Dict[str, Dict[str, Any]] = {}
+        for url, reply in zip(urls, replies):
+            if isinstance(reply, BaseException):
+                logger.debug(f"Failed to poll {url}/api/ps: {reply}")
+                continue
+            for entry in reply:
+                merged = loaded.setdefault(entry["name"], {**entry, "backends": []})
+                merged["backends"].append(url)
+        self.loaded = loaded
+        self.loaded_at = time.time()
+
+    async def poll_loaded(
+        self, client: httpx.AsyncClient, backends: BackendPool, interval: float
+    ) -> None:
+        """Refresh the resident-model set every `interval` seconds until cancelled"""
+        while True:
+            try:
+                await self.refresh_loaded(client, backends)
+            except (httpx.HTTPError, ValueError) as e:
+                logger.debug(f"Failed to poll /api/ps: {e}")
+            await asyncio.sleep(interval)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Current estimate for every model seen so far"""
+        models = set(self._tokens_per_s) | set(self.loaded) | set(self.scheduler.models())
+        return {
+            "loaded_at": self.loaded_at,
+            "models": {model: self.estimate(model) for model in sorted(models)},
+        }
@@ -3,24 +3,46 @@ Multi-Model Orchestration System
 Allows one AI to coordinate multiple specialized models for complex tasks
 """
 
+import asyncio
 import json
 import logging
 import re
-from typing import Any, Dict, List, Optional, Tuple
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 
 import httpx
 
+from backends import BackendPool
+from metrics import ORCHESTRATION_STEP, observe_ollama_reply
+from model_load import ModelLoadTracker
+from scheduler import AdmissionRejected, AdmissionScheduler
+from streaming import aiter_ndjson
+
 logger = logging.getLogger(__name__)
 
 
 class TaskOrchestrator:
     """
     Orchestrates complex tasks across multiple specialized models
+
+    Every upstream call (plan, subtasks, synthesis) is admitted by the
+    gateway's scheduler with the request's priority, so orchestration shares
+    the per-model concurrency limits and queues with other traffic, and its
+    replies feed the load tracker and the Ollama metrics. A full queue raises
+    AdmissionRejected to the caller.
     """
 
-    def __init__(self, router: Any, ollama_url: str) -> None:
+    def __init__(
+        self,
+        router: Any,
+        backends: BackendPool,
+        scheduler: AdmissionScheduler,
+        load_tracker: Optional[ModelLoadTracker] = None,
+    ) -> None:
         self.router = router
-        self.ollama_url = ollama_url
+        self.backends = backends
+        self.scheduler = scheduler
+        self.load_tracker = load_tracker
 
         # Define orchestrator model (the "brain")
         self.orchestrator_model = (
@@ -47,9 +69,25 @@ class TaskOrchestrator:
         prompt_lower = prompt.lower()
         return any(re.search(pattern, prompt_lower) for pattern in complex_indicators)
 
+    def _observe(self, model: str, ollama_data: Dict[str, Any]) -> None:
+        """Record the final line of a reply, as the gateway does for routed calls"""
+        if self.load_tracker is not None:
+            self.load_tracker.observe(model, ollama_data)
+        observe_ollama_reply(model, ollama_data)
+
+    async def _post_chat(
+        self, http_client: httpx.AsyncClient, payload: Dict[str, Any], timeout: float
+    ) -> Dict[str, Any]:
+        """Non-streaming /api/chat call; hold a scheduler slot for the model around it"""
+        response = await self.backends.post(http_client, "/api/chat", payload, timeout=timeout)
+        result: Dict[str, Any] = response.json()
+        if response.status_code == 200:
+            self._observe(payload["model"], result)
+        return result
+
     async def decompose_task(
-        self, prompt: str, http_client: httpx.AsyncClient
-    ) -> List[Dict[str, str]]:
+        self, prompt: str, http_client: httpx.AsyncClient, priority: str = "interactive"
+    ) -> List[Dict[str, Any]]:
         """
         Use orchestrator AI to break down complex task into subtasks
         """
@@ -66,11 +104,15 @@ class TaskOrchestrator:
             "- gemma2: Creative writing, stories\n"
             "- mistral: General knowledge, explanations\n\n"
             f"User request: {prompt}\n\n"
+            "Give each subtask a numeric id. List in depends_on the ids of earlier "
+            "subtasks whose results it needs; leave it empty when it can run "
+            "independently.\n\n"
             "Respond with ONLY a JSON array of subtasks:\n"
             "[\n"
-            '  {"task": "brief description", '
+            '  {"id": 1, "task": "brief description", '
             '"specialist": "model-name", '
-            '"context": "what info is needed"},\n'
+            '"context": "what info is needed", '
+            '"depends_on": []},\n'
             "  ...\n"
             "]"
         )
@@ -83,34 +125,36 @@ class TaskOrchestrator:
         }
 
         try:
-            response = await http_client.post(
-                f"{self.ollama_url}/api/chat", json=payload, timeout=30.0
-            )
-            result = response.json()
+            async with await self.scheduler.acquire(self.orchestrator_model, priority):
+                result = await self._post_chat(http_client, payload, timeout=30.0)
             content = result.get("message", {}).get("content", "[]")
 
             # Extract JSON from response (might have markdown code blocks)
             json_match = re.search(r"\[[\s\S]*\]", content)
             if json_match:
-                subtasks: List[Dict[str, str]] = json.loads(json_match.group())
+                subtasks: List[Dict[str, Any]] = json.loads(json_match.group())
                 logger.info(f"Orchestrator created {len(subtasks)} subtasks")
                 return subtasks
             else:
                 logger.warning("Failed to parse orchestration plan")
                 return []
 
+        except AdmissionRejected:
+            raise
         except Exception as e:
             logger.error(f"Task decomposition failed: {e}")
             return []
 
     async def execute_subtask(
         self,
-        subtask: Dict[str, str],
+        subtask: Dict[str, Any],
         http_client: httpx.AsyncClient,
         context: str = "",
     ) -> str:
         """
         Execute a single subtask with the specified model
+
+        Call with a scheduler slot for the model held (see _run_subtask).
         """
         model = subtask.get("specialist", "mistral:latest")
         task_desc = subtask.get("task", "")
@@ -129,10 +173,7 @@ class TaskOrchestrator:
 
         try:
             logger.info(f"Executing subtask with {model}: {task_desc[:50]}...")
-            response = await http_client.post(
-                f"{self.ollama_url}/api/chat", json=payload, timeout=60.0
-            )
-            result = response.json()
+            result = await self._post_chat(http_client, payload, timeout=60.0)
             content: str = result.get("message", {}).get("content", "No response")
             return content
 
@@ -140,15 +181,115 @@ class TaskOrchestrator:
             logger.error(f"Subtask execution failed: {e}")
             return f"Error executing subtask: {str(e)}"
 
-    async def synthesize_results(
+    def resolve_dependencies(self, subtasks: List[Dict[str, Any]]) -> List[List[int]]:
+        """
+        Map each subtask's depends_on ids to indices of earlier subtasks
+
+        Only references to earlier subtasks are kept, which guarantees the plan
+        is a DAG; unknown ids, self references and forward references are dropped.
+        """
+        id_to_index: Dict[str, int] = {}
+        for index, subtask in enumerate(subtasks):
+            id_to_index.setdefault(str(subtask.get("id", index + 1)), index)
+
+        dependencies: List[List[int]] = []
+        for index, subtask in enumerate(subtasks):
+            declared = subtask.get("depends_on") or []
+            if not isinstance(declared, list):
+                declared = [declared]
+
+            deps: List[int] = []
+            for dep_id in declared:
+                dep_index = id_to_index.get(str(dep_id))
+                if dep_index is None or dep_index >= index:
+                    logger.warning(f"Ignoring invalid dependency {dep_id!r} of subtask {index + 1}")
+                    continue
+                if dep_index not in deps:
+                    deps.append(dep_index)
+            dependencies.append(deps)
+
+        return dependencies
+
+    async def _run_subtask(
         self,
-        original_prompt: str,
-        subtask_results: List[Tuple[str, str]],
+        index: int,
+        subtask: Dict[str, Any],
+        deps: List[int],
+        tasks: List["asyncio.Task[Dict[str, Any]]"],
         http_client: httpx.AsyncClient,
-    ) -> str:
+        plan_started: float,
+        priority: str,
+    ) -> Dict[str, Any]:
+        """Wait for dependencies, then run one subtask once the scheduler admits it"""
+        queued_at = time.perf_counter()
+        dep_records = await asyncio.gather(*(tasks[d] for d in deps)) if deps else []
+
+        # Brief context from the subtasks this one depends on
+        context = "".join(f"\n{r['task']}: {r['result'][:200]}..." for r in dep_records)
+
+        model = subtask.get("specialist", "mistral:latest")
+        async with await self.scheduler.acquire(model, priority):
+            started_at = time.perf_counter()
+            result = await self.execute_subtask(subtask, http_client, context)
+        finished_at = time.perf_counter()
+        ORCHESTRATION_STEP.labels("subtask").observe(finished_at - started_at)
+
+        return {
+            "index": index,
+            "task": subtask.get("task", "Subtask"),
+            "specialist": model,
+            "depends_on": deps,
+            "result": result,
+            "timing": {
+                "start_ms": round((started_at - plan_started) * 1000, 1),
+                "wait_ms": round((started_at - queued_at) * 1000, 1),
+                "duration_ms": round((finished_at - started_at) * 1000, 1),
+            },
+        }
+
+    async def execute_plan(
+        self,
+        subtasks: List[Dict[str, Any]],
+        http_client: httpx.AsyncClient,
+        priority: str = "interactive",
+    ) -> AsyncIterator[Dict[str, Any]]:
         """
-        Use orchestrator to combine results from all subtasks
+        Run subtasks as a dependency DAG, yielding each record as it completes
+
+        Independent subtasks run concurrently; each waits only for the
+        subtasks listed in its depends_on.
         """
+        dependencies = self.resolve_dependencies(subtasks)
+        plan_started = time.perf_counter()
+
+        tasks: List["asyncio.Task[Dict[str, Any]]"] = []
+        for index, subtask in enumerate(subtasks):
+            tasks.append(
+                asyncio.ensure_future(
+                    self._run_subtask(
+                        index,
+                        subtask,
+                        dependencies[index],
+                        tasks,
+                        http_client,
+                        plan_started,
+                        priority,
+                    )
+                )
+            )
+
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            # Consumer went away (e.g. client disconnect): stop outstanding subtasks
+            for task in tasks:
+                task.cancel()
+
+    def _build_synthesis_payload(
+        self, original_prompt: str, subtask_results: List[Tuple[str, str]], stream: bool
+    ) -> Tuple[Dict[str, Any], str]:
+        """Build the synthesis request; also returns the raw results text for fallbacks"""
         results_text = "\n\n".join([f"**{task}**\n{result}" for task, result in subtask_results])
 
         synthesis_prompt = f"""You are synthesizing results from multiple specialized AIs.
@@ -165,62 +306,116 @@ Format with markdown for clarity."""
         payload = {
             "model": self.orchestrator_model,
             "messages": [{"role": "user", "content": synthesis_prompt}],
-            "stream": False,
+            "stream": stream,
             "options": {"temperature": 0.5, "num_predict": 2048},
         }
+        return payload, results_text
+
+    @staticmethod
+    def _synthesis_footer(subtask_results: List[Tuple[str, str]]) -> str:
+        specialists_used = [task for task, _ in subtask_results]
+        return "\n\n---\n" f"*Multi-model orchestration | " f"Subtasks: {len(specialists_used)}*"
+
+    async def synthesize_results(
+        self,
+        original_prompt: str,
+        subtask_results: List[Tuple[str, str]],
+        http_client: httpx.AsyncClient,
+        priority: str = "interactive",
+    ) -> str:
+        """
+        Use orchestrator to combine results from all subtasks
+        """
+        payload, results_text = self._build_synthesis_payload(
+            original_prompt, subtask_results, stream=False
+        )
 
         try:
-            response = await http_client.post(
-                f"{self.ollama_url}/api/chat", json=payload, timeout=60.0
-            )
-            result = response.json()
+            async with await self.scheduler.acquire(self.orchestrator_model, priority):
+                result = await self._post_chat(http_client, payload, timeout=60.0)
             final_answer: str = result.get("message", {}).get("content", "")
 
             # Add metadata footer
-            specialists_used = [task for task, _ in subtask_results]
-            footer = (
-                "\n\n---\n" f"*Multi-model orchestration | " f"Subtasks: {len(specialists_used)}*"
-            )
-
-            return final_answer + footer
+            return final_answer + self._synthesis_footer(subtask_results)
 
+        except AdmissionRejected:
+            raise
         except Exception as e:
             logger.error(f"Result synthesis failed: {e}")
             # Fallback: just concatenate results
             return results_text + f"\n\n*Error in synthesis: {str(e)}*"
 
+    async def synthesize_results_stream(
+        self,
+        original_prompt: str,
+        subtask_results: List[Tuple[str, str]],
+        http_client: httpx.AsyncClient,
+        priority: str = "interactive",
+    ) -> AsyncIterator[str]:
+        """
+        Streaming variant of synthesize_results: yields answer text as Ollama generates it
+        """
+        payload, results_text = self._build_synthesis_payload(
+            original_prompt, subtask_results, stream=True
+        )
+
+        produced = False
+        try:
+            async with await self.scheduler.acquire(self.orchestrator_model, priority):
+                async with self.backends.stream(
+                    http_client, "/api/chat", payload, timeout=60.0
+                ) as response:
+                    async for data in aiter_ndjson(response.aiter_bytes()):
+                        content = data.get("message", {}).get("content", "")
+                        if content:
+                            produced = True
+                            yield content
+                        if data.get("done"):
+                            self._observe(self.orchestrator_model, data)
+                            break
+
+            yield self._synthesis_footer(subtask_results)
+
+        except AdmissionRejected:
+            raise
+        except Exception as e:
+            logger.error(f"Result synthesis failed: {e}")
+            # Fallback: just concatenate results (unless part of the answer was already sent)
+            prefix = "\n\n" if produced else results_text + "\n\n"
+            yield prefix + f"*Error in synthesis: {str(e)}*"
+
     async def orchestrate(
-        self, prompt: str, http_client: httpx.AsyncClient
+        self, prompt: str, http_client: httpx.AsyncClient, priority: str = "interactive"
     ) -> Optional[Dict[str, Any]]:
         """
         Main orchestration flow
         Returns: {
             "answer": final synthesized answer,
             "subtasks": list of subtask descriptions,
-            "models_used": list of models involved
+            "models_used": list of models involved,
+            "subtask_timings": per-subtask start/wait/duration in ms
         }
         """
         logger.info(f"Starting orchestration for: {prompt[:100]}...")
 
         # Step 1: Decompose task
-        subtasks = await self.decompose_task(prompt, http_client)
+        step_started = time.perf_counter()
+        subtasks = await self.decompose_task(prompt, http_client, priority)
+        ORCHESTRATION_STEP.labels("plan").observe(time.perf_counter() - step_started)
 
         if not subtasks:
             logger.info("No subtasks created, falling back to single model")
             return None
 
-        # Step 2: Execute subtasks sequentially (could be parallel in future)
-        results = []
-        accumulated_context = ""
-
-        for subtask in subtasks:
-            result = await self.execute_subtask(subtask, http_client, accumulated_context)
-            task_desc = subtask.get("task", "Subtask")
-            results.append((task_desc, result))
-            accumulated_context += f"\n{task_desc}: {result[:200]}..."  # Brief context
+        # Step 2: Execute subtasks as a DAG (independent subtasks run concurrently)
+        records = [record async for record in self.execute_plan(subtasks, http_client, priority)]
+        records.sort(key=lambda r: r["index"])
+        results = [(r["task"], r["result"]) for r in records]
 
         # Step 3: Synthesize final answer
-        final_answer = await self.synthesize_results(prompt, results, http_client)
+        step_started = time.perf_counter()
+        final_answer = await self.synthesize_results(prompt, results, http_client, priority)
+        ORCHESTRATION_STEP.labels("synthesis").observe(time.perf_counter() - step_started)
 
         models_used = [subtask.get("specialist", "unknown") for subtask in subtasks]
         models_used.append(self.orchestrator_model)  # Add orchestrator itself
@@ -230,4 +425,90 @@ Format with markdown for clarity."""
             "subtasks": [s.get("task") for s in subtasks],
             "models_used": list(set(models_used)),  # Unique models
             "orchestration_steps": len(subtasks),
+            "subtask_timings": [
+                {
+                    "task": r["task"],
+                    "specialist": r["specialist"],
+                    "depends_on": r["depends_on"],
+                    **r["timing"],
+                }
+                for r in records
+            ],
+        }
+
+    async def orchestrate_stream(
+        self, prompt: str, http_client: httpx.AsyncClient, priority: str = "interactive"
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Streaming orchestration flow
+
+        Yields progress events as they happen:
+            {"event": "planning"}
+            {"event": "plan", "subtasks": [...]}  or  {"event": "fallback"}
+            {"event": "subtask_done", "task": ..., "specialist": ..., timings}
+            {"event": "token", "content": ...}  (synthesis output)
+            {"event": "done", "models_used": ..., "subtask_timings": ...}
+        """
+        logger.info(f"Starting streaming orchestration for: {prompt[:100]}...")
+        yield {"event": "planning", "orchestrator_model": self.orchestrator_model}
+
+        # Step 1: Decompose task
+        step_started = time.perf_counter()
+        subtasks = await self.decompose_task(prompt, http_client, priority)
+        ORCHESTRATION_STEP.labels("plan").observe(time.perf_counter() - step_started)
+
+        if not subtasks:
+            logger.info("No subtasks created, falling back to single model")
+            yield {"event": "fallback"}
+            return
+
+        dependencies = self.resolve_dependencies(subtasks)
+        yield {
+            "event": "plan",
+            "subtasks": [
+                {
+                    "task": subtask.get("task"),
+                    "specialist": subtask.get("specialist", "unknown"),
+                    "depends_on": dependencies[index],
+                }
+                for index, subtask in enumerate(subtasks)
+            ],
+        }
+
+        # Step 2: Execute subtasks as a DAG, reporting each as it finishes
+        records = []
+        async for record in self.execute_plan(subtasks, http_client, priority):
+            records.append(record)
+            yield {
+                "event": "subtask_done",
+                "index": record["index"],
+                "task": record["task"],
+                "specialist": record["specialist"],
+                **record["timing"],
+            }
+        records.sort(key=lambda r: r["index"])
+
+        # Step 3: Stream the synthesized answer
+        results = [(r["task"], r["result"]) for r in records]
+        step_started = time.perf_counter()
+        async for content in self.synthesize_results_stream(prompt, results, http_client, priority):
+            yield {"event": "token", "content": content}
+        ORCHESTRATION_STEP.labels("synthesis").observe(time.perf_counter() - step_started)
+
+        models_used = {subtask.get("specialist", "unknown") for subtask in subtasks}
+        models_used.add(self.orchestrator_model)
+
+        yield {
+            "event": "done",
+            "models_used": list(models_used),
+            "orchestration_steps": len(subtasks),
+            "subtask_timings": [
+                {
+                    "task": r["task"],
+                    "specialist": r["specialist"],
+                    "depends_on": r["depends_on"],
+                    **r["timing"],
+                }
+                for r in records
+            ],
         }
@@ -0,0 +1,132 @@
+"""
+PDF text extraction for attachments
+Parses page ranges in a process pool (optional pypdf dependency) and streams pages back in order
+"""
+
+import asyncio
+import logging
+import os
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from pathlib import Path
+from typing import AsyncIterator, Deque, List, Optional, Tuple
+
+try:
+    import pypdf
+except ImportError:  # pragma: no cover - optional dependency
+    pypdf = None  # type: ignore[assignment]
+
+logger = logging.getLogger(__name__)
+
+PYPDF_MISSING = "PDF parsing requires the pypdf library.\nInstall: pip install pypdf"
+
+
+def count_pages(file_path: str) -> int:
+    """Number of pages of a PDF (runs in a worker process)"""
+    return len(pypdf.PdfReader(file_path).pages)
+
+
+def extract_page_range(file_path: str, start: int, stop: int) -> List[str]:
+    """Text of pages [start, stop) of a PDF (runs in a worker process)"""
+    reader = pypdf.PdfReader(file_path)
+    texts = []
+    for number in range(start, min(stop, len(reader.pages))):
+        try:
+            texts.append(reader.pages[number].extract_text() or "")
+        except Exception as e:  # A broken page should not lose the rest of the document
+            logger.warning(f"Failed to extract page {number + 1} of {file_path}: {e}")
+            texts.append("")
+    return texts
+
+
+class PDFExtractor:
+    """
+    Extracts PDF text without blocking the event loop
+
+    Parsing is CPU-bound, so it runs in a ProcessPoolExecutor created on first
+    use. A document is split into tasks of `pages_per_task` pages; up to two
+    tasks per worker are in flight and results are yielded in page order as
+    soon as they are ready, so consumers can start before the whole file is
+    parsed. At most `max_pages` pages are read, and extraction of a file stops
+    after `timeout` seconds (tasks already running in a worker finish in the
+    background; queued ones are cancelled).
+    """
+
+    def __init__(
+        self,
+        max_workers: Optional[int] = None,
+        timeout: float = 60.0,
+        max_pages: int = 500,
+        pages_per_task: int = 8,
+    ) -> None:
+        self.max_workers = max_workers or min(4, os.cpu_count() or 1)
+        self.timeout = timeout
+        self.max_pages = max_pages
+        self.pages_per_task = max(1, pages_per_task)
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    @property
+    def available(self) -> bool:
+        return pypdf is not None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._executor
+
+    async def iter_pages(self, file_path: Path) -> AsyncIterator[Tuple[int, str]]:
+        """
+        Yield (page number starting at 1, text) in order
+
+        Raises:
+            RuntimeError: pypdf is not installed
+            asyncio.TimeoutError: the per-file timeout expired
+        """
+        if pypdf is None:
+            raise RuntimeError(PYPDF_MISSING)
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.timeout
+        executor = self._get_executor()
+        path = str(file_path)
+
+        page_count = await asyncio.wait_for(
+            loop.run_in_executor(executor, count_pages, path), self.timeout
+        )
+        if page_count > self.max_pages:
+            logger.warning(f"{file_path}: reading {self.max_pages} of {page_count} pages")
+            page_count = self.max_pages
+
+        ranges = deque(
+            (start, min(start + self.pages_per_task, page_count))
+            for start in range(0, page_count, self.pages_per_task)
+        )
+        in_flight: Deque[Tuple[int, "Future[List[str]]"]] = deque()
+        try:
+            while ranges or in_flight:
+                while ranges and len(in_flight) < 2 * self.max_workers:
+                    start, stop = ranges.popleft()
+                    in_flight.append(
+                        (start, executor.submit(extract_page_range, path, start, stop))
+                    )
+
+                start, future = in_flight.popleft()
+                texts = await asyncio.wait_for(
+                    asyncio.wrap_future(future), max(0.0, deadline - loop.time())
+                )
+                for offset, text in enumerate(texts):
+                    yield start + offset + 1, text
+        finally:
+            for _, future in in_flight:
+                future.cancel()
+
+    async def extract_text(self, file_path: Path) -> str:
+        """Whole-document text, pages separated by blank lines"""
+        pages = [text async for _, text in self.iter_pages(file_path)]
+        return "\n\n".join(pages)
+
+    def shutdown(self) -> None:
+        """Stop the worker processes"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
@@ -3,14 +3,23 @@ RAG (Retrieval-Augmented Generation) Engine
 Local vector embeddings with Ollama + semantic search
 """
 
-import json
+import asyncio
 import logging
+import time
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, AsyncIterable, Dict, Iterable, List, Optional, Set, Tuple, Union
 
 import httpx
 import numpy as np
 
+from backends import BackendPool, parse_backend_urls
+from chunker import Chunker, aiter_attachment_chunks, attachment_doc_prefix
+from embedding_cache import EmbeddingCache
+from journal import JournaledStore
+from metrics import RAG_EMBED, RAG_SEARCH
+from pdf_extractor import PDFExtractor
+from vector_index import VectorIndex, migrate_json_vectors
+
 logger = logging.getLogger(__name__)
 
 
@@ -21,74 +30,335 @@ class RAGEngine:
     """
 
     def __init__(
-        self, ollama_url: str = "http://localhost:11434", storage_path: str = "./rag_storage"
+        self,
+        ollama_url: str = "http://localhost:11434",
+        storage_path: str = "./rag_storage",
+        http_client: Optional[httpx.AsyncClient] = None,
+        embedding_timeout: float = 30.0,
+        embed_batch_size: int = 32,
+        embed_concurrency: int = 4,
+        embedding_cache: Optional[EmbeddingCache] = None,
+        ann_nprobe: int = 8,
+        chunker: Optional[Chunker] = None,
+        read_only: bool = False,
+        backends: Optional[BackendPool] = None,
     ):
         self.ollama_url = ollama_url
+
+        # Embedding calls are balanced like chat calls (the gateway passes its
+        # pool); standalone engines use `ollama_url`, which may list several hosts
+        self.backends = backends or BackendPool(parse_backend_urls(ollama_url))
+
+        # Shared pooled client from the gateway (see http_pool); a private one is created lazily
+        self.http_client = http_client
+        self._owns_http_client = False
+        self.embedding_timeout = embedding_timeout
+
+        # Bulk ingestion: texts per /api/embed call and concurrent calls in flight
+        self.embed_batch_size = max(1, embed_batch_size)
+        self.embed_concurrency = max(1, embed_concurrency)
         self.storage_path = Path(storage_path)
         self.storage_path.mkdir(exist_ok=True)
 
         # Embedding model (Ollama nomic-embed-text)
         self.embedding_model = "nomic-embed-text"
 
-        # Vector store (simple JSON for v2.0, can upgrade to ChromaDB later)
+        # Attachments are split into chunks that fit the embedding context
+        self.chunker = chunker or Chunker()
+
+        # The embedding model is deterministic: repeated texts are served from cache
+        self.embedding_cache = embedding_cache or EmbeddingCache(
+            self.storage_path / "embedding_cache"
+        )
+
+        # Vector store: memory-mapped float32 matrix + id sidecar (vectors.json is legacy)
         self.vectors_file = self.storage_path / "vectors.json"
+        self.index_file = self.storage_path / "vectors.npy"
         self.documents_file = self.storage_path / "documents.json"
 
+        # IVF lists scanned per search once an ANN index is built (see build_ann_index)
+        self.ann_nprobe = ann_nprobe
+
+        # With several gateway workers one engine writes; the others open the
+        # vectors read-only (shared mmap) and pick up its saves before searching
+        self.read_only = read_only
+
+        # documents.json is the snapshot; changes are appended to documents.json.log
+        self.documents_journal = JournaledStore(self.documents_file, indent=2)
+
         # Load existing data
-        self.vectors = self._load_vectors()
         self.documents = self._load_documents()
+        self.index = self._load_vectors()
 
         logger.info(f"RAG Engine initialized with {len(self.documents)} documents")
 
-    def _load_vectors(self) -> Dict[str, List[float]]:
-        """Load vector embeddings from storage"""
-        if self.vectors_file.exists():
-            with open(self.vectors_file, "r") as f:
-                data: Dict[str, List[float]] = json.load(f)
-                return data
-        return {}
+    def _load_vectors(self) -> VectorIndex:
+        """Open the binary vector index, migrating a legacy vectors.json once"""
+        if not self.index_file.exists() and not self.read_only:
+            migrated = migrate_json_vectors(self.vectors_file, self.index_file, self.documents)
+            if migrated is not None:
+                return migrated
+        return VectorIndex.open(self.index_file, read_only=self.read_only, nprobe=self.ann_nprobe)
+
+    def refresh(self) -> None:
+        """Pick up vectors and documents saved by the writing process (read-only engines)"""
+        if self.read_only:
+            # Vectors first: the writer saves them before the documents
+            self.index.refresh()
+            self.documents_journal.sync(self.documents)
 
     def _load_documents(self) -> Dict[str, Dict[str, Any]]:
-        """Load document metadata from storage"""
-        if self.documents_file.exists():
-            with open(self.documents_file, "r") as f:
-                data: Dict[str, Dict[str, Any]] = json.load(f)
-                return data
-        return {}
+        """Load document metadata from storage (snapshot + operation log)"""
+        data: Dict[str, Dict[str, Any]] = self.documents_journal.load()
+        return data
 
     def _save_vectors(self) -> None:
         """Persist vectors to disk"""
-        with open(self.vectors_file, "w") as f:
-            json.dump(self.vectors, f)
+        self.index.save()
+
+    def _save_documents(self, doc_id: Optional[str] = None) -> None:
+        """
+        Persist documents to disk
+
+        With a doc_id only that document is appended to the operation log;
+        without one a full snapshot is written.
+        """
+        self.documents_journal.save(self.documents, doc_id)
+
+    def build_ann_index(self, n_lists: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Train an IVF index over the stored vectors and persist it next to them
 
-    def _save_documents(self) -> None:
-        """Persist documents to disk"""
-        with open(self.documents_file, "w") as f:
-            json.dump(self.documents, f, indent=2)
+        Subsequent searches only scan the `ann_nprobe` closest lists; inserts
+        and deletes keep the index current. Rebuild after large changes.
+
+        Returns:
+            IVF index statistics
+        """
+        ann = self.index.build_ann(n_lists=n_lists, nprobe=self.ann_nprobe)
+        self._save_vectors()
+        stats: Dict[str, Any] = ann.get_stats(self.index.used_rows)
+        logger.info(f"Built ANN index: {stats}")
+        return stats
+
+    def _get_http_client(self) -> httpx.AsyncClient:
+        """Return the shared client, creating a pooled private one on first use"""
+        if self.http_client is None:
+            self.http_client = httpx.AsyncClient(timeout=self.embedding_timeout)
+            self._owns_http_client = True
+        return self.http_client
+
+    async def aclose(self) -> None:
+        """Close the private HTTP client, if this engine created one (a shared one is left open)"""
+        if self._owns_http_client and self.http_client is not None:
+            await self.http_client.aclose()
+            self.http_client = None
+            self._owns_http_client = False
 
     async def get_embedding(self, text: str) -> Optional[List[float]]:
         """
         Get embedding vector from Ollama
         """
+        cached = self.embedding_cache.get(self.embedding_model, text)
+        if cached is not None:
+            return cached
+
         try:
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                response = await client.post(
-                    f"{self.ollama_url}/api/embeddings",
-                    json={"model": self.embedding_model, "prompt": text},
-                )
-
-                if response.status_code == 200:
-                    resp_data = response.json()
-                    embedding: Optional[List[float]] = resp_data.get("embedding")
-                    return embedding
-                else:
-                    logger.error(f"Embedding API error: {response.status_code}")
-                    return None
+            client = self._get_http_client()
+            started = time.perf_counter()
+            response = await self.backends.post(
+                client,
+                "/api/embeddings",
+                {"model": self.embedding_model, "prompt": text},
+                timeout=self.embedding_timeout,
+            )
+            RAG_EMBED.labels().observe(time.perf_counter() - started)
+
+            if response.status_code == 200:
+                resp_data = response.json()
+                embedding: Optional[List[float]] = resp_data.get("embedding")
+                if embedding:
+                    self.embedding_cache.put(self.embedding_model, text, embedding)
+                return embedding
+            else:
+                logger.error(f"Embedding API error: {response.status_code}")
+                return None
 
         except Exception as e:
             logger.error(f"Failed to get embedding: {e}")
             return None
 
+    async def get_embeddings(self, texts: List[str]) -> Optional[Tuple[List[List[float]], int]]:
+        """
+        Embed several texts in one call to Ollama's batch /api/embed endpoint
+
+        Cached texts are not sent; only the misses go to Ollama.
+
+        Returns:
+            (embeddings in input order, prompt tokens evaluated) or None on failure
+        """
+        results: List[Optional[List[float]]] = [
+            self.embedding_cache.get(self.embedding_model, text) for text in texts
+        ]
+        missing = [i for i, embedding in enumerate(results) if embedding is None]
+        if not missing:
+            return [e for e in results if e is not None], 0
+
+        fetched = await self._fetch_embeddings([texts[i] for i in missing])
+        if fetched is None:
+            return None
+
+        embeddings, tokens = fetched
+        for i, embedding in zip(missing, embeddings):
+            results[i] = embedding
+            self.embedding_cache.put(self.embedding_model, texts[i], embedding)
+        return [e for e in results if e is not None], tokens
+
+    async def _fetch_embeddings(self, texts: List[str]) -> Optional[Tuple[List[List[float]], int]]:
+        """Call /api/embed for texts that are not cached"""
+        try:
+            client = self._get_http_client()
+            started = time.perf_counter()
+            response = await self.backends.post(
+                client,
+                "/api/embed",
+                {"model": self.embedding_model, "input": texts},
+                timeout=self.embedding_timeout,
+            )
+            RAG_EMBED.labels().observe(time.perf_counter() - started)
+
+            if response.status_code == 404:
+                # Ollama < 0.3 has no /api/embed: fall back to one call per text
+                single = await asyncio.gather(*(self.get_embedding(text) for text in texts))
+                if any(embedding is None for embedding in single):
+                    return None
+                return [e for e in single if e is not None], sum(len(t) // 4 for t in texts)
+
+            if response.status_code != 200:
+                logger.error(f"Batch embedding API error: {response.status_code}")
+                return None
+
+            resp_data = response.json()
+            embeddings: List[List[float]] = resp_data.get("embeddings", [])
+            if len(embeddings) != len(texts):
+                logger.error(f"Batch embedding returned {len(embeddings)}/{len(texts)} vectors")
+                return None
+
+            # Rough token estimation (4 chars ≈ 1 token) when Ollama does not report it
+            tokens = resp_data.get("prompt_eval_count") or sum(len(t) // 4 for t in texts)
+            return embeddings, int(tokens)
+
+        except Exception as e:
+            logger.error(f"Failed to get batch embeddings: {e}")
+            return None
+
+    async def add_documents(
+        self,
+        documents: Union[Iterable[Dict[str, Any]], AsyncIterable[Dict[str, Any]]],
+        project_id: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """
+        Bulk-add documents to the RAG index
+
+        Documents are grouped into batches of `embed_batch_size`, embedded with
+        at most `embed_concurrency` /api/embed calls in flight, and persisted
+        once at the end.
+
+        Args:
+            documents: Iterable or async iterable of
+                {"doc_id", "content", "metadata"?, "project_id"?}
+            project_id: Default project for documents that do not set one
+
+        Returns:
+            Ingestion report: added/failed counts, tokens, elapsed time and throughput,
+            plus "error" if the document source raised (what was added is kept)
+        """
+        started = time.perf_counter()
+        added: List[str] = []
+        failed = 0
+        tokens = 0
+
+        async def embed_batch(batch: List[Dict[str, Any]]) -> None:
+            nonlocal failed, tokens
+            result = await self.get_embeddings([doc["content"] for doc in batch])
+            if result is None:
+                failed += len(batch)
+                return
+
+            embeddings, batch_tokens = result
+            tokens += batch_tokens
+            for doc, embedding in zip(batch, embeddings):
+                doc_id = doc["doc_id"]
+                doc_project = doc.get("project_id", project_id)
+                try:
+                    self.index.add(doc_id, embedding, doc_project)
+                except ValueError as e:
+                    logger.error(f"Failed to index document {doc_id}: {e}")
+                    failed += 1
+                    continue
+                self.documents[doc_id] = {
+                    "content": doc["content"],
+                    "metadata": doc.get("metadata") or {},
+                    "project_id": doc_project,
+                    "embedding_model": self.embedding_model,
+                }
+                added.append(doc_id)
+
+        # Keep at most embed_concurrency batches in flight while consuming the input lazily
+        in_flight: Set["asyncio.Task[None]"] = set()
+        batch: List[Dict[str, Any]] = []
+
+        async def submit(batch: List[Dict[str, Any]]) -> None:
+            if len(in_flight) >= self.embed_concurrency:
+                done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                in_flight.difference_update(done)
+            in_flight.add(asyncio.ensure_future(embed_batch(batch)))
+
+        async def collect(doc: Dict[str, Any]) -> None:
+            nonlocal batch
+            batch.append(doc)
+            if len(batch) >= self.embed_batch_size:
+                await submit(batch)
+                batch = []
+
+        source_error: Optional[str] = None
+        try:
+            if isinstance(documents, AsyncIterable):
+                async for doc in documents:
+                    await collect(doc)
+            else:
+                for doc in documents:
+                    await collect(doc)
+        except Exception as e:
+            logger.error(f"Document source failed during bulk add: {e!r}")
+            source_error = repr(e)
+
+        if batch:
+            await submit(batch)
+        if in_flight:
+            await asyncio.gather(*in_flight)
+
+        # Persist once
+        self._save_vectors()
+        self.documents_journal.save_many(self.documents, added)
+
+        elapsed = time.perf_counter() - started
+        report: Dict[str, Any] = {
+            "added": len(added),
+            "failed": failed,
+            "tokens": tokens,
+            "elapsed_s": round(elapsed, 3),
+            "documents_per_s": round(len(added) / elapsed, 1) if elapsed > 0 else 0.0,
+            "tokens_per_s": round(tokens / elapsed, 1) if elapsed > 0 else 0.0,
+        }
+        if source_error:
+            report["error"] = source_error
+        logger.info(
+            f"Bulk-added {report['added']} documents ({report['failed']} failed): "
+            f"{report['documents_per_s']} docs/s, {report['tokens_per_s']} tokens/s"
+        )
+        return report
+
     async def add_document(
         self,
         doc_id: str,
@@ -113,7 +383,7 @@ class RAGEngine:
                 return False
 
             # Store vector
-            self.vectors[doc_id] = embedding
+            self.index.add(doc_id, embedding, project_id)
 
             # Store document
             self.documents[doc_id] = {
@@ -125,7 +395,7 @@ class RAGEngine:
 
             # Persist
             self._save_vectors()
-            self._save_documents()
+            self._save_documents(doc_id)
 
             logger.info(f"Added document {doc_id} to RAG index")
             return True
@@ -134,6 +404,71 @@ class RAGEngine:
             logger.error(f"Failed to add document: {e}")
             return False
 
+    async def add_attachment(
+        self,
+        attachment: Dict[str, Any],
+        chunker: Optional[Chunker] = None,
+        pdf_extractor: Optional[PDFExtractor] = None,
+    ) -> Dict[str, Any]:
+        """
+        Chunk a saved attachment and bulk-add the chunks
+
+        Chunks are produced lazily while earlier batches are being embedded.
+        Chunks left over from a previous ingestion of the same attachment
+        (e.g. with other chunk settings) are removed afterwards.
+
+        Args:
+            attachment: Metadata returned by AttachmentHandler.save_attachment
+            chunker: Overrides the engine's chunker
+            pdf_extractor: Streams PDF pages from worker processes (e.g. the
+                handler's); without one PDFs are chunked from `text_content`
+
+        Returns:
+            Ingestion report of add_documents, plus the number of chunks
+        """
+        project_id = attachment["project_id"]
+        previous = set(self._attachment_doc_ids(project_id, attachment["attachment_id"]))
+        chunk_ids: Set[str] = set()
+
+        async def chunks() -> AsyncIterable[Dict[str, Any]]:
+            async for doc in aiter_attachment_chunks(
+                attachment, chunker or self.chunker, pdf_extractor
+            ):
+                chunk_ids.add(doc["doc_id"])
+                yield doc
+
+        report = await self.add_documents(chunks(), project_id=project_id)
+        report["chunks"] = len(chunk_ids)
+
+        stale = previous - chunk_ids
+        if stale and "error" not in report:
+            self._delete_documents(stale)
+        return report
+
+    def _attachment_doc_ids(self, project_id: str, attachment_id: str) -> List[str]:
+        """Ids of the chunks of an attachment in a project (`<project_id>/<attachment_id>:<n>`)"""
+        prefix = attachment_doc_prefix(project_id, attachment_id)
+        return [doc_id for doc_id in self.documents if doc_id.startswith(prefix)]
+
+    def delete_attachment(self, project_id: str, attachment_id: str) -> int:
+        """Remove every chunk of an attachment from one project's index"""
+        return self._delete_documents(self._attachment_doc_ids(project_id, attachment_id))
+
+    def _delete_documents(self, doc_ids: Iterable[str]) -> int:
+        """Remove several documents and persist once"""
+        deleted = []
+        for doc_id in doc_ids:
+            if doc_id in self.index:
+                self.index.remove(doc_id)
+            if self.documents.pop(doc_id, None) is not None:
+                deleted.append(doc_id)
+
+        if deleted:
+            self._save_vectors()
+            self.documents_journal.save_many(self.documents, deleted)
+            logger.info(f"Deleted {len(deleted)} documents")
+        return len(deleted)
+
     def cosine_similarity(self, vec1: List[float], vec2: List[float]) -> float:
         """Calculate cosine similarity between two vectors"""
         vec1 = np.array(vec1)
@@ -175,33 +510,28 @@ class RAGEngine:
             if not query_embedding:
                 return []
 
-            # Calculate similarities
-            results = []
-
-            for doc_id, doc_embedding in self.vectors.items():
-                # Filter by project if specified
-                if project_id:
-                    doc_project = self.documents[doc_id].get("project_id")
-                    if doc_project != project_id:
-                        continue
-
-                # Calculate similarity
-                similarity = self.cosine_similarity(query_embedding, doc_embedding)
-
-                if similarity >= min_similarity:
-                    results.append(
-                        {
-                            "doc_id": doc_id,
-                            "similarity": float(similarity),
-                            "content": self.documents[doc_id]["content"],
-                            "metadata": self.documents[doc_id]["metadata"],
-                            "project_id": self.documents[doc_id].get("project_id"),
-                        }
-                    )
-
-            # Sort by similarity and return top_k
-            results.sort(key=lambda x: x["similarity"], reverse=True)
-            return results[:top_k]
+            self.refresh()
+
+            # One matrix-vector product over all documents, or the probed IVF lists
+            # (project mask + top-k inside)
+            started = time.perf_counter()
+            matches = self.index.search(
+                query_embedding, top_k=top_k, project_id=project_id, min_similarity=min_similarity
+            )
+            RAG_SEARCH.labels().observe(time.perf_counter() - started)
+
+            return [
+                {
+                    "doc_id": doc_id,
+                    "similarity": similarity,
+                    "content": self.documents[doc_id]["content"],
+                    "metadata": self.documents[doc_id]["metadata"],
+                    "project_id": self.documents[doc_id].get("project_id"),
+                }
+                for doc_id, similarity in matches
+                # A read-only engine may see vectors before their documents
+                if doc_id in self.documents
+            ]
 
         except Exception as e:
             logger.error(f"Search failed: {e}")
@@ -248,11 +578,11 @@ class RAGEngine:
     def delete_document(self, doc_id: str) -> bool:
         """Remove a document from the index"""
         try:
-            if doc_id in self.vectors:
-                del self.vectors[doc_id]
+            if doc_id in self.index:
+                self.index.remove(doc_id)
                 del self.documents[doc_id]
                 self._save_vectors()
-                self._save_documents()
+                self._save_documents(doc_id)
                 logger.info(f"Deleted document {doc_id}")
                 return True
             return False
@@ -275,6 +605,7 @@ class RAGEngine:
 
     def get_stats(self) -> Dict[str, Any]:
         """Get RAG engine statistics"""
+        self.refresh()
         projects = set(
             doc.get("project_id") for doc in self.documents.values() if doc.get("project_id")
         )
@@ -285,6 +616,8 @@ class RAGEngine:
             "embedding_model": self.embedding_model,
             "storage_path": str(self.storage_path),
             "storage_size_mb": self._get_storage_size(),
+            "embedding_cache": self.embedding_cache.get_stats(),
+            "ann_index": self.index.ann.get_stats(self.index.used_rows) if self.index.ann else None,
         }
 
     def _get_storage_size(self) -> float:
@@ -0,0 +1,265 @@
+"""
+Model residency manager
+Keeps the models most likely to be routed to next loaded in Ollama, within a memory budget
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+from backends import BackendPool
+from model_load import ModelLoadTracker
+
+logger = logging.getLogger(__name__)
+
+# Defaults used when config.json has no "residency" section (preloading uses memory: opt-in)
+DEFAULT_RESIDENCY_SETTINGS: Dict[str, Any] = {
+    "enabled": False,
+    "interval": 15.0,
+    "max_resident_models": 2,
+    "memory_budget_gb": None,
+    "keep_alive_s": 1800,
+    "history_half_life_s": 600.0,
+    "load_timeout_s": 300.0,
+}
+
+
+def get_residency_settings(config: Dict[str, Any]) -> Dict[str, Any]:
+    """Merge the "residency" section of config.json over the defaults"""
+    return {**DEFAULT_RESIDENCY_SETTINGS, **config.get("residency", {})}
+
+
+class ResidencyManager:
+    """
+    Background preloading of routed models
+
+    Every `interval` seconds the manager refreshes the resident set from
+    /api/ps and ranks the configured models by recent routing demand (an
+    exponentially decayed count with half-life `history_half_life_s`) plus
+    their static priority. The top `max_resident_models` that fit in
+    `memory_budget_bytes` (sizes learned from /api/ps) form the target set:
+    idle resident models outside it are unloaded when the budget would be
+    exceeded, missing ones are loaded with an empty /api/generate call and a
+    `keep_alive`, and resident targets are touched again before their
+    keep-alive expires. Models that are not in the routing config (e.g. the
+    embedding model) are left alone. With several Ollama backends a model is
+    preloaded where the backend pool would send its next call and unloaded
+    from every backend holding it.
+    """
+
+    def __init__(
+        self,
+        tracker: ModelLoadTracker,
+        models: Dict[str, Dict[str, Any]],
+        max_resident_models: int = 2,
+        memory_budget_bytes: Optional[int] = None,
+        keep_alive_s: int = 1800,
+        interval: float = 15.0,
+        history_half_life_s: float = 600.0,
+        load_timeout_s: float = 300.0,
+    ) -> None:
+        self.tracker = tracker
+        self.models = models
+        self.max_resident_models = max(1, max_resident_models)
+        self.memory_budget_bytes = memory_budget_bytes
+        self.keep_alive_s = keep_alive_s
+        self.interval = interval
+        self.history_half_life_s = history_half_life_s
+        # Loading a large model from disk can take minutes, but a stuck call
+        # must not stall the residency loop forever
+        self.load_timeout_s = load_timeout_s
+
+        # model -> (decayed routing count, time of last update)
+        self._demand: Dict[str, Tuple[float, float]] = {}
+        # model -> size in bytes as last reported by /api/ps
+        self.sizes: Dict[str, int] = {}
+        # model -> when the manager last loaded or touched it
+        self._touched: Dict[str, float] = {}
+        self.target: List[str] = []
+
+        self.preloads = 0
+        self.preload_failures = 0
+        self.touches = 0
+        self.unloads = 0
+        self.routed_cold = 0
+        self.routed_warm = 0
+
+    @classmethod
+    def from_settings(
+        cls, tracker: ModelLoadTracker, models: Dict[str, Dict[str, Any]], settings: Dict[str, Any]
+    ) -> "ResidencyManager":
+        budget_gb = settings["memory_budget_gb"]
+        return cls(
+            tracker,
+            models,
+            max_resident_models=settings["max_resident_models"],
+            memory_budget_bytes=int(budget_gb * 1024**3) if budget_gb else None,
+            keep_alive_s=settings["keep_alive_s"],
+            interval=settings["interval"],
+            history_half_life_s=settings["history_half_life_s"],
+            load_timeout_s=settings["load_timeout_s"],
+        )
+
+    def _decayed(self, model: str, now: float) -> float:
+        count, updated = self._demand.get(model, (0.0, now))
+        return float(count * 0.5 ** ((now - updated) / self.history_half_life_s))
+
+    def record_route(self, model: str) -> None:
+        """Count a routing decision towards the model's demand"""
+        now = time.time()
+        self._demand[model] = (self._decayed(model, now) + 1.0, now)
+        if self.tracker.is_loaded(model):
+            self.routed_warm += 1
+        else:
+            self.routed_cold += 1
+
+    def rank(self, models: List[str]) -> List[str]:
+        """Most wanted first: demand dominates, priority (1 = highest) orders the rest"""
+        now = time.time()
+        return sorted(
+            models,
+            key=lambda name: self._decayed(name, now) + 1.0 / self.models[name]["priority"],
+            reverse=True,
+        )
+
+    def plan(self) -> List[str]:
+        """Models that should be resident, most wanted first"""
+        ranked = self.rank(list(self.models))
+        target: List[str] = []
+        used = 0
+        for model in ranked:
+            if len(target) >= self.max_resident_models:
+                break
+            size = self.sizes.get(model, 0)
+            if self.memory_budget_bytes is not None and used + size > self.memory_budget_bytes:
+                continue
+            target.append(model)
+            used += size
+        return target
+
+    def _over_budget(self, resident: List[str]) -> bool:
+        if len(resident) > self.max_resident_models:
+            return True
+        if self.memory_budget_bytes is None:
+            return False
+        return sum(self.sizes.get(model, 0) for model in resident) > self.memory_budget_bytes
+
+    async def _generate(
+        self, client: httpx.AsyncClient, ollama_url: str, model: str, keep_alive: int
+    ) -> Dict[str, Any]:
+        response = await client.post(
+            f"{ollama_url}/api/generate",
+            json={"model": model, "keep_alive": keep_alive, "stream": False},
+            timeout=self.load_timeout_s,
+        )
+        response.raise_for_status()
+        data: Dict[str, Any] = response.json()
+        return data
+
+    async def preload(self, client: httpx.AsyncClient, backends: BackendPool, model: str) -> None:
+        """Load (or keep loaded) a model with an empty generate call"""
+        # Keep it where it already is, else on the backend the next call would go to
+        entry = self.tracker.loaded.get(model, {})
+        ollama_url = (entry.get("backends") or [backends.pick(model).url])[0]
+        started = time.perf_counter()
+        try:
+            data = await self._generate(client, ollama_url, model, self.keep_alive_s)
+        except (httpx.HTTPError, ValueError) as e:
+            self.preload_failures += 1
+            logger.warning(f"Failed to preload {model}: {e}")
+            return
+        self._touched[model] = time.time()
+        if self.tracker.is_loaded(model):
+            self.touches += 1
+            return
+
+        load_s = (data.get("load_duration") or 0) / 1e9 or time.perf_counter() - started
+        self.tracker.record_load(model, load_s)
+        self.tracker.loaded.setdefault(model, {"backends": [ollama_url]})
+        self.preloads += 1
+        logger.info(f"Preloaded {model} on {ollama_url} in {load_s:.2f}s")
+
+    async def unload(self, client: httpx.AsyncClient, backends: BackendPool, model: str) -> None:
+        """Ask every backend holding the model to release it now"""
+        urls = self.tracker.loaded.get(model, {}).get("backends") or backends.urls
+        try:
+            for ollama_url in urls:
+                await self._generate(client, ollama_url, model, 0)
+        except (httpx.HTTPError, ValueError) as e:
+            logger.warning(f"Failed to unload {model}: {e}")
+            return
+        self.tracker.loaded.pop(model, None)
+        self._touched.pop(model, None)
+        self.unloads += 1
+        logger.info(f"Unloaded {model}")
+
+    def _idle(self, model: str) -> bool:
+        load = self.tracker.scheduler.load(model)
+        return load["active"] == 0 and load["queued"] == 0
+
+    async def tick(self, client: httpx.AsyncClient, backends: BackendPool) -> None:
+        """One residency pass: refresh, unload surplus, preload and touch targets"""
+        await self.tracker.refresh_loaded(client, backends)
+        for name, entry in self.tracker.loaded.items():
+            if entry.get("size"):
+                self.sizes[name] = int(entry["size"])
+
+        self.target = self.plan()
+        resident = self.rank([model for model in self.models if self.tracker.is_loaded(model)])
+
+        # Make room for missing targets, lowest-ranked idle models first
+        missing = [model for model in self.target if model not in resident]
+        for model in list(reversed(resident)):
+            if not self._over_budget(resident + missing):
+                break
+            if model not in self.target and self._idle(model):
+                await self.unload(client, backends, model)
+                resident.remove(model)
+
+        now = time.time()
+        # Touch before the keep-alive could run out between two passes
+        refresh_after = max(self.keep_alive_s - 2 * self.interval, self.interval)
+        for model in self.target:
+            if self.tracker.is_loaded(model):
+                if now - self._touched.get(model, 0.0) >= refresh_after:
+                    await self.preload(client, backends, model)
+            elif not self._over_budget(resident + [model]):
+                await self.preload(client, backends, model)
+                resident.append(model)
+
+    async def run(self, client: httpx.AsyncClient, backends: BackendPool) -> None:
+        """Run residency passes every `interval` seconds until cancelled"""
+        while True:
+            try:
+                await self.tick(client, backends)
+            except (httpx.HTTPError, ValueError) as e:
+                logger.debug(f"Residency pass failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Target and resident sets, preload activity and cold starts"""
+        now = time.time()
+        return {
+            "target": self.target,
+            "resident": sorted(self.tracker.loaded),
+            "max_resident_models": self.max_resident_models,
+            "memory_budget_bytes": self.memory_budget_bytes,
+            "preloads": self.preloads,
+            "preload_failures": self.preload_failures,
+            "touches": self.touches,
+            "unloads": self.unloads,
+            "routed_to_resident": self.routed_warm,
+            "routed_to_cold": self.routed_cold,
+            "cold_starts": dict(self.tracker.cold_starts),
+            "load_seconds": {
+                model: round(seconds, 3) for model, seconds in self.tracker.load_seconds.items()
+            },
+            "demand": {
+                model: round(self._decayed(model, now), 2)
+                for model in self._demand
+                if model in self.models
+            },
+        }
@@ -0,0 +1,216 @@
+"""
+Response cache for deterministic chat completions
+Memory LRU (byte budget) with an optional on-disk tier, keyed by a canonical request hash
+"""
+
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Request header that skips the cache (neither read nor written) for one request
+BYPASS_HEADER = "x-gateway-cache"
+BYPASS_VALUE = "bypass"
+
+# Defaults used when config.json has no "response_cache" section (the cache is opt-in)
+DEFAULT_CACHE_SETTINGS: Dict[str, Any] = {
+    "enabled": False,
+    "ttl_seconds": 3600,
+    "max_memory_mb": 32,
+    "disk_path": None,
+    "deterministic_only": True,
+}
+
+
+def is_deterministic(ollama_payload: Dict[str, Any]) -> bool:
+    """True for temperature 0 requests, whose completion does not vary between calls"""
+    return bool(ollama_payload.get("options", {}).get("temperature") == 0)
+
+
+def get_cache_settings(config: Dict[str, Any]) -> Dict[str, Any]:
+    """Merge the "response_cache" section of config.json over the defaults"""
+    return {**DEFAULT_CACHE_SETTINGS, **config.get("response_cache", {})}
+
+
+class ResponseCache:
+    """
+    Cache of finished completions
+
+    Keys are SHA-256 digests of the canonical JSON (sorted keys, no
+    whitespace) of the selected model, the messages and the generation
+    options, so requests that differ only in key order or formatting share an
+    entry. An entry holds the completion text and token counts, which is
+    enough to rebuild either a JSON response or an SSE replay. Entries expire
+    after `ttl_seconds`; the memory tier is an LRU bounded by
+    `max_memory_bytes`, and with a cache directory every entry is also written
+    to `<dir>/<2-char prefix>/<digest>.json` and survives restarts.
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: float = 3600,
+        max_memory_bytes: int = 32 * 1024 * 1024,
+        cache_dir: Optional[Path] = None,
+        deterministic_only: bool = True,
+    ) -> None:
+        self.ttl_seconds = ttl_seconds
+        self.max_memory_bytes = max_memory_bytes
+        self.deterministic_only = deterministic_only
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        if self.cache_dir:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+        # key -> (expires_at, entry, size in bytes)
+        self._memory: "OrderedDict[str, Tuple[float, Dict[str, Any], int]]" = OrderedDict()
+        self._memory_bytes = 0
+
+        self.hits = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.bypassed = 0
+
+    @classmethod
+    def from_settings(cls, settings: Dict[str, Any]) -> Optional["ResponseCache"]:
+        """Build the cache from merged settings, or None when it is disabled"""
+        if not settings["enabled"]:
+            return None
+        return cls(
+            ttl_seconds=settings["ttl_seconds"],
+            max_memory_bytes=int(settings["max_memory_mb"] * 1024 * 1024),
+            cache_dir=settings["disk_path"],
+            deterministic_only=settings["deterministic_only"],
+        )
+
+    def is_cacheable(self, ollama_payload: Dict[str, Any]) -> bool:
+        """Only temperature 0 requests are cached unless deterministic_only is off"""
+        if not self.deterministic_only:
+            return True
+        return is_deterministic(ollama_payload)
+
+    @staticmethod
+    def make_key(ollama_payload: Dict[str, Any]) -> str:
+        """Cache key of an Ollama /api/chat request (the stream flag is ignored)"""
+        canonical = json.dumps(
+            {
+                "model": ollama_payload["model"],
+                "messages": ollama_payload["messages"],
+                "options": ollama_payload.get("options", {}),
+            },
+            sort_keys=True,
+            separators=(",", ":"),
+            ensure_ascii=False,
+        )
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def _disk_path(self, key: str) -> Path:
+        assert self.cache_dir is not None
+        return self.cache_dir / key[:2] / f"{key}.json"
+
+    def _remember(self, key: str, expires_at: float, entry: Dict[str, Any], size: int) -> None:
+        if size > self.max_memory_bytes:
+            return
+        previous = self._memory.pop(key, None)
+        if previous is not None:
+            self._memory_bytes -= previous[2]
+        self._memory[key] = (expires_at, entry, size)
+        self._memory_bytes += size
+
+        # Evict least recently used entries beyond the byte budget
+        while self._memory_bytes > self.max_memory_bytes:
+            _, (_, _, evicted_size) = self._memory.popitem(last=False)
+            self._memory_bytes -= evicted_size
+
+    def _forget(self, key: str) -> None:
+        previous = self._memory.pop(key, None)
+        if previous is not None:
+            self._memory_bytes -= previous[2]
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Return a fresh cached entry or None
+
+        Returns:
+            {"content", "prompt_eval_count", "eval_count", "created", "age_s"}
+        """
+        now = time.time()
+
+        cached = self._memory.get(key)
+        if cached is not None:
+            expires_at, entry, _ = cached
+            if expires_at > now:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                self.memory_hits += 1
+                return {**entry, "age_s": round(now - entry["created"], 3)}
+            self._forget(key)
+
+        if self.cache_dir is not None:
+            path = self._disk_path(key)
+            try:
+                raw = path.read_bytes()
+                record = json.loads(raw)
+            except (FileNotFoundError, OSError, ValueError):
+                record = None
+
+            if record is not None:
+                if record["expires_at"] > now:
+                    self._remember(key, record["expires_at"], record["entry"], len(raw))
+                    self.hits += 1
+                    self.disk_hits += 1
+                    entry = record["entry"]
+                    return {**entry, "age_s": round(now - entry["created"], 3)}
+                try:
+                    path.unlink()
+                except OSError:
+                    pass
+
+        self.misses += 1
+        return None
+
+    def put(self, key: str, content: str, prompt_eval_count: int = 0, eval_count: int = 0) -> None:
+        """Store a finished completion in memory and, if configured, on disk"""
+        now = time.time()
+        entry = {
+            "content": content,
+            "prompt_eval_count": prompt_eval_count,
+            "eval_count": eval_count,
+            "created": now,
+        }
+        expires_at = now + self.ttl_seconds
+        raw = json.dumps({"expires_at": expires_at, "entry": entry}).encode("utf-8")
+        self._remember(key, expires_at, entry, len(raw))
+
+        if self.cache_dir is not None:
+            path = self._disk_path(key)
+            try:
+                path.parent.mkdir(exist_ok=True)
+                # Per-process name: workers may store the same key at once
+                tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+                tmp_path.write_bytes(raw)
+                os.replace(tmp_path, path)
+            except OSError as e:
+                logger.warning(f"Failed to write response cache entry: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and memory usage"""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "bypassed": self.bypassed,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "memory_entries": len(self._memory),
+            "memory_bytes": self._memory_bytes,
+            "max_memory_bytes": self.max_memory_bytes,
+            "ttl_seconds": self.ttl_seconds,
+            "disk_enabled": self.cache_dir is not None,
+        }
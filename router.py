@@ -4,7 +4,13 @@ Routes prompts to the best local model based on content analysis
 """
 
 import json
-from typing import Any, Dict, Optional
+import re
+from typing import Any, Dict, FrozenSet, List, Optional, Pattern, Set, Tuple
+
+from model_load import ModelLoadTracker, get_routing_settings
+
+# Word tokens of a lowercased prompt (Unicode-aware, so "français" is one word)
+_WORD_RE = re.compile(r"\w+")
 
 
 class IntelligentRouter:
@@ -14,6 +20,59 @@ class IntelligentRouter:
 
         self.models = self.config["models"]
         self.default_model = self.config["default_model"]
+        self.routing = get_routing_settings(self.config)
+
+        # Live load signals, attached by the gateway once its scheduler exists
+        self.load_tracker: Optional[ModelLoadTracker] = None
+
+        self._compile_tags()
+
+    def _compile_tags(self) -> None:
+        """
+        Index every model tag once at load time
+
+        Plain word tags are looked up in the set of words produced by a single
+        tokenizing pass over the prompt; the few tags containing punctuation or
+        spaces ("c++") go into one combined word-boundary regex. Either way tags
+        only match whole words ("go" does not match "good", "api" does not match
+        "capital") and the cost no longer grows with models x tags.
+        """
+        # tag -> [(model_name, weight, position in the model's tag list)]
+        self._tag_index: Dict[str, List[Tuple[str, int, int]]] = {}
+
+        for model_name, model_info in self.models.items():
+            weights: Dict[str, int] = {}
+            positions: Dict[str, int] = {}
+            for position, tag in enumerate(model_info["tags"]):
+                tag = tag.lower()
+                # A tag listed twice counts twice, as before
+                weights[tag] = weights.get(tag, 0) + 1
+                positions.setdefault(tag, position)
+
+            for tag, weight in weights.items():
+                self._tag_index.setdefault(tag, []).append((model_name, weight, positions[tag]))
+
+        self._word_tags: FrozenSet[str] = frozenset(
+            tag for tag in self._tag_index if _WORD_RE.fullmatch(tag)
+        )
+        phrase_tags = [tag for tag in self._tag_index if tag not in self._word_tags]
+
+        self._phrase_pattern: Optional[Pattern[str]] = None
+        if phrase_tags:
+            # Longest first so "c++" is tried before any shorter tag sharing its prefix
+            alternation = "|".join(
+                re.escape(tag) for tag in sorted(phrase_tags, key=len, reverse=True)
+            )
+            self._phrase_pattern = re.compile(rf"(?<!\w)(?:{alternation})(?!\w)")
+
+    def _match_tags(self, prompt: str) -> Set[str]:
+        """Return the distinct configured tags present in the prompt as whole words"""
+        prompt_lower = prompt.lower()
+        matched = set(_WORD_RE.findall(prompt_lower))
+        matched &= self._word_tags
+        if self._phrase_pattern is not None:
+            matched.update(self._phrase_pattern.findall(prompt_lower))
+        return matched
 
     def route(self, prompt: str, user_model: Optional[str] = None) -> tuple[str, str]:
         """
@@ -26,26 +85,23 @@ class IntelligentRouter:
         if user_model and user_model in self.models:
             return user_model, "User preference"
 
-        prompt_lower = prompt.lower()
+        tag_scores: Dict[str, int] = {}
+        matched_tags: Dict[str, List[Tuple[int, str]]] = {}
+        for tag in self._match_tags(prompt):
+            for model_name, weight, position in self._tag_index[tag]:
+                tag_scores[model_name] = tag_scores.get(model_name, 0) + 10 * weight
+                matched_tags.setdefault(model_name, []).append((position, tag))
 
         # Score each model based on tag matches
         scores = {}
         for model_name, model_info in self.models.items():
-            score = 0
-            matched_tags = []
-
-            for tag in model_info["tags"]:
-                if tag.lower() in prompt_lower:
-                    score += 10
-                    matched_tags.append(tag)
-
             # Bonus for high priority models
-            score += 4 - model_info["priority"]
+            score = tag_scores.get(model_name, 0) + 4 - model_info["priority"]
 
             if score > 0:
                 scores[model_name] = {
                     "score": score,
-                    "tags": matched_tags,
+                    "tags": [tag for _, tag in sorted(matched_tags.get(model_name, []))],
                     "role": model_info["role"],
                 }
 
@@ -53,8 +109,10 @@ class IntelligentRouter:
         if scores:
             best_model = max(scores.items(), key=lambda x: x[1]["score"])
             model_name = best_model[0]
-            matched = ", ".join(best_model[1]["tags"][:3])
-            reason = f"Best for {best_model[1]['role']} " f"(matched: {matched})"
+            reason = self._best_for(best_model[1])
+
+            if self.load_tracker is not None and self.routing["load_aware"]:
+                return self._pick_least_loaded(scores, model_name, reason)
             return model_name, reason
 
         # Long prompts (>4000 chars) -> use reasoning model
@@ -68,6 +126,42 @@ class IntelligentRouter:
         # Default
         return self.default_model, "Default general model"
 
+    @staticmethod
+    def _best_for(info: Dict[str, Any]) -> str:
+        """Reason for a tag-scored choice; the matched tags are listed when there are any"""
+        if not info["tags"]:
+            return f"Best for {info['role']}"
+        return f"Best for {info['role']} (matched: {', '.join(info['tags'][:3])})"
+
+    def _pick_least_loaded(
+        self, scores: Dict[str, Dict[str, Any]], best_model: str, reason: str
+    ) -> Tuple[str, str]:
+        """
+        Among models scoring within `score_margin` of the best, pick the lowest expected latency
+
+        The tag-based choice is kept unless another candidate is strictly faster.
+        """
+        assert self.load_tracker is not None
+        threshold = scores[best_model]["score"] - self.routing["score_margin"]
+        candidates = [name for name, info in scores.items() if info["score"] >= threshold]
+        if len(candidates) < 2:
+            return best_model, reason
+
+        estimates = {name: self.load_tracker.estimate(name) for name in candidates}
+        fastest = min(candidates, key=lambda name: estimates[name]["expected_s"])
+        if estimates[fastest]["expected_s"] >= estimates[best_model]["expected_s"]:
+            fastest = best_model
+
+        load = estimates[fastest]
+        speed = f"{load['tokens_per_s']} tok/s" if load["measured"] else "speed not measured yet"
+        reason = (
+            f"{self._best_for(scores[fastest])}; "
+            f"lowest expected latency of {len(candidates)} candidates "
+            f"(~{load['expected_s']}s: {load['in_flight']} in flight, {load['queued']} queued, "
+            f"{speed}, {'loaded' if load['loaded'] else 'not loaded'})"
+        )
+        return fastest, reason
+
     def get_available_models(self) -> Dict[str, Any]:
         """Returns list of configured models"""
         return {
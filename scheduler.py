@@ -0,0 +1,283 @@
+"""
+Per-model admission control
+Bounded concurrency in front of Ollama with priority wait queues and fast rejection when full
+"""
+
+import asyncio
+import logging
+import math
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Type
+
+logger = logging.getLogger(__name__)
+
+# Priority classes, highest first; the class is chosen per request by a header
+PRIORITIES = ("interactive", "batch")
+
+# Defaults used when config.json has no "scheduler" section
+DEFAULT_SCHEDULER_SETTINGS: Dict[str, Any] = {
+    "enabled": True,
+    "default_max_concurrency": 2,
+    "max_queue": 32,
+    "queue_timeout": 120.0,
+    "priority_header": "x-gateway-priority",
+    "default_priority": "interactive",
+}
+
+# Service time assumed for Retry-After before a model has completed any request
+_DEFAULT_SERVICE_S = 5.0
+_EWMA_ALPHA = 0.2
+
+
+def get_scheduler_settings(config: Dict[str, Any], workers: int = 1) -> Dict[str, Any]:
+    """
+    Merge the "scheduler" section of config.json over the defaults
+
+    Per-model `max_concurrency` / `max_queue` are read from the entries of the
+    "models" section and returned under "models". Limits are for the whole
+    gateway: with several worker processes each one gets its share (rounded up).
+    """
+    settings = {**DEFAULT_SCHEDULER_SETTINGS, **config.get("scheduler", {})}
+    settings["models"] = {
+        name: {key: model[key] for key in ("max_concurrency", "max_queue") if key in model}
+        for name, model in config.get("models", {}).items()
+    }
+    if workers > 1:
+        for limits in [settings, *settings["models"].values()]:
+            for key in ("default_max_concurrency", "max_concurrency", "max_queue"):
+                if key in limits:
+                    limits[key] = math.ceil(limits[key] / workers)
+    return settings
+
+
+class AdmissionRejected(Exception):
+    """The model's wait queue is full or the wait timed out; retry after `retry_after` seconds"""
+
+    def __init__(self, model: str, reason: str, retry_after: int) -> None:
+        super().__init__(f"{model}: {reason}")
+        self.model = model
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class Slot:
+    """
+    A granted upstream slot for one model
+
+    Release it exactly once when the upstream call is over (`release()` is
+    idempotent, and the slot is also an async context manager).
+    """
+
+    def __init__(self, queue: "_ModelQueue", wait_s: float) -> None:
+        self._queue = queue
+        self.model = queue.model
+        self.wait_s = wait_s
+        self._started = time.perf_counter()
+        self._released = False
+
+    def release(self) -> None:
+        if self._released:
+            return
+        self._released = True
+        self._queue.release(time.perf_counter() - self._started)
+
+    async def __aenter__(self) -> "Slot":
+        return self
+
+    async def __aexit__(self, exc_type: Optional[Type[BaseException]], *_: Any) -> None:
+        self.release()
+
+
+class _ModelQueue:
+    """Concurrency counter and per-priority FIFO of waiters for one model"""
+
+    def __init__(self, model: str, max_concurrency: int, max_queue: int) -> None:
+        self.model = model
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.active = 0
+        self.waiting: Dict[str, Deque["asyncio.Future[None]"]] = {p: deque() for p in PRIORITIES}
+
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.wait_total_s = 0.0
+        self.wait_max_s = 0.0
+        self.service_ewma_s: Optional[float] = None
+
+    @property
+    def queued(self) -> int:
+        return sum(len(waiters) for waiters in self.waiting.values())
+
+    def retry_after(self) -> int:
+        """Seconds until a new request would likely be admitted"""
+        service_s = self.service_ewma_s if self.service_ewma_s is not None else _DEFAULT_SERVICE_S
+        return max(1, math.ceil((self.queued + 1) * service_s / max(1, self.max_concurrency)))
+
+    def record_wait(self, wait_s: float) -> None:
+        self.admitted += 1
+        self.wait_total_s += wait_s
+        self.wait_max_s = max(self.wait_max_s, wait_s)
+
+    def hand_off(self) -> None:
+        """Pass a freed slot to the next waiter (highest priority first) or give it back"""
+        for priority in PRIORITIES:
+            waiters = self.waiting[priority]
+            while waiters:
+                waiter = waiters.popleft()
+                if not waiter.done():
+                    waiter.set_result(None)
+                    return
+        self.active -= 1
+
+    def release(self, service_s: float) -> None:
+        if self.service_ewma_s is None:
+            self.service_ewma_s = service_s
+        else:
+            self.service_ewma_s += _EWMA_ALPHA * (service_s - self.service_ewma_s)
+        self.hand_off()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "active": self.active,
+            "queued": {priority: len(self.waiting[priority]) for priority in PRIORITIES},
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "avg_wait_ms": (
+                round(self.wait_total_s / self.admitted * 1000, 1) if self.admitted else 0.0
+            ),
+            "max_wait_ms": round(self.wait_max_s * 1000, 1),
+            "avg_service_s": (
+                round(self.service_ewma_s, 3) if self.service_ewma_s is not None else None
+            ),
+        }
+
+
+class AdmissionScheduler:
+    """
+    Admits upstream calls per model
+
+    Each model runs at most `max_concurrency` calls at once; further callers
+    wait in a FIFO per priority class, and a freed slot always goes to the
+    oldest waiter of the highest non-empty class (batch work only runs when
+    no interactive request is waiting). Each class queue holds at most
+    `max_queue` waiters: beyond that, and for waits longer than
+    `queue_timeout`, `AdmissionRejected` is raised with a Retry-After
+    estimate so clients back off instead of piling up. When disabled, calls
+    are admitted immediately but still counted.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = True,
+        default_max_concurrency: int = 2,
+        max_queue: int = 32,
+        queue_timeout: float = 120.0,
+        model_limits: Optional[Dict[str, Dict[str, int]]] = None,
+    ) -> None:
+        self.enabled = enabled
+        self.default_max_concurrency = max(1, default_max_concurrency)
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.model_limits = model_limits or {}
+        self._queues: Dict[str, _ModelQueue] = {}
+
+    @classmethod
+    def from_settings(cls, settings: Dict[str, Any]) -> "AdmissionScheduler":
+        return cls(
+            enabled=settings["enabled"],
+            default_max_concurrency=settings["default_max_concurrency"],
+            max_queue=settings["max_queue"],
+            queue_timeout=settings["queue_timeout"],
+            model_limits=settings["models"],
+        )
+
+    def _max_concurrency(self, model: str) -> int:
+        limits = self.model_limits.get(model, {})
+        return max(1, limits.get("max_concurrency", self.default_max_concurrency))
+
+    def _queue(self, model: str) -> _ModelQueue:
+        queue = self._queues.get(model)
+        if queue is None:
+            queue = _ModelQueue(
+                model,
+                self._max_concurrency(model),
+                self.model_limits.get(model, {}).get("max_queue", self.max_queue),
+            )
+            self._queues[model] = queue
+        return queue
+
+    def load(self, model: str) -> Dict[str, int]:
+        """
+        Running and waiting upstream calls for a model, and its concurrency limit
+
+        Read-only: a model that was never admitted reports its configured
+        limit without getting a queue (routing estimates every candidate).
+        """
+        queue = self._queues.get(model)
+        if queue is None:
+            return {"active": 0, "queued": 0, "max_concurrency": self._max_concurrency(model)}
+        return {
+            "active": queue.active,
+            "queued": queue.queued,
+            "max_concurrency": queue.max_concurrency,
+        }
+
+    def models(self) -> List[str]:
+        """Models the scheduler has seen so far"""
+        return list(self._queues)
+
+    async def acquire(self, model: str, priority: str = "interactive") -> Slot:
+        """
+        Wait for an upstream slot for `model`
+
+        Raises:
+            ValueError: unknown priority class
+            AdmissionRejected: the queue is full or the wait timed out
+        """
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown priority {priority!r} (expected one of {PRIORITIES})")
+        queue = self._queue(model)
+
+        if not self.enabled or (queue.active < queue.max_concurrency and queue.queued == 0):
+            queue.active += 1
+            queue.record_wait(0.0)
+            return Slot(queue, 0.0)
+
+        waiters = queue.waiting[priority]
+        if len(waiters) >= queue.max_queue:
+            queue.rejected += 1
+            raise AdmissionRejected(model, f"{priority} queue full", queue.retry_after())
+
+        waiter: "asyncio.Future[None]" = asyncio.get_running_loop().create_future()
+        waiters.append(waiter)
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(waiter, self.queue_timeout)
+        except BaseException as e:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as this caller gave up
+                queue.hand_off()
+            elif waiter in waiters:
+                waiters.remove(waiter)
+            if isinstance(e, asyncio.TimeoutError):
+                queue.timed_out += 1
+                raise AdmissionRejected(model, "queue wait timed out", queue.retry_after())
+            raise
+
+        wait_s = time.perf_counter() - started
+        queue.record_wait(wait_s)
+        return Slot(queue, wait_s)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Per-model concurrency, queue depth and wait times"""
+        return {
+            "enabled": self.enabled,
+            "default_max_concurrency": self.default_max_concurrency,
+            "queue_timeout": self.queue_timeout,
+            "models": {model: queue.get_stats() for model, queue in self._queues.items()},
+        }
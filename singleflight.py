@@ -0,0 +1,235 @@
+"""
+Single-flight request coalescing
+Identical in-flight upstream calls share one execution; streams are fanned out to every caller
+"""
+
+import asyncio
+import logging
+from functools import partial
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Defaults used when config.json has no "coalescing" section
+DEFAULT_COALESCING_SETTINGS: Dict[str, Any] = {
+    "enabled": True,
+    "deterministic_only": True,
+}
+
+
+def get_coalescing_settings(config: Dict[str, Any]) -> Dict[str, Any]:
+    """Merge the "coalescing" section of config.json over the defaults"""
+    return {**DEFAULT_COALESCING_SETTINGS, **config.get("coalescing", {})}
+
+
+class _Call:
+    """One shared upstream call and the number of callers still waiting for it"""
+
+    def __init__(self, task: "asyncio.Future[Any]") -> None:
+        self.task = task
+        self.waiters = 0
+
+
+class _Broadcast:
+    """
+    One upstream stream replayed to any number of subscribers
+
+    Items are buffered for the lifetime of the stream, so a subscriber that
+    joins late still receives everything from the first item.
+    """
+
+    def __init__(self) -> None:
+        self.items: List[Any] = []
+        self.finished = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self.opened: "asyncio.Future[None]" = asyncio.get_running_loop().create_future()
+        self.pump: Optional["asyncio.Task[None]"] = None
+        self._changed = asyncio.Event()
+
+    def _notify(self) -> None:
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    async def run(self, open_stream: Callable[[], Awaitable[AsyncIterator[Any]]]) -> None:
+        """Open the upstream stream and buffer its items (the pump task)"""
+        try:
+            source = await open_stream()
+        except asyncio.CancelledError:
+            # Every subscriber left before the upstream answered
+            self.opened.cancel()
+            self.finished = True
+            raise
+        except BaseException as e:
+            self.opened.set_exception(e)
+            self.finished = True
+            # Retrieved here so an error nobody awaits is not logged as unhandled
+            self.opened.exception()
+            raise
+        self.opened.set_result(None)
+
+        try:
+            async for item in source:
+                self.items.append(item)
+                self._notify()
+        except asyncio.CancelledError:
+            self.error = ConnectionError("Shared upstream stream was cancelled")
+            raise
+        except Exception as e:
+            self.error = e
+        finally:
+            aclose = getattr(source, "aclose", None)
+            if aclose is not None:
+                await aclose()
+            self.finished = True
+            self._notify()
+
+    async def iterate(self, release: Callable[[], None]) -> AsyncIterator[Any]:
+        """Yield every item from the start, waiting for new ones until the stream ends"""
+        position = 0
+        try:
+            while True:
+                if position < len(self.items):
+                    item = self.items[position]
+                    position += 1
+                    yield item
+                    continue
+                if self.finished:
+                    if self.error is not None:
+                        raise self.error
+                    return
+                await self._changed.wait()
+        finally:
+            release()
+
+
+class Subscription:
+    """
+    A caller's view of a shared stream
+
+    Iterate it once; `release()` (idempotent, also called when iteration ends)
+    drops the caller's interest so the upstream call is cancelled once nobody
+    is left listening.
+    """
+
+    def __init__(self, flight: "SingleFlight", key: str, broadcast: _Broadcast) -> None:
+        self._flight = flight
+        self._key = key
+        self._broadcast = broadcast
+        self._released = False
+
+    def __aiter__(self) -> AsyncIterator[Any]:
+        return self._broadcast.iterate(self.release)
+
+    def release(self) -> None:
+        if self._released:
+            return
+        self._released = True
+        self._flight._leave_stream(self._key, self._broadcast)
+
+
+class SingleFlight:
+    """
+    Deduplicates identical concurrent upstream calls
+
+    The first caller for a key starts the call as a separate task; callers
+    arriving while it runs await the same task (`do`) or subscribe to the same
+    stream (`stream`). Because the upstream call is not owned by any single
+    request, one client disconnecting does not fail the others; the call is
+    cancelled only when every caller has gone. Keys are forgotten as soon as
+    the call completes, so nothing is cached here.
+    """
+
+    def __init__(self) -> None:
+        self._calls: Dict[str, _Call] = {}
+        self._streams: Dict[str, _Broadcast] = {}
+
+        self.leaders = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> Tuple[T, bool]:
+        """
+        Run `fn` once for all concurrent callers with the same key
+
+        Returns:
+            (result, shared) where shared is True for callers that joined an
+            existing call; exceptions are raised to every caller
+        """
+        call = self._calls.get(key)
+        shared = call is not None
+        if call is None:
+            call = _Call(asyncio.ensure_future(fn()))
+            self._calls[key] = call
+            call.task.add_done_callback(partial(self._forget_call, key, call))
+            self.leaders += 1
+        else:
+            self.coalesced += 1
+
+        call.waiters += 1
+        try:
+            result: T = await asyncio.shield(call.task)
+            return result, shared
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                call.task.cancel()
+
+    def _forget_call(self, key: str, call: _Call, _: "asyncio.Future[Any]") -> None:
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+    async def stream(
+        self, key: str, open_stream: Callable[[], Awaitable[AsyncIterator[Any]]]
+    ) -> Tuple[Subscription, bool]:
+        """
+        Subscribe to the stream for a key, opening it if no caller has yet
+
+        `open_stream` should return once the upstream has accepted the request
+        (e.g. response headers received), so errors at that point are raised
+        here to every caller rather than in the middle of the stream.
+
+        Returns:
+            (subscription, shared)
+        """
+        broadcast = self._streams.get(key)
+        shared = broadcast is not None
+        if broadcast is None:
+            broadcast = _Broadcast()
+            self._streams[key] = broadcast
+            broadcast.pump = asyncio.ensure_future(broadcast.run(open_stream))
+            broadcast.pump.add_done_callback(partial(self._forget_stream, key, broadcast))
+            self.leaders += 1
+        else:
+            self.coalesced += 1
+
+        broadcast.subscribers += 1
+        subscription = Subscription(self, key, broadcast)
+        try:
+            await asyncio.shield(broadcast.opened)
+        except BaseException:
+            subscription.release()
+            raise
+        return subscription, shared
+
+    def _leave_stream(self, key: str, broadcast: _Broadcast) -> None:
+        broadcast.subscribers -= 1
+        if broadcast.subscribers == 0 and broadcast.pump is not None and not broadcast.pump.done():
+            broadcast.pump.cancel()
+
+    def _forget_stream(self, key: str, broadcast: _Broadcast, _: "asyncio.Future[Any]") -> None:
+        if self._streams.get(key) is broadcast:
+            del self._streams[key]
+        # Collect the pump's outcome so a failure nobody awaited is not reported as unhandled
+        if broadcast.pump is not None and not broadcast.pump.cancelled():
+            broadcast.pump.exception()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Coalescing counters and calls currently in flight"""
+        return {
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+            "in_flight_calls": len(self._calls),
+            "in_flight_streams": len(self._streams),
+        }
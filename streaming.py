@@ -0,0 +1,157 @@
+"""
+Streaming helpers for the Ollama → OpenAI SSE translation
+Incremental NDJSON decoding and prebuilt chat.completion.chunk templates
+"""
+
+import json
+import logging
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+try:  # Optional fast JSON library
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None  # type: ignore[assignment]
+
+logger = logging.getLogger(__name__)
+
+SSE_DONE = b"data: [DONE]\n\n"
+
+
+def json_loads(data: Any) -> Any:
+    """Parse JSON from bytes/bytearray/memoryview (orjson when installed)"""
+    if orjson is not None:
+        return orjson.loads(data)
+    if isinstance(data, memoryview):
+        data = data.tobytes()
+    return json.loads(data)
+
+
+def json_dumps(obj: Any) -> bytes:
+    """Serialize to compact UTF-8 JSON bytes (orjson when installed)"""
+    if orjson is not None:
+        dumped: bytes = orjson.dumps(obj)
+        return dumped
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+class NDJSONDecoder:
+    """
+    Incremental newline-delimited JSON decoder
+
+    Bytes are accumulated in a single bytearray and split on b"\\n" without
+    decoding first. A newline byte never occurs inside a multi-byte UTF-8
+    sequence, so every complete line is valid UTF-8 even when a character
+    was split across network chunks. Already-scanned bytes are never
+    searched again, so the cost is linear in the stream size.
+    """
+
+    def __init__(self) -> None:
+        self._buffer = bytearray()
+        self._scan_from = 0  # Bytes before this offset contain no newline
+
+    def feed(self, chunk: bytes) -> List[Any]:
+        """Add a chunk and return every JSON object completed by it"""
+        buffer = self._buffer
+        buffer += chunk
+
+        objects: List[Any] = []
+        line_start = 0
+        newline = buffer.find(b"\n", self._scan_from)
+
+        if newline == -1:
+            self._scan_from = len(buffer)
+            return objects
+
+        with memoryview(buffer) as view:
+            while newline != -1:
+                self._parse_line(view[line_start:newline], objects)
+                line_start = newline + 1
+                newline = buffer.find(b"\n", line_start)
+
+        # Drop consumed lines (the view must be released before resizing)
+        del buffer[:line_start]
+        self._scan_from = len(buffer)
+        return objects
+
+    def flush(self) -> List[Any]:
+        """Parse a trailing line that was not newline-terminated"""
+        objects: List[Any] = []
+        if self._buffer:
+            with memoryview(self._buffer) as view:
+                self._parse_line(view, objects)
+            self._buffer.clear()
+            self._scan_from = 0
+        return objects
+
+    @staticmethod
+    def _parse_line(line: memoryview, objects: List[Any]) -> None:
+        if not line:
+            return
+        try:
+            objects.append(json_loads(line))
+        except ValueError:  # json.JSONDecodeError and orjson.JSONDecodeError
+            if line.tobytes().strip():
+                logger.debug("Skipping malformed NDJSON line")
+
+
+async def aiter_ndjson(byte_stream: AsyncIterator[bytes]) -> AsyncIterator[Dict[str, Any]]:
+    """Yield JSON objects from an async byte stream as soon as each line completes"""
+    decoder = NDJSONDecoder()
+    async for chunk in byte_stream:
+        for obj in decoder.feed(chunk):
+            yield obj
+    for obj in decoder.flush():
+        yield obj
+
+
+class ChatChunkTemplate:
+    """
+    Prebuilt OpenAI chat.completion.chunk SSE event
+
+    Everything except the delta content and finish_reason is serialized
+    once per stream; rendering a token is a single bytes join.
+    """
+
+    _FINISH_REASONS = {None: b"null", "stop": b'"stop"', "length": b'"length"'}
+
+    def __init__(
+        self, model: str, completion_id: Optional[str] = None, created: Optional[int] = None
+    ) -> None:
+        created = created if created is not None else int(time.time())
+        header = {
+            "id": completion_id or f"chatcmpl-{created}",
+            "object": "chat.completion.chunk",
+            "created": created,
+            "model": model,
+        }
+        # Reopen the serialized header object to append the choices array
+        self._header = b"data: " + json_dumps(header)[:-1]
+        self._prefix = self._header + b',"choices":[{"index":0,"delta":{"content":'
+
+    def render(self, content: str, finish_reason: Optional[str] = None) -> bytes:
+        """Render one SSE event for a content delta"""
+        finish = self._FINISH_REASONS.get(finish_reason)
+        if finish is None:
+            finish = json_dumps(finish_reason)
+        return b"".join(
+            (self._prefix, json_dumps(content), b'},"finish_reason":', finish, b"}]}\n\n")
+        )
+
+    def render_event(self, name: str, payload: Dict[str, Any]) -> bytes:
+        """
+        Render a chunk with an empty delta carrying gateway data under `name`
+
+        OpenAI clients ignore the extra field, so progress can be sent on the
+        same stream without producing visible content.
+        """
+        return b"".join(
+            (
+                self._header,
+                b',"choices":[{"index":0,"delta":{},"finish_reason":null}],"',
+                name.encode("utf-8"),
+                b'":',
+                json_dumps(payload),
+                b"}\n\n",
+            )
+        )
@@ -0,0 +1,9 @@
+"""
+Shared pytest setup
+The gateway modules live at the repository root; make them importable from tests/
+"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
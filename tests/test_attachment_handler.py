@@ -0,0 +1,39 @@
+"""Tests for attachment_handler.AttachmentHandler"""
+
+import asyncio
+from pathlib import Path
+
+from attachment_handler import AttachmentHandler
+
+CONTENT = b"shared notes\n"
+
+
+def test_blob_survives_delete_while_another_worker_references_it(tmp_path: Path) -> None:
+    # Two handlers over one directory stand for two gateway workers
+    first = AttachmentHandler(str(tmp_path))
+    second = AttachmentHandler(str(tmp_path))
+
+    saved = asyncio.run(first.save_attachment("notes.md", CONTENT, "alpha"))
+    assert saved is not None
+    assert asyncio.run(second.save_attachment("notes.md", CONTENT, "beta")) is not None
+    blob_path = Path(saved["file_path"])
+
+    assert first.delete_attachment("alpha", saved["attachment_id"])
+    assert blob_path.exists()
+
+    assert second.delete_attachment("beta", saved["attachment_id"])
+    assert not blob_path.exists()
+
+
+def test_reads_see_other_workers_changes(tmp_path: Path) -> None:
+    first = AttachmentHandler(str(tmp_path))
+    second = AttachmentHandler(str(tmp_path))
+
+    saved = asyncio.run(first.save_attachment("notes.md", CONTENT, "alpha"))
+    assert saved is not None
+    assert second.get_attachment("alpha", saved["attachment_id"]) is not None
+    assert second.get_stats()["total_attachments"] == 1
+
+    assert first.delete_project_attachments("alpha") == 1
+    assert second.list_attachments("alpha") == []
+    assert second.get_stats()["unique_blobs"] == 0
@@ -0,0 +1,110 @@
+"""Tests for backends.BackendPool"""
+
+import asyncio
+import json
+from pathlib import Path
+from typing import Dict, List
+
+import httpx
+import pytest
+
+from backends import BackendPool
+from rag_engine import RAGEngine
+
+UP = "http://up:11434"
+DOWN = "http://down:11434"
+
+
+class FakeOllama:
+    """Mock transport answering for several hosts; hosts in `down` refuse connections"""
+
+    def __init__(self, down: List[str], status: Dict[str, int]) -> None:
+        self.down = down
+        self.status = status
+        self.calls: List[str] = []
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        host = f"{request.url.scheme}://{request.url.host}:{request.url.port}"
+        self.calls.append(f"{host}{request.url.path}")
+        if host in self.down:
+            raise httpx.ConnectError("connection refused", request=request)
+        if request.url.path == "/api/tags":
+            return httpx.Response(200, json={"models": [{"name": "mistral:latest"}]})
+        if request.url.path == "/api/embed":
+            texts = json.loads(request.content)["input"]
+            return httpx.Response(200, json={"embeddings": [[1.0, 0.0] for _ in texts]})
+        return httpx.Response(self.status.get(host, 200), json={"host": host})
+
+
+def _client(fake: FakeOllama) -> httpx.AsyncClient:
+    return httpx.AsyncClient(transport=httpx.MockTransport(fake))
+
+
+def test_unreachable_backend_fails_over_and_is_ejected() -> None:
+    fake = FakeOllama(down=[DOWN], status={})
+    pool = BackendPool([DOWN, UP], unhealthy_after=1)
+
+    async def run() -> httpx.Response:
+        async with _client(fake) as client:
+            return await pool.post(client, "/api/chat", {"model": "mistral"})
+
+    response = asyncio.run(run())
+    assert response.json() == {"host": UP}
+    assert fake.calls == [f"{DOWN}/api/chat", f"{UP}/api/chat"]
+    assert pool.retries == 1
+    assert [backend.healthy for backend in pool.backends] == [False, True]
+    assert all(backend.outstanding == 0 for backend in pool.backends)
+
+
+def test_server_error_is_retried_on_next_backend() -> None:
+    fake = FakeOllama(down=[], status={DOWN: 500})
+    pool = BackendPool([DOWN, UP])
+
+    async def run() -> httpx.Response:
+        async with _client(fake) as client:
+            return await pool.post(client, "/api/chat", {"model": "mistral"})
+
+    assert asyncio.run(run()).json() == {"host": UP}
+
+
+def test_last_backend_error_is_raised() -> None:
+    fake = FakeOllama(down=[DOWN, UP], status={})
+    pool = BackendPool([DOWN, UP])
+
+    async def run() -> None:
+        async with _client(fake) as client:
+            await pool.post(client, "/api/chat", {"model": "mistral"})
+
+    with pytest.raises(httpx.ConnectError):
+        asyncio.run(run())
+    assert all(backend.outstanding == 0 for backend in pool.backends)
+
+
+def test_health_check_ejects_restores_and_learns_inventory() -> None:
+    fake = FakeOllama(down=[DOWN], status={})
+    pool = BackendPool([DOWN, UP], unhealthy_after=1)
+
+    async def run() -> None:
+        async with _client(fake) as client:
+            await pool.check_all(client)
+            assert [backend.healthy for backend in pool.backends] == [False, True]
+            assert pool.pick("mistral").url == UP
+
+            fake.down = []
+            await pool.check_all(client)
+
+    asyncio.run(run())
+    assert all(backend.healthy for backend in pool.backends)
+    assert pool.backends[0].serves("mistral:latest")
+    assert not pool.backends[0].serves("gemma2")
+
+
+def test_rag_embeddings_go_through_the_pool(tmp_path: Path) -> None:
+    fake = FakeOllama(down=[DOWN], status={})
+    pool = BackendPool([DOWN, UP])
+    engine = RAGEngine(storage_path=str(tmp_path / "rag"), http_client=_client(fake), backends=pool)
+
+    result = asyncio.run(engine.get_embeddings(["hello", "world"]))
+
+    assert result is not None and len(result[0]) == 2
+    assert fake.calls == [f"{DOWN}/api/embed", f"{UP}/api/embed"]
@@ -0,0 +1,49 @@
+"""Tests for chunker.aiter_attachment_chunks"""
+
+import asyncio
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+import pytest
+
+import chunker
+from chunker import Chunker, aiter_attachment_chunks, iter_attachment_chunks
+
+
+def test_text_attachment_is_chunked_off_the_event_loop(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    path = tmp_path / "notes.txt"
+    path.write_text("\n\n".join(f"Paragraph {i} " + "word " * 40 for i in range(50)))
+    attachment = {
+        "attachment_id": "att",
+        "project_id": "proj",
+        "file_path": str(path),
+        "extension": ".txt",
+        "filename": "notes.txt",
+    }
+    small = Chunker(max_tokens=64, overlap_tokens=0)
+    monkeypatch.setattr(chunker, "THREAD_BATCH", 4)
+
+    threads: List[str] = []
+    chunk_file = Chunker.chunk_file
+
+    def recording_chunk_file(
+        self: Chunker, file_path: Path, extension: Optional[str] = None
+    ) -> Iterator[str]:
+        for content in chunk_file(self, file_path, extension):
+            threads.append(threading.current_thread().name)
+            yield content
+
+    monkeypatch.setattr(Chunker, "chunk_file", recording_chunk_file)
+
+    async def run() -> List[Dict[str, Any]]:
+        loop_thread = threading.current_thread().name
+        documents = [document async for document in aiter_attachment_chunks(attachment, small)]
+        assert loop_thread not in threads
+        return documents
+
+    documents = asyncio.run(run())
+    assert len(documents) > 4
+    assert documents == list(iter_attachment_chunks(attachment, small))
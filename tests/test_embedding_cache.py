@@ -0,0 +1,35 @@
+"""Tests for embedding_cache.EmbeddingCache"""
+
+import os
+from pathlib import Path
+
+from embedding_cache import EmbeddingCache
+
+MODEL = "nomic-embed-text"
+VECTOR = [0.5] * 256  # 1 KiB as float32
+
+
+def test_disk_store_drops_least_recently_used_files(tmp_path: Path) -> None:
+    cache = EmbeddingCache(tmp_path, max_disk_bytes=3 * 1024)
+    for age, text in enumerate(["old", "used", "newer"]):
+        cache.put(MODEL, text, VECTOR)
+        path = cache._disk_path(cache.make_key(MODEL, text))
+        os.utime(path, (1000 + age, 1000 + age))
+
+    # A disk hit (from a fresh process) makes "used" recent again
+    assert EmbeddingCache(tmp_path).get(MODEL, "used") == VECTOR
+    cache.put(MODEL, "newest", VECTOR)
+
+    restarted = EmbeddingCache(tmp_path, max_memory_bytes=0)
+    assert restarted.get(MODEL, "old") is None
+    assert restarted.get(MODEL, "newer") is None
+    assert restarted.get(MODEL, "used") == VECTOR
+    assert restarted.get(MODEL, "newest") == VECTOR
+    assert cache.get_stats()["disk_bytes"] == 2 * 1024
+    assert cache.get_stats()["disk_pruned"] == 2
+
+
+def test_disk_usage_is_counted_on_startup(tmp_path: Path) -> None:
+    EmbeddingCache(tmp_path).put(MODEL, "text", VECTOR)
+
+    assert EmbeddingCache(tmp_path).get_stats()["disk_bytes"] == 1024
@@ -0,0 +1,155 @@
+"""Tests for journal.JournaledStore"""
+
+import os
+from pathlib import Path
+
+import pytest
+
+import journal
+from journal import JournaledStore
+
+
+def test_changes_survive_reload(tmp_path: Path) -> None:
+    store = JournaledStore(tmp_path / "data.json")
+    data = store.load()
+    data["a"] = 1
+    store.save(data, "a")
+    data["b"] = {"nested": True}
+    store.save(data, "b")
+    del data["a"]
+    store.save(data, "a")
+    store.close()
+
+    assert JournaledStore(tmp_path / "data.json").load() == {"b": {"nested": True}}
+
+
+def test_compaction_writes_snapshot_and_truncates_log(tmp_path: Path) -> None:
+    store = JournaledStore(tmp_path / "data.json", compact_every=3)
+    data = store.load()
+    for key in "abc":
+        data[key] = key
+        store.save(data, key)
+
+    assert store.snapshot_path.exists()
+    assert store.log_path.stat().st_size == 0
+    assert JournaledStore(tmp_path / "data.json").load() == {"a": "a", "b": "b", "c": "c"}
+
+
+def test_torn_tail_does_not_swallow_next_record(tmp_path: Path) -> None:
+    store = JournaledStore(tmp_path / "data.json")
+    data = store.load()
+    data["a"] = 1
+    store.save(data, "a")
+    store.close()
+
+    # A crash in the middle of writing `put b`
+    with open(store.log_path, "a", encoding="utf-8") as f:
+        f.write('{"op": "put", "key": "b", "val')
+
+    store = JournaledStore(tmp_path / "data.json")
+    data = store.load()
+    assert data == {"a": 1}
+    data["c"] = 3
+    store.save(data, "c")
+    store.close()
+
+    assert JournaledStore(tmp_path / "data.json").load() == {"a": 1, "c": 3}
+
+
+def test_torn_tail_repaired_by_writer_that_never_loaded(tmp_path: Path) -> None:
+    store = JournaledStore(tmp_path / "data.json")
+    store.put("a", 1)
+    store.close()
+    with open(store.log_path, "a", encoding="utf-8") as f:
+        f.write('{"op": "put", "ke')
+
+    JournaledStore(tmp_path / "data.json").put("c", 3)
+
+    assert JournaledStore(tmp_path / "data.json").load() == {"a": 1, "c": 3}
+
+
+def test_sync_picks_up_other_instances_changes(tmp_path: Path) -> None:
+    writer = JournaledStore(tmp_path / "data.json", compact_every=4)
+    reader = JournaledStore(tmp_path / "data.json", compact_every=4)
+    written = writer.load()
+    seen = reader.load()
+
+    assert not reader.sync(seen)
+    written["a"] = 1
+    writer.save(written, "a")
+    assert reader.sync(seen)
+    assert seen == {"a": 1}
+
+    # Crossing compact_every replaces the snapshot: the reader reloads it
+    for key in "bcde":
+        written[key] = key
+        writer.save(written, key)
+    reader.sync(seen)
+    assert seen == written
+
+
+def test_save_keeps_other_instances_changes_to_other_keys(tmp_path: Path) -> None:
+    first = JournaledStore(tmp_path / "data.json")
+    second = JournaledStore(tmp_path / "data.json")
+    one = first.load()
+    two = second.load()
+
+    one["a"] = 1
+    first.save(one, "a")
+    two["b"] = 2
+    second.save(two, "b")
+
+    assert two == {"a": 1, "b": 2}
+    assert JournaledStore(tmp_path / "data.json").load() == {"a": 1, "b": 2}
+
+
+def test_compaction_keeps_files_another_instance_holds_open(tmp_path: Path) -> None:
+    writer = JournaledStore(tmp_path / "data.json", compact_every=4)
+    other = JournaledStore(tmp_path / "data.json")
+    writer_data = writer.load()
+    other_data = other.load()
+    other.put("x", 1)
+    assert other._log_file is not None
+    log_inode = os.fstat(other._log_file.fileno()).st_ino
+
+    for key in "abc":
+        writer_data[key] = key
+        writer.save(writer_data, key)
+
+    # The log was truncated, not unlinked: the other instance's handle is still the live log
+    assert os.stat(writer.log_path).st_ino == log_inode
+    assert writer.log_path.stat().st_size == 0
+    other.sync(other_data)
+    assert other_data == {"x": 1, "a": "a", "b": "b", "c": "c"}
+
+    other_data["y"] = 2
+    other.save(other_data, "y")
+    assert os.fstat(other._log_file.fileno()).st_ino == log_inode
+    writer.sync(writer_data)
+    assert writer_data == {"x": 1, "a": "a", "b": "b", "c": "c", "y": 2}
+
+
+def test_compaction_retries_sharing_violation(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    store = JournaledStore(tmp_path / "data.json")
+    data = store.load()
+    data["a"] = 1
+    store.save(data, "a")
+
+    # A reader on Windows holding the snapshot open makes the first replace fail
+    attempts = []
+    real_replace = os.replace
+
+    def flaky_replace(src: Path, dst: Path) -> None:
+        attempts.append(dst)
+        if len(attempts) == 1:
+            raise PermissionError(32, "The process cannot access the file")
+        real_replace(src, dst)
+
+    monkeypatch.setattr(journal.os, "replace", flaky_replace)
+    monkeypatch.setattr(journal, "REPLACE_RETRY_S", 0)
+    store.compact(data)
+
+    assert len(attempts) == 2
+    assert JournaledStore(tmp_path / "data.json").load() == {"a": 1}
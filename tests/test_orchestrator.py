@@ -0,0 +1,120 @@
+"""Tests for orchestrator.TaskOrchestrator"""
+
+import asyncio
+import json
+from typing import Any, Dict, List, Optional
+
+import httpx
+import pytest
+
+from backends import BackendPool
+from model_load import ModelLoadTracker
+from orchestrator import TaskOrchestrator
+from router import IntelligentRouter
+from scheduler import AdmissionRejected, AdmissionScheduler
+
+OLLAMA = "http://ollama:11434"
+SPECIALIST = "mistral"
+
+PLAN = [
+    {"id": 1, "task": "first", "specialist": SPECIALIST, "depends_on": []},
+    {"id": 2, "task": "second", "specialist": SPECIALIST, "depends_on": []},
+]
+
+
+class FakeOllama:
+    """Mock /api/chat answering the plan, subtasks and synthesis; tracks calls in flight"""
+
+    def __init__(self) -> None:
+        self.in_flight: Dict[str, int] = {}
+        self.peak: Dict[str, int] = {}
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        model = json.loads(request.content)["model"]
+        self.in_flight[model] = self.in_flight.get(model, 0) + 1
+        self.peak[model] = max(self.peak.get(model, 0), self.in_flight[model])
+        await asyncio.sleep(0.01)
+        self.in_flight[model] -= 1
+        content = json.dumps(PLAN) if model != SPECIALIST else f"answer from {model}"
+        return httpx.Response(
+            200,
+            json={
+                "model": model,
+                "message": {"role": "assistant", "content": content},
+                "done": True,
+                "eval_count": 20,
+                "eval_duration": 1_000_000_000,
+            },
+        )
+
+
+def _orchestrator(scheduler: AdmissionScheduler, tracker: ModelLoadTracker) -> TaskOrchestrator:
+    return TaskOrchestrator(IntelligentRouter(), BackendPool([OLLAMA]), scheduler, tracker)
+
+
+def test_subtasks_share_scheduler_limits_and_feed_load_tracker() -> None:
+    fake = FakeOllama()
+    scheduler = AdmissionScheduler(default_max_concurrency=1)
+    tracker = ModelLoadTracker(scheduler)
+    orchestrator = _orchestrator(scheduler, tracker)
+
+    async def run() -> Optional[Dict[str, Any]]:
+        async with httpx.AsyncClient(transport=httpx.MockTransport(fake)) as client:
+            return await orchestrator.orchestrate("plan this", client, "batch")
+
+    result = asyncio.run(run())
+    assert result is not None
+    assert result["orchestration_steps"] == 2
+    # Independent subtasks for the same model wait for the scheduler's single slot
+    assert fake.peak[SPECIALIST] == 1
+    assert scheduler.load(SPECIALIST)["active"] == 0
+    assert tracker.estimate(SPECIALIST)["measured"]
+    assert tracker.estimate(orchestrator.orchestrator_model)["measured"]
+
+
+def test_full_queue_rejects_orchestration() -> None:
+    fake = FakeOllama()
+    scheduler = AdmissionScheduler(default_max_concurrency=1, max_queue=0)
+    orchestrator = _orchestrator(scheduler, ModelLoadTracker(scheduler))
+
+    async def run() -> None:
+        held = await scheduler.acquire(orchestrator.orchestrator_model)
+        try:
+            async with httpx.AsyncClient(transport=httpx.MockTransport(fake)) as client:
+                await orchestrator.orchestrate("plan this", client)
+        finally:
+            held.release()
+
+    with pytest.raises(AdmissionRejected):
+        asyncio.run(run())
+    assert fake.peak == {}
+
+
+def test_streamed_synthesis_holds_a_slot() -> None:
+    calls: List[str] = []
+    scheduler = AdmissionScheduler(default_max_concurrency=1)
+    orchestrator = _orchestrator(scheduler, ModelLoadTracker(scheduler))
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request.url.path)
+        lines = [
+            {"message": {"content": "final"}, "done": False},
+            {"message": {"content": ""}, "done": True, "eval_count": 5, "eval_duration": 10**9},
+        ]
+        return httpx.Response(200, content="".join(json.dumps(line) + "\n" for line in lines))
+
+    async def run() -> List[str]:
+        parts: List[str] = []
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            async for part in orchestrator.synthesize_results_stream(
+                "prompt", [("task", "result")], client
+            ):
+                if not parts:
+                    assert scheduler.load(orchestrator.orchestrator_model)["active"] == 1
+                parts.append(part)
+        return parts
+
+    parts = asyncio.run(run())
+    assert parts[0] == "final"
+    assert calls == ["/api/chat"]
+    assert scheduler.load(orchestrator.orchestrator_model)["active"] == 0
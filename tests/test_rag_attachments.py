@@ -0,0 +1,58 @@
+"""Tests for attachment ingestion in rag_engine.RAGEngine"""
+
+import asyncio
+import json
+from pathlib import Path
+from typing import Any, Dict
+
+import httpx
+
+from rag_engine import RAGEngine
+
+
+def _embed(request: httpx.Request) -> httpx.Response:
+    texts = json.loads(request.content)["input"]
+    return httpx.Response(200, json={"embeddings": [[1.0, float(len(t)), 0.5] for t in texts]})
+
+
+def _engine(tmp_path: Path) -> RAGEngine:
+    client = httpx.AsyncClient(transport=httpx.MockTransport(_embed))
+    return RAGEngine(storage_path=str(tmp_path / "rag"), http_client=client)
+
+
+def _attachment(tmp_path: Path, project_id: str) -> Dict[str, Any]:
+    # Attachments are deduplicated by content: both projects share one id and file
+    path = tmp_path / "notes.md"
+    path.write_text("# Title\n\nSome notes.\n\n## Part\n\nMore notes.\n")
+    return {
+        "attachment_id": "abc123",
+        "project_id": project_id,
+        "file_path": str(path),
+        "filename": "notes.md",
+        "extension": ".md",
+    }
+
+
+def test_shared_attachment_chunks_are_kept_per_project(tmp_path: Path) -> None:
+    engine = _engine(tmp_path)
+    for project_id in ("alpha", "beta"):
+        report = asyncio.run(engine.add_attachment(_attachment(tmp_path, project_id)))
+        assert report["chunks"] > 0
+
+    alpha = [d for d in engine.documents if d.startswith("alpha/abc123:")]
+    beta = [d for d in engine.documents if d.startswith("beta/abc123:")]
+    assert alpha and len(alpha) == len(beta)
+    assert all(engine.documents[d]["project_id"] == "beta" for d in beta)
+
+
+def test_delete_attachment_only_touches_its_project(tmp_path: Path) -> None:
+    engine = _engine(tmp_path)
+    for project_id in ("alpha", "beta"):
+        asyncio.run(engine.add_attachment(_attachment(tmp_path, project_id)))
+    total = len(engine.documents)
+
+    deleted = engine.delete_attachment("alpha", "abc123")
+
+    assert deleted == total // 2
+    assert all(doc_id.startswith("beta/") for doc_id in engine.documents)
+    assert all(doc_id in engine.index for doc_id in engine.documents)
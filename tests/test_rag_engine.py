@@ -0,0 +1,27 @@
+"""Tests for rag_engine.RAGEngine"""
+
+import asyncio
+from pathlib import Path
+
+import httpx
+
+from rag_engine import RAGEngine
+
+
+def test_aclose_closes_only_a_private_client(tmp_path: Path) -> None:
+    async def run() -> None:
+        shared = httpx.AsyncClient()
+        engine = RAGEngine(storage_path=str(tmp_path / "shared"), http_client=shared)
+        await engine.aclose()
+        assert not shared.is_closed
+        await shared.aclose()
+
+        engine = RAGEngine(storage_path=str(tmp_path / "private"))
+        private = engine._get_http_client()
+        await engine.aclose()
+        assert private.is_closed
+        # A later call creates a new client
+        assert engine._get_http_client() is not private
+        await engine.aclose()
+
+    asyncio.run(run())
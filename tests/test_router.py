@@ -0,0 +1,97 @@
+"""Tests for router.IntelligentRouter"""
+
+import asyncio
+import json
+from pathlib import Path
+
+from model_load import ModelLoadTracker
+from router import IntelligentRouter
+from scheduler import AdmissionScheduler
+
+
+def _router(tmp_path: Path) -> IntelligentRouter:
+    config = {
+        "models": {
+            "measured": {"role": "coding", "priority": 1, "tags": ["code"]},
+            "unmeasured": {"role": "coding", "priority": 1, "tags": ["code"]},
+        },
+        "default_model": "measured",
+        "routing": {"load_aware": True, "score_margin": 0},
+    }
+    config_path = tmp_path / "config.json"
+    config_path.write_text(json.dumps(config))
+    router = IntelligentRouter(str(config_path))
+    router.load_tracker = ModelLoadTracker(AdmissionScheduler(default_max_concurrency=2))
+    return router
+
+
+def _tag_router(tmp_path: Path) -> IntelligentRouter:
+    config = {
+        "models": {
+            "general": {"role": "general", "priority": 3, "tags": ["general"]},
+            "gopher": {"role": "go", "priority": 1, "tags": ["go"]},
+            "backend": {"role": "api", "priority": 1, "tags": ["api", "rest api"]},
+            "native": {"role": "systems", "priority": 1, "tags": ["c++", "c#"]},
+            "chess": {"role": "chess", "priority": 1, "tags": ["opening theory"]},
+        },
+        "default_model": "general",
+    }
+    config_path = tmp_path / "config.json"
+    config_path.write_text(json.dumps(config))
+    return IntelligentRouter(str(config_path))
+
+
+def test_word_tags_do_not_match_inside_other_words(tmp_path: Path) -> None:
+    router = _tag_router(tmp_path)
+
+    assert router._match_tags("this is a good idea") == set()
+    assert router._match_tags("what is the capital of France?") == set()
+    assert router.route("write it in Go")[0] == "gopher"
+    assert router.route("document the API.")[0] == "backend"
+
+
+def test_symbol_tags_match_as_whole_tokens(tmp_path: Path) -> None:
+    router = _tag_router(tmp_path)
+
+    assert router._match_tags("port this to C++, please") == {"c++"}
+    assert router._match_tags("is C# faster?") == {"c#"}
+    assert router.route("a C# question")[0] == "native"
+    # Not preceded by a word character: "abc++" is not the tag "c++"
+    assert router._match_tags("abc++ and xc#") == set()
+
+
+def test_phrase_tags_match_whole_phrases(tmp_path: Path) -> None:
+    router = _tag_router(tmp_path)
+
+    assert router._match_tags("design a REST API for orders") == {"api", "rest api"}
+    assert router.route("explain this opening theory")[0] == "chess"
+    assert router._match_tags("opening theoryx") == set()
+    assert router._match_tags("opening and theory") == set()
+
+
+def test_reason_lists_matched_tags_only_when_there_are_some(tmp_path: Path) -> None:
+    router = _router(tmp_path)
+    router.load_tracker = None
+
+    assert router.route("fix this code")[1] == "Best for coding (matched: code)"
+    assert router.route("hello there")[1] == "Best for coding"
+
+
+def test_unmeasured_model_is_explored(tmp_path: Path) -> None:
+    router = _router(tmp_path)
+    tracker = router.load_tracker
+    assert tracker is not None
+    # Both resident; only one has answered (100 tokens/s)
+    tracker.observe("measured", {"done": True, "eval_count": 200, "eval_duration": 2e9})
+    tracker.loaded["unmeasured"] = {}
+
+    estimate = tracker.estimate("unmeasured")
+    assert not estimate["measured"]
+    assert estimate["expected_s"] == tracker.estimate("measured")["expected_s"]
+
+    # Equal estimates keep the tag-based choice; once it is busy the other one is tried
+    assert router.route("code")[0] == "measured"
+    asyncio.run(tracker.scheduler.acquire("measured"))
+    model, reason = router.route("code")
+    assert model == "unmeasured"
+    assert "speed not measured yet" in reason
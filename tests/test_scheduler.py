@@ -0,0 +1,114 @@
+"""Tests for scheduler.AdmissionScheduler"""
+
+import asyncio
+from typing import List
+
+import pytest
+
+from scheduler import AdmissionRejected, AdmissionScheduler, get_scheduler_settings
+
+
+def test_freed_slot_goes_to_interactive_before_batch() -> None:
+    scheduler = AdmissionScheduler(default_max_concurrency=1)
+    order: List[str] = []
+
+    async def call(name: str, priority: str) -> None:
+        async with await scheduler.acquire("model", priority):
+            order.append(name)
+
+    async def run() -> None:
+        running = await scheduler.acquire("model")
+        waiters = [
+            asyncio.ensure_future(call("batch-1", "batch")),
+            asyncio.ensure_future(call("interactive-1", "interactive")),
+            asyncio.ensure_future(call("batch-2", "batch")),
+            asyncio.ensure_future(call("interactive-2", "interactive")),
+        ]
+        await asyncio.sleep(0)
+        assert scheduler.load("model") == {"active": 1, "queued": 4, "max_concurrency": 1}
+        running.release()
+        await asyncio.gather(*waiters)
+
+    asyncio.run(run())
+    assert order == ["interactive-1", "interactive-2", "batch-1", "batch-2"]
+    assert scheduler.load("model")["active"] == 0
+
+
+def test_full_queue_is_rejected_with_retry_after() -> None:
+    scheduler = AdmissionScheduler(default_max_concurrency=1, max_queue=1)
+
+    async def run() -> AdmissionRejected:
+        running = await scheduler.acquire("model")
+        waiter = asyncio.ensure_future(scheduler.acquire("model"))
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejected) as rejected:
+            await scheduler.acquire("model")
+        # Batch work has its own queue
+        batch = asyncio.ensure_future(scheduler.acquire("model", "batch"))
+        await asyncio.sleep(0)
+        assert not batch.done()
+
+        running.release()
+        (await waiter).release()
+        (await batch).release()
+        return rejected.value
+
+    error = asyncio.run(run())
+    assert error.model == "model"
+    assert error.retry_after >= 1
+    assert scheduler.get_stats()["models"]["model"]["rejected"] == 1
+
+
+def test_queue_wait_times_out() -> None:
+    scheduler = AdmissionScheduler(default_max_concurrency=1, queue_timeout=0.01)
+
+    async def run() -> None:
+        running = await scheduler.acquire("model")
+        with pytest.raises(AdmissionRejected, match="timed out"):
+            await scheduler.acquire("model")
+        running.release()
+        # The abandoned place in the queue does not hold the slot
+        (await asyncio.wait_for(scheduler.acquire("model"), 1)).release()
+
+    asyncio.run(run())
+    assert scheduler.get_stats()["models"]["model"]["timed_out"] == 1
+
+
+def test_cancelled_waiter_leaves_the_queue() -> None:
+    scheduler = AdmissionScheduler(default_max_concurrency=1)
+
+    async def run() -> None:
+        running = await scheduler.acquire("model")
+        waiter = asyncio.ensure_future(scheduler.acquire("model"))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert scheduler.load("model")["queued"] == 0
+        running.release()
+        assert scheduler.load("model")["active"] == 0
+
+    asyncio.run(run())
+
+
+def test_unknown_priority_is_refused() -> None:
+    with pytest.raises(ValueError):
+        asyncio.run(AdmissionScheduler().acquire("model", "urgent"))
+
+
+def test_limits_are_split_between_workers() -> None:
+    config = {"models": {"big": {"max_concurrency": 3, "max_queue": 10}}}
+    settings = get_scheduler_settings(config, workers=2)
+
+    assert settings["models"]["big"] == {"max_concurrency": 2, "max_queue": 5}
+    assert settings["default_max_concurrency"] == 1
+
+
+def test_load_of_unseen_model_does_not_create_a_queue() -> None:
+    scheduler = AdmissionScheduler(
+        default_max_concurrency=2, model_limits={"big": {"max_concurrency": 1}}
+    )
+
+    assert scheduler.load("small") == {"active": 0, "queued": 0, "max_concurrency": 2}
+    assert scheduler.load("big") == {"active": 0, "queued": 0, "max_concurrency": 1}
+    assert scheduler.models() == []
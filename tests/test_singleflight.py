@@ -0,0 +1,163 @@
+"""Tests for singleflight.SingleFlight"""
+
+import asyncio
+from typing import AsyncIterable, AsyncIterator, List, Tuple
+
+from singleflight import SingleFlight
+
+
+def test_do_runs_once_for_concurrent_callers() -> None:
+    flight = SingleFlight()
+    runs = 0
+
+    async def fetch() -> str:
+        nonlocal runs
+        runs += 1
+        await asyncio.sleep(0.01)
+        return "answer"
+
+    async def run() -> List[Tuple[str, bool]]:
+        return list(await asyncio.gather(*(flight.do("key", fetch) for _ in range(3))))
+
+    assert asyncio.run(run()) == [("answer", False), ("answer", True), ("answer", True)]
+    assert runs == 1
+    assert flight.get_stats()["in_flight_calls"] == 0
+
+
+def test_do_survives_one_caller_leaving_and_cancels_when_all_leave() -> None:
+    flight = SingleFlight()
+
+    async def run() -> None:
+        release = asyncio.Event()
+        upstream_cancelled = asyncio.Event()
+
+        async def fetch() -> str:
+            try:
+                await release.wait()
+            except asyncio.CancelledError:
+                upstream_cancelled.set()
+                raise
+            return "answer"
+
+        first = asyncio.ensure_future(flight.do("key", fetch))
+        second = asyncio.ensure_future(flight.do("key", fetch))
+        await asyncio.sleep(0)
+        first.cancel()
+        await asyncio.sleep(0)
+        release.set()
+        assert await second == ("answer", True)
+        assert not upstream_cancelled.is_set()
+
+        release.clear()
+        third = asyncio.ensure_future(flight.do("other", fetch))
+        await asyncio.sleep(0)
+        third.cancel()
+        await asyncio.wait_for(upstream_cancelled.wait(), 1)
+
+    asyncio.run(run())
+
+
+def test_do_raises_the_error_to_every_caller() -> None:
+    flight = SingleFlight()
+
+    async def fail() -> str:
+        await asyncio.sleep(0.01)
+        raise RuntimeError("upstream down")
+
+    async def run() -> List[BaseException]:
+        results = await asyncio.gather(
+            *(flight.do("key", fail) for _ in range(2)), return_exceptions=True
+        )
+        return [r for r in results if isinstance(r, BaseException)]
+
+    errors = asyncio.run(run())
+    assert len(errors) == 2 and all(isinstance(e, RuntimeError) for e in errors)
+
+
+class Upstream:
+    """Async stream of items let through one `step()` at a time, recording whether it was closed"""
+
+    def __init__(self, items: List[int]) -> None:
+        self.items = items
+        self.opened = 0
+        self.closed = False
+        self._permits = asyncio.Semaphore(0)
+
+    def step(self, items: int = 1) -> None:
+        for _ in range(items):
+            self._permits.release()
+
+    async def open(self) -> AsyncIterator[int]:
+        self.opened += 1
+        return self._iterate()
+
+    async def _iterate(self) -> AsyncIterator[int]:
+        try:
+            for item in self.items:
+                await self._permits.acquire()
+                yield item
+        finally:
+            self.closed = True
+
+
+async def _collect(subscription: AsyncIterable[int]) -> List[int]:
+    return [item async for item in subscription]
+
+
+def test_stream_fans_out_to_every_subscriber() -> None:
+    flight = SingleFlight()
+
+    async def run() -> None:
+        upstream = Upstream([1, 2, 3])
+        first, shared = await flight.stream("key", upstream.open)
+        assert not shared
+        reader = asyncio.ensure_future(_collect(first))
+        upstream.step()
+        await asyncio.sleep(0.01)
+
+        # A late subscriber still gets every item from the start
+        second, shared = await flight.stream("key", upstream.open)
+        assert shared
+        upstream.step(2)
+        assert await _collect(second) == [1, 2, 3]
+        assert await reader == [1, 2, 3]
+        assert upstream.opened == 1
+
+    asyncio.run(run())
+
+
+def test_stream_is_cancelled_once_every_subscriber_left() -> None:
+    flight = SingleFlight()
+
+    async def run() -> None:
+        upstream = Upstream([1, 2, 3])
+        first, _ = await flight.stream("key", upstream.open)
+        second, _ = await flight.stream("key", upstream.open)
+
+        first.release()
+        await asyncio.sleep(0.01)
+        assert not upstream.closed
+
+        second.release()
+        await asyncio.sleep(0.01)
+        assert upstream.closed
+        assert flight.get_stats()["in_flight_streams"] == 0
+
+    asyncio.run(run())
+
+
+def test_stream_open_error_reaches_every_caller() -> None:
+    flight = SingleFlight()
+
+    async def refuse() -> AsyncIterator[int]:
+        await asyncio.sleep(0.01)
+        raise ConnectionError("refused")
+
+    async def run() -> List[BaseException]:
+        results = await asyncio.gather(
+            *(flight.stream("key", refuse) for _ in range(2)), return_exceptions=True
+        )
+        return [r for r in results if isinstance(r, BaseException)]
+
+    errors = asyncio.run(run())
+    assert len(errors) == 2 and all(isinstance(e, ConnectionError) for e in errors)
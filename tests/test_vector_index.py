@@ -0,0 +1,166 @@
+"""Tests for vector_index.VectorIndex"""
+
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+
+from vector_index import VectorIndex
+
+
+def _vector(seed: int, dim: int = 8) -> List[float]:
+    return list(np.random.default_rng(seed).standard_normal(dim))
+
+
+def _top(index: VectorIndex, seed: int, project_id: Optional[str] = None) -> str:
+    return index.search(_vector(seed), top_k=1, project_id=project_id)[0][0]
+
+
+def _open(tmp_path: Path, read_only: bool = False) -> VectorIndex:
+    return VectorIndex.open(tmp_path / "vectors.npy", read_only=read_only)
+
+
+def test_add_search_remove() -> None:
+    index = VectorIndex()
+    for n in range(10):
+        index.add(f"doc{n}", _vector(n), project_id="even" if n % 2 == 0 else "odd")
+
+    assert len(index) == 10
+    assert _top(index, 3) == "doc3"
+    even = index.search(_vector(3), top_k=3, project_id="even")
+    assert len(even) == 3
+    assert all(int(doc_id[3:]) % 2 == 0 for doc_id, _ in even)
+
+    assert index.remove("doc3")
+    assert not index.remove("doc3")
+    assert "doc3" not in index
+    assert len(index) == 9
+    assert "doc3" not in {doc_id for doc_id, _ in index.search(_vector(3), top_k=10)}
+
+
+def test_replace_keeps_one_entry() -> None:
+    index = VectorIndex()
+    index.add("doc", _vector(1))
+    index.add("doc", _vector(2))
+
+    assert len(index) == 1
+    assert list(index) == ["doc"]
+    assert [doc_id for doc_id, _ in index.search(_vector(2), top_k=5)] == ["doc"]
+    assert np.allclose(np.array(index.get("doc")), VectorIndex.normalize(np.array(_vector(2))))
+
+
+def test_vacuum_drops_freed_rows() -> None:
+    index = VectorIndex()
+    index.VACUUM_MIN_ROWS = 2
+    for n in range(6):
+        index.add(f"doc{n}", _vector(n))
+    for n in range(4):
+        index.remove(f"doc{n}")
+
+    assert index.used_rows == 2
+    assert list(index) == ["doc4", "doc5"]
+    assert _top(index, 5) == "doc5"
+
+
+def test_reopen_restores_documents(tmp_path: Path) -> None:
+    index = _open(tmp_path)
+    for n in range(5):
+        index.add(f"doc{n}", _vector(n), project_id="p")
+    index.remove("doc1")
+    index.add("doc2", _vector(12), project_id="q")
+    index.save()
+
+    reopened = _open(tmp_path)
+    assert sorted(reopened) == ["doc0", "doc2", "doc3", "doc4"]
+    assert _top(reopened, 12) == "doc2"
+    assert _top(reopened, 4, project_id="p") == "doc4"
+    assert [doc_id for doc_id, _ in reopened.search(_vector(1), top_k=5, project_id="q")] == [
+        "doc2"
+    ]
+
+
+def test_reader_rows_unchanged_until_refresh(tmp_path: Path) -> None:
+    writer = _open(tmp_path)
+    for n in range(4):
+        writer.add(f"doc{n}", _vector(n))
+    writer.save()
+
+    reader = _open(tmp_path, read_only=True)
+    before = {doc_id: np.array(reader.get(doc_id)) for doc_id in reader}
+    assert all(vector.shape == (8,) for vector in before.values())
+
+    # Unsaved changes share the mapped file but must not touch rows the reader knows
+    writer.remove("doc0")
+    writer.add("doc1", _vector(11))
+    writer.add("doc4", _vector(4))
+    for doc_id, vector in before.items():
+        assert np.array_equal(np.array(reader.get(doc_id)), vector)
+    assert not reader.refresh()
+
+    writer.save()
+    assert reader.refresh()
+    assert sorted(reader) == ["doc1", "doc2", "doc3", "doc4"]
+    assert _top(reader, 11) == "doc1"
+    assert _top(reader, 4) == "doc4"
+
+
+def test_reader_survives_vacuum(tmp_path: Path) -> None:
+    writer = _open(tmp_path)
+    writer.VACUUM_MIN_ROWS = 1
+    for n in range(6):
+        writer.add(f"doc{n}", _vector(n))
+    writer.save()
+    reader = _open(tmp_path, read_only=True)
+
+    for n in range(4):
+        writer.remove(f"doc{n}")
+    writer.save()
+    assert writer.used_rows == 2
+
+    # The old mapping stays valid until the reader reloads
+    assert _top(reader, 0) == "doc0"
+    assert reader.refresh()
+    assert sorted(reader) == ["doc4", "doc5"]
+    assert _top(reader, 5) == "doc5"
+
+
+def test_file_growth_holds_the_sidecar_lock(tmp_path: Path) -> None:
+    writer = _open(tmp_path)
+    writer.add("doc0", _vector(0))
+    writer.save()
+    assert writer.journal is not None
+    lock = writer.journal.lock
+    capacity = writer.matrix.shape[0]
+
+    locked: List[bool] = []
+    create_backing_file = writer._create_backing_file
+
+    def recording_create(capacity: int, rows: Optional[np.ndarray] = None) -> None:
+        locked.append(lock.locked)
+        create_backing_file(capacity, rows)
+
+    writer._create_backing_file = recording_create  # type: ignore[method-assign]
+    for n in range(1, capacity + 1):
+        writer.add(f"doc{n}", _vector(n))
+
+    assert locked == [True]
+    assert writer.matrix.shape[0] == 2 * capacity
+    assert not lock.locked
+    writer.save()
+    assert len(_open(tmp_path, read_only=True)) == capacity + 1
+
+
+def test_removed_rows_hidden_from_ann_search(tmp_path: Path) -> None:
+    index = _open(tmp_path)
+    for n in range(64):
+        index.add(f"doc{n}", _vector(n))
+    index.build_ann(n_lists=4)
+    index.remove("doc7")
+    index.add("doc64", _vector(7))
+    index.save()
+
+    reopened = _open(tmp_path)
+    assert reopened.ann is not None
+    results = [doc_id for doc_id, _ in reopened.search(_vector(7), top_k=5, nprobe=4)]
+    assert results[0] == "doc64"
+    assert "doc7" not in results
@@ -0,0 +1,50 @@
+"""Tests for workspace_manager.WorkspaceManager"""
+
+import multiprocessing
+from pathlib import Path
+
+from workspace_manager import WorkspaceManager
+
+PROCESSES = 4
+INCREMENTS = 300
+
+
+def _count_messages(storage_path: str, workspace_id: str) -> None:
+    manager = WorkspaceManager(storage_path)
+    for _ in range(INCREMENTS):
+        manager.increment_stats(workspace_id, "message_count")
+
+
+def test_increments_from_several_workers_add_up(tmp_path: Path) -> None:
+    storage_path = str(tmp_path / "workspaces")
+    workspace_id = WorkspaceManager(storage_path).create_workspace("shared")["id"]
+
+    context = multiprocessing.get_context("spawn")
+    workers = [
+        context.Process(target=_count_messages, args=(storage_path, workspace_id))
+        for _ in range(PROCESSES)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(timeout=60)
+        assert worker.exitcode == 0
+
+    workspace = WorkspaceManager(storage_path).get_workspace(workspace_id)
+    assert workspace is not None
+    assert workspace["message_count"] == PROCESSES * INCREMENTS
+
+
+def test_update_keeps_other_workers_changes(tmp_path: Path) -> None:
+    storage_path = str(tmp_path / "workspaces")
+    first = WorkspaceManager(storage_path)
+    second = WorkspaceManager(storage_path)
+    workspace_id = first.create_workspace("shared")["id"]
+
+    second.increment_stats(workspace_id, "message_count", 3)
+    first.update_workspace(workspace_id, {"description": "notes"})
+
+    workspace = WorkspaceManager(storage_path).get_workspace(workspace_id)
+    assert workspace is not None
+    assert workspace["message_count"] == 3
+    assert workspace["description"] == "notes"
@@ -0,0 +1,486 @@
+"""
+Vector index for the RAG engine
+Contiguous pre-normalized float32 matrix searched with a single matrix-vector product,
+optionally backed by a memory-mapped .npy file and narrowed by an IVF index (ann_index)
+"""
+
+import json
+import logging
+import os
+from contextlib import nullcontext
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+import numpy as np
+
+from ann_index import IVFIndex
+from journal import JournaledStore
+
+logger = logging.getLogger(__name__)
+
+
+class VectorIndex:
+    """
+    Cosine-similarity index
+
+    Rows of `matrix` are L2-normalized embeddings; `ids` and `project_codes`
+    are parallel arrays describing each of the first `used_rows` rows. Rows
+    are never rewritten in place: adding a document appends a row (freeing the
+    previous one of a replaced document) and deleting one only marks its row
+    free, so every mutation is O(dim) and a process reading the shared file
+    never sees a row change under an id it knows. Freed rows are masked out of
+    searches and dropped by a vacuum once they outnumber the live ones.
+
+    Search is exact unless an IVF index is attached (`build_ann()`, or found
+    next to the file by `open()`), in which case only the rows of the closest
+    lists are scored.
+    """
+
+    NO_PROJECT = -1
+    # Project code of freed rows
+    FREE = -2
+    # Freed rows are kept until there are more of them than live rows, and at least this many
+    VACUUM_MIN_ROWS = 1024
+
+    def __init__(self, dim: Optional[int] = None, capacity: int = 1024) -> None:
+        self.dim = dim
+        self._capacity = capacity
+        # Live documents, and rows in use (live or freed)
+        self.count = 0
+        self.used_rows = 0
+
+        self.matrix: np.ndarray = np.zeros((capacity, dim or 0), dtype=np.float32)
+        self.project_codes = np.full(capacity, self.NO_PROJECT, dtype=np.int32)
+        self.ids: List[str] = []
+
+        self._rows: Dict[str, int] = {}
+        self._project_codes: Dict[str, int] = {}
+        self._code_to_project: Dict[int, str] = {}
+
+        # Set by open(): float32 .npy matrix file and its journaled id/project sidecar
+        self.path: Optional[Path] = None
+        self.meta_path: Optional[Path] = None
+        self.journal: Optional[JournaledStore] = None
+        self.read_only = False
+        self.nprobe = 8
+
+        # Ids whose row assignment changed since the last save()
+        self._dirty: Set[str] = set()
+
+        # Optional approximate index, kept in step with the rows
+        self.ann: Optional[IVFIndex] = None
+
+    @classmethod
+    def open(cls, path: Path, read_only: bool = False, nprobe: int = 8) -> "VectorIndex":
+        """
+        Open (or prepare) a binary index stored as `<path>` + `<path>.ids.json`
+
+        The matrix is memory-mapped, so opening costs the same for any corpus
+        size and every process mapping the file shares it through the page cache.
+        The sidecar maps doc_id -> [row, project_id] and is journaled, so a
+        mutation only appends the rows it touched. An IVF index persisted next
+        to the file is attached with the given `nprobe`.
+
+        Several processes may open the same files, with one writer: the others
+        open them `read_only` and call refresh() to see what it saved. The
+        writer only writes rows no saved id points at, and replaces the files
+        (vacuum) under the sidecar's lock, which readers hold while loading.
+        """
+        index = cls()
+        index.path = Path(path)
+        index.meta_path = index.path.with_name(index.path.name + ".ids.json")
+        index.journal = JournaledStore(index.meta_path)
+        index.read_only = read_only
+        index.nprobe = nprobe
+
+        if index.path.exists():
+            index._load_files()
+
+        return index
+
+    def _load_files(self) -> None:
+        """Map the matrix and rebuild the row maps from the sidecar"""
+        assert self.path is not None and self.journal is not None
+        # The lock keeps a vacuum from replacing the files between the two reads
+        with self.journal.lock:
+            rows: Dict[str, List[Any]] = self.journal.load()
+            self.matrix = np.load(self.path, mmap_mode="r" if self.read_only else "r+")
+            self._capacity, self.dim = self.matrix.shape
+            self.ann = IVFIndex.load(self.path, self._capacity, self.nprobe, self.read_only)
+
+        self.count = len(rows)
+        self.used_rows = max((row for row, _ in rows.values()), default=-1) + 1
+        self.ids = [""] * self.used_rows
+        self.project_codes = np.full(self._capacity, self.FREE, dtype=np.int32)
+        self._rows = {}
+        self._project_codes = {}
+        self._code_to_project = {}
+
+        for doc_id, (row, project_id) in rows.items():
+            self.ids[row] = doc_id
+            self._rows[doc_id] = row
+            self.project_codes[row] = self._intern_project(project_id)
+
+    def refresh(self) -> bool:
+        """
+        Reload a read-only index if the writer has saved since it was read
+
+        The writer flushes the matrix before journaling the row assignments of
+        a save in one append, and never rewrites a row that a journaled id
+        points at, so the ids read here always match their rows. Costs two
+        stat calls when nothing changed.
+
+        Returns:
+            True if the index was reloaded
+        """
+        if not self.read_only or self.path is None or self.journal is None:
+            return False
+        if not self.journal.changed() or not self.path.exists():
+            return False
+        self._load_files()
+        return True
+
+    def _row_record(self, doc_id: str) -> List[Any]:
+        row = self._rows[doc_id]
+        return [row, self._code_to_project.get(int(self.project_codes[row]))]
+
+    def _create_backing_file(self, capacity: int, rows: Optional[np.ndarray] = None) -> None:
+        """
+        Write the matrix to a new .npy file of `capacity` rows and remap it
+
+        Args:
+            rows: Rows to keep, in order (default: all rows in use)
+        """
+        assert self.path is not None
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+
+        new_matrix = np.lib.format.open_memmap(
+            tmp_path, mode="w+", dtype=np.float32, shape=(capacity, self.dim or 0)
+        )
+        if rows is not None:
+            new_matrix[: len(rows)] = self.matrix[rows]
+        elif self.used_rows:
+            new_matrix[: self.used_rows] = self.matrix[: self.used_rows]
+        new_matrix.flush()
+
+        # Release both mappings before renaming (required on Windows)
+        del new_matrix
+        self.matrix = np.zeros((0, self.dim or 0), dtype=np.float32)
+        os.replace(tmp_path, self.path)
+
+        self.matrix = np.load(self.path, mmap_mode="r+")
+
+    def save(self) -> None:
+        """Flush the mapped matrix and journal the row assignments changed since last save"""
+        if self.path is None or self.journal is None or self.read_only:
+            return
+        if self.dim is None:
+            return  # Nothing has been added yet
+
+        journal = self.journal
+        with journal.lock:
+            vacuumed = self._needs_vacuum()
+            if vacuumed:
+                self._vacuum()
+            elif not isinstance(self.matrix, np.memmap):
+                self._create_backing_file(self._capacity)
+            else:
+                self.matrix.flush()
+
+            if self.ann is not None:
+                if self.ann.path is None:
+                    self.ann.attach_files(self.path, self.used_rows)
+                else:
+                    self.ann.flush()
+
+            if vacuumed or journal.pending_records + len(self._dirty) >= journal.compact_every:
+                journal.compact({doc_id: self._row_record(doc_id) for doc_id in self._rows})
+            else:
+                # One append per save, so readers see all of its rows or none
+                journal.save_many(
+                    {
+                        doc_id: self._row_record(doc_id)
+                        for doc_id in self._dirty
+                        if doc_id in self._rows
+                    },
+                    self._dirty,
+                )
+        self._dirty.clear()
+
+    def _needs_vacuum(self) -> bool:
+        free = self.used_rows - self.count
+        return free >= self.VACUUM_MIN_ROWS and free > self.count
+
+    def _vacuum(self) -> None:
+        """
+        Drop the freed rows, renumbering the live ones in order
+
+        A file-backed index writes new files: call under the sidecar lock and
+        compact the sidecar before releasing it.
+        """
+        live = np.array(sorted(self._rows.values()), dtype=np.int64)
+        ids = [self.ids[row] for row in live]
+
+        if self.ann is not None:
+            self.ann.keep_rows(live, self._capacity)
+        if isinstance(self.matrix, np.memmap):
+            self._create_backing_file(self._capacity, live)
+        else:
+            matrix = np.zeros_like(self.matrix)
+            matrix[: len(live)] = self.matrix[live]
+            self.matrix = matrix
+
+        codes = np.full(self._capacity, self.FREE, dtype=np.int32)
+        codes[: len(live)] = self.project_codes[live]
+        self.project_codes = codes
+        self.ids = ids
+        self._rows = {doc_id: row for row, doc_id in enumerate(ids)}
+        self.used_rows = len(ids)
+        self._dirty.update(ids)
+        logger.info(f"Vacuumed vector index: {len(ids)} rows kept")
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __contains__(self, doc_id: object) -> bool:
+        return doc_id in self._rows
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._rows)
+
+    @staticmethod
+    def normalize(vector: np.ndarray) -> np.ndarray:
+        """Return a float32 unit vector (zero vectors stay zero)"""
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = float(np.linalg.norm(vector))
+        if norm == 0.0:
+            return vector
+        normalized: np.ndarray = vector / norm
+        return normalized
+
+    def _intern_project(self, project_id: Optional[str]) -> int:
+        """Integer code for a project id, allocated on first use"""
+        if project_id is None:
+            return self.NO_PROJECT
+        code = self._project_codes.get(project_id)
+        if code is None:
+            code = len(self._project_codes)
+            self._project_codes[project_id] = code
+            self._code_to_project[code] = project_id
+        return code
+
+    def _ensure_capacity(self, rows: int) -> None:
+        if rows <= self._capacity and self.matrix.shape[1] == self.dim:
+            return
+        capacity = max(self._capacity, 1)
+        while capacity < rows:
+            capacity *= 2
+
+        # Replacing the files takes the sidecar lock, like a vacuum, so readers
+        # never map a matrix that does not match the ids they loaded
+        with self.journal.lock if self.journal is not None else nullcontext():
+            if isinstance(self.matrix, np.memmap):
+                # File-backed: grow the .npy file and remap it
+                self._create_backing_file(capacity)
+            else:
+                matrix = np.zeros((capacity, self.dim or 0), dtype=np.float32)
+                if self.used_rows:
+                    matrix[: self.used_rows] = self.matrix[: self.used_rows]
+                self.matrix = matrix
+
+            codes = np.full(capacity, self.FREE, dtype=np.int32)
+            codes[: self.used_rows] = self.project_codes[: self.used_rows]
+            self.project_codes, self._capacity = codes, capacity
+
+            if self.ann is not None:
+                self.ann.resize(capacity, self.used_rows)
+
+    def _check_writable(self) -> None:
+        if self.read_only:
+            raise PermissionError("Vector index is opened read-only")
+
+    def add(self, doc_id: str, vector: List[float], project_id: Optional[str] = None) -> None:
+        """Insert or replace the embedding of a document"""
+        self._check_writable()
+        row_vector = self.normalize(np.asarray(vector, dtype=np.float32))
+
+        if self.dim is None:
+            self.dim = int(row_vector.shape[0])
+        elif row_vector.shape[0] != self.dim:
+            raise ValueError(
+                f"Embedding dimension {row_vector.shape[0]} does not match index ({self.dim})"
+            )
+
+        # A replaced document gets a new row: readers may still use the old one
+        self._free(doc_id)
+        self._ensure_capacity(self.used_rows + 1)
+        row = self.used_rows
+        self.used_rows += 1
+        self.count += 1
+        self.ids.append(doc_id)
+        self._rows[doc_id] = row
+
+        self.matrix[row] = row_vector
+        self.project_codes[row] = self._intern_project(project_id)
+        if self.ann is not None:
+            self.ann.assign(row, row_vector)
+        self._dirty.add(doc_id)
+
+    def _free(self, doc_id: str) -> bool:
+        row = self._rows.pop(doc_id, None)
+        if row is None:
+            return False
+        self.ids[row] = ""
+        self.project_codes[row] = self.FREE
+        self.count -= 1
+        # File-backed indexes vacuum when saving, under the sidecar lock
+        if self.path is None and self._needs_vacuum():
+            self._vacuum()
+        return True
+
+    def remove(self, doc_id: str) -> bool:
+        """Delete a document by marking its row free"""
+        self._check_writable()
+        if not self._free(doc_id):
+            return False
+        self._dirty.add(doc_id)
+        return True
+
+    def get(self, doc_id: str) -> Optional[np.ndarray]:
+        """Return the stored (normalized) embedding of a document"""
+        row = self._rows.get(doc_id)
+        return None if row is None else self.matrix[row]
+
+    def build_ann(
+        self,
+        n_lists: Optional[int] = None,
+        nprobe: int = 8,
+        iterations: int = 10,
+        seed: int = 0,
+    ) -> IVFIndex:
+        """
+        (Re)train the IVF index over the current rows and attach it
+
+        Training samples at most 256 rows per list, so this is cheap enough to
+        run in-process, but it is usually done offline (`python ann_index.py`).
+        Freed rows are assigned too (searches mask them). The files are written
+        by the next save().
+        """
+        self._check_writable()
+        if self.count == 0:
+            raise ValueError("Cannot build an ANN index over an empty vector index")
+
+        # Drop the previous mapping first so its files can be replaced
+        self.ann = None
+        self.ann = IVFIndex.build(
+            self.matrix,
+            self.used_rows,
+            n_lists=n_lists,
+            nprobe=nprobe,
+            iterations=iterations,
+            seed=seed,
+        )
+        return self.ann
+
+    def drop_ann(self) -> None:
+        """Detach the IVF index and delete its files; search becomes exact again"""
+        self._check_writable()
+        self.ann = None
+        if self.path is not None:
+            for path in IVFIndex.paths_for(self.path):
+                if path.exists():
+                    path.unlink()
+
+    def search(
+        self,
+        query: List[float],
+        top_k: int = 5,
+        project_id: Optional[str] = None,
+        min_similarity: float = 0.0,
+        nprobe: Optional[int] = None,
+        exact: bool = False,
+    ) -> List[Tuple[str, float]]:
+        """
+        Top-k documents by cosine similarity
+
+        Args:
+            nprobe: IVF lists to scan (default: the index setting); more lists
+                trade latency for recall
+            exact: Score every row even when an IVF index is attached
+
+        Returns:
+            List of (doc_id, similarity), best first
+        """
+        if self.count == 0 or top_k <= 0:
+            return []
+
+        query_vector = self.normalize(np.asarray(query, dtype=np.float32))
+        if query_vector.shape[0] != self.dim:
+            raise ValueError(
+                f"Query dimension {query_vector.shape[0]} does not match index ({self.dim})"
+            )
+
+        if self.ann is not None and not exact:
+            # Only the rows of the closest lists are scored
+            rows = self.ann.probe(query_vector, self.used_rows, nprobe)
+            scores = self.matrix[rows] @ query_vector
+            codes = self.project_codes[rows]
+        else:
+            rows = None
+            scores = self.matrix[: self.used_rows] @ query_vector
+            codes = self.project_codes[: self.used_rows]
+
+        # Candidate rows: live rows, project mask and similarity threshold
+        keep = scores >= min_similarity
+        if project_id is None:
+            if self.used_rows > self.count:
+                keep &= codes != self.FREE
+        else:
+            code = self._project_codes.get(project_id)
+            if code is None:
+                return []
+            keep &= codes == code
+
+        candidates = np.flatnonzero(keep)
+        if candidates.size == 0:
+            return []
+
+        candidate_scores = scores[candidates]
+        if candidates.size > top_k:
+            best = np.argpartition(-candidate_scores, top_k - 1)[:top_k]
+            candidates, candidate_scores = candidates[best], candidate_scores[best]
+
+        if rows is not None:
+            candidates = rows[candidates]
+
+        order = np.argsort(-candidate_scores, kind="stable")
+        return [(self.ids[candidates[i]], float(candidate_scores[i])) for i in order]
+
+
+def migrate_json_vectors(
+    json_path: Path,
+    index_path: Path,
+    documents: Optional[Dict[str, Dict[str, Any]]] = None,
+) -> Optional[VectorIndex]:
+    """
+    One-time migration of a legacy vectors.json into the binary format
+
+    The JSON file is kept as `<name>.migrated` for rollback. Returns the new
+    index, or None when there is nothing to migrate.
+    """
+    json_path, index_path = Path(json_path), Path(index_path)
+    if not json_path.exists():
+        return None
+
+    with open(json_path, "r") as f:
+        vectors: Dict[str, List[float]] = json.load(f)
+
+    documents = documents or {}
+    index = VectorIndex.open(index_path)
+    for doc_id, embedding in vectors.items():
+        index.add(doc_id, embedding, documents.get(doc_id, {}).get("project_id"))
+    index.save()
+
+    os.replace(json_path, json_path.with_name(json_path.name + ".migrated"))
+    logger.info(f"Migrated {len(vectors)} vectors from {json_path} to {index_path}")
+    return index
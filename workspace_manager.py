@@ -3,12 +3,13 @@ Workspace Manager
 Multi-project organization with tags, categories, and search
 """
 
-import json
 import logging
 from datetime import datetime
 from pathlib import Path
 from typing import Any, Dict, List, Optional
 
+from journal import JournaledStore
+
 logger = logging.getLogger(__name__)
 
 
@@ -22,27 +23,36 @@ class WorkspaceManager:
         self.storage_path.mkdir(exist_ok=True)
 
         self.workspaces_file = self.storage_path / "workspaces.json"
-        self.workspaces = self._load_workspaces()
+        # workspaces.json is the snapshot; changes are appended to workspaces.json.log
+        self.journal = JournaledStore(self.workspaces_file, indent=2, ensure_ascii=False)
+        self._workspaces = self._load_workspaces()
+
+        logger.info(f"WorkspaceManager initialized with {len(self._workspaces)} workspaces")
 
-        logger.info(f"WorkspaceManager initialized with {len(self.workspaces)} workspaces")
+    @property
+    def workspaces(self) -> Dict[str, Dict[str, Any]]:
+        """All workspaces, including changes other gateway workers have saved since"""
+        self.journal.sync(self._workspaces)
+        return self._workspaces
 
     def _load_workspaces(self) -> Dict[str, Dict[str, Any]]:
-        """Load workspaces from storage"""
-        if self.workspaces_file.exists():
-            try:
-                with open(self.workspaces_file, "r", encoding="utf-8") as f:
-                    data: Dict[str, Dict[str, Any]] = json.load(f)
-                    return data
-            except Exception as e:
-                logger.error(f"Failed to load workspaces: {e}")
-                return {}
-        return {}
-
-    def _save_workspaces(self) -> None:
-        """Persist workspaces to disk"""
+        """Load workspaces from storage (snapshot + operation log)"""
+        try:
+            data: Dict[str, Dict[str, Any]] = self.journal.load()
+            return data
+        except Exception as e:
+            logger.error(f"Failed to load workspaces: {e}")
+            return {}
+
+    def _save_workspaces(self, workspace_id: Optional[str] = None) -> None:
+        """
+        Persist workspaces to disk
+
+        With a workspace_id only that workspace is appended to the operation
+        log; without one a full snapshot is written.
+        """
         try:
-            with open(self.workspaces_file, "w", encoding="utf-8") as f:
-                json.dump(self.workspaces, f, indent=2, ensure_ascii=False)
+            self.journal.save(self._workspaces, workspace_id)
         except Exception as e:
             logger.error(f"Failed to save workspaces: {e}")
 
@@ -90,7 +100,7 @@ class WorkspaceManager:
         }
 
         self.workspaces[workspace_id] = workspace
-        self._save_workspaces()
+        self._save_workspaces(workspace_id)
 
         logger.info(f"Created workspace: {name} ({workspace_id})")
         return workspace
@@ -112,37 +122,41 @@ class WorkspaceManager:
         Returns:
             Updated workspace or None if not found
         """
-        workspace = self.workspaces.get(workspace_id)
+        # Read, update and log under the journal lock so that concurrent
+        # changes from other gateway workers are not overwritten
+        with self.journal.lock:
+            workspace = self.workspaces.get(workspace_id)
 
-        if not workspace:
-            return None
+            if not workspace:
+                return None
 
-        # Update allowed fields
-        allowed_fields = {"name", "description", "tags", "category", "metadata", "settings"}
+            # Update allowed fields
+            allowed_fields = {"name", "description", "tags", "category", "metadata", "settings"}
 
-        for key, value in updates.items():
-            if key in allowed_fields:
-                if key == "settings" and isinstance(value, dict):
-                    # Merge settings
-                    workspace["settings"].update(value)
-                else:
-                    workspace[key] = value
+            for key, value in updates.items():
+                if key in allowed_fields:
+                    if key == "settings" and isinstance(value, dict):
+                        # Merge settings
+                        workspace["settings"].update(value)
+                    else:
+                        workspace[key] = value
 
-        workspace["updated_at"] = datetime.now().isoformat()
+            workspace["updated_at"] = datetime.now().isoformat()
 
-        self._save_workspaces()
+            self._save_workspaces(workspace_id)
         logger.info(f"Updated workspace: {workspace_id}")
 
         return workspace
 
     def delete_workspace(self, workspace_id: str) -> bool:
         """Delete a workspace"""
-        if workspace_id in self.workspaces:
+        with self.journal.lock:
+            if workspace_id not in self.workspaces:
+                return False
             del self.workspaces[workspace_id]
-            self._save_workspaces()
-            logger.info(f"Deleted workspace: {workspace_id}")
-            return True
-        return False
+            self._save_workspaces(workspace_id)
+        logger.info(f"Deleted workspace: {workspace_id}")
+        return True
 
     def list_workspaces(
         self,
@@ -215,12 +229,15 @@ class WorkspaceManager:
             stat_name: Stat to increment (message_count, attachment_count, etc.)
             amount: Amount to increment
         """
-        workspace = self.workspaces.get(workspace_id)
+        # The lock is held from the sync to the append: no other worker can
+        # log a count for this workspace in between
+        with self.journal.lock:
+            workspace = self.workspaces.get(workspace_id)
 
-        if workspace and stat_name in workspace:
-            workspace[stat_name] += amount
-            workspace["updated_at"] = datetime.now().isoformat()
-            self._save_workspaces()
+            if workspace and stat_name in workspace:
+                workspace[stat_name] += amount
+                workspace["updated_at"] = datetime.now().isoformat()
+                self._save_workspaces(workspace_id)
 
     def get_stats(self) -> Dict[str, Any]:
         """Get overall workspace statistics"""
@@ -317,7 +334,7 @@ class WorkspaceManager:
             workspace["updated_at"] = datetime.now().isoformat()
 
             self.workspaces[new_id] = workspace
-            self._save_workspaces()
+            self._save_workspaces(new_id)
 
             logger.info(f"Imported workspace: {workspace.get('name')} as {new_id}")
             return new_id